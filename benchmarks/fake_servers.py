@@ -0,0 +1,270 @@
+"""
+Local stand-in servers for the subsets of the Harvest v2 and T-Sheets v1 APIs that are used by timesync.  The servers
+generate their data from the settings they are created with, can add latency to every request, and can reject
+requests past a rate limit with a 429 response, so that the performance of timesync can be measured without touching
+a production account.
+"""
+import collections
+import datetime
+import itertools
+import json
+import math
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+USER_ID = 1000
+
+
+class ServerSettings:
+    """Behavior of a fake server."""
+
+    def __init__(self, latency=0.0, page_size=100, rate_limit=None, rate_period=15.0, retry_after=1,
+                 assignments=10, entries_per_day=4):
+        # Seconds added to every request.
+        self.latency = latency
+
+        # Number of items returned in each page.
+        self.page_size = page_size
+
+        # Number of requests allowed in each rate_period seconds before returning 429, None for no limit.
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+
+        # Value of the Retry-After header of the 429 responses.
+        self.retry_after = retry_after
+
+        # Number of task assignments (harvest) or jobcode assignments (t-sheets) of the user.
+        self.assignments = assignments
+
+        # Number of time sheets of each jobcode and date (t-sheets).
+        self.entries_per_day = entries_per_day
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeServer:
+    """Base class of the fake servers, keeps the request statistics and runs the HTTP server in a thread."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.request_counts = collections.Counter()
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._window = collections.deque()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    @property
+    def total_requests(self):
+        return sum(self.request_counts.values())
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+            def do_PATCH(self):
+                server._handle(self, 'PATCH')
+
+            def do_DELETE(self):
+                server._handle(self, 'DELETE')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_statistics(self):
+        with self._lock:
+            self.request_counts.clear()
+            self.rate_limited = 0
+
+    def route(self, method, path, query, body):
+        """Return the status and JSON body of a request, implemented by the servers."""
+        raise NotImplementedError
+
+    def _handle(self, handler, method):
+        parsed = urlparse(handler.path)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = json.loads(handler.rfile.read(length).decode('utf-8')) if length else None
+
+        path = parsed.path.strip('/')
+        endpoint = '/'.join(part if not part.isdigit() else '{id}' for part in path.split('/'))
+
+        if self.settings.latency:
+            time.sleep(self.settings.latency)
+
+        with self._lock:
+            self.request_counts[f'{method} {endpoint}'] += 1
+            limited = self._is_rate_limited()
+            if limited:
+                self.rate_limited += 1
+
+        if limited:
+            status, payload, headers = 429, {'error': 'rate limited'}, {'Retry-After': str(self.settings.retry_after)}
+        else:
+            status, payload = self.route(method, path, query, body)
+            headers = {}
+
+        data = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        for key, value in headers.items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _is_rate_limited(self):
+        if self.settings.rate_limit is None:
+            return False
+
+        now = time.monotonic()
+        while self._window and now - self._window[0] > self.settings.rate_period:
+            self._window.popleft()
+
+        if len(self._window) >= self.settings.rate_limit:
+            return True
+
+        self._window.append(now)
+        return False
+
+    def _page(self, items, query):
+        page = int(query.get('page', 1))
+        start = (page - 1) * self.settings.page_size
+        return page, items[start:start + self.settings.page_size], max(math.ceil(len(items) / self.settings.page_size), 1)
+
+
+class FakeHarvest(FakeServer):
+    """Harvest v2: current user, company, project assignments and time entries."""
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.time_entries = {}
+        self._ids = itertools.count(1)
+
+        # Ten task assignments for each project.
+        self.project_assignments = []
+        for project_index in range(math.ceil(settings.assignments / 10)):
+            project_id = project_index + 1
+            tasks = [{'id': 10000 + project_id * 100 + task_index, 'is_active': True,
+                      'task': {'id': task_index + 1, 'name': f'Task {task_index + 1}'}}
+                     for task_index in range(min(10, settings.assignments - project_index * 10))]
+            self.project_assignments.append({'id': project_id, 'is_active': True,
+                                             'project': {'id': project_id, 'name': f'Project {project_id}'},
+                                             'task_assignments': tasks})
+
+    def route(self, method, path, query, body):
+        if path == 'v2/users/me':
+            return 200, {'id': USER_ID}
+        if path == 'v2/company':
+            return 200, {'wants_timestamp_timers': True, 'clock': '24h'}
+        if path == 'v2/users/me/project_assignments':
+            return 200, self._paged('project_assignments', self.project_assignments, query)
+        if path == 'v2/time_entries' and method == 'GET':
+            return 200, self._paged('time_entries', self._find_time_entries(query), query)
+        if path == 'v2/time_entries' and method == 'POST':
+            return 201, self._store_time_entry(next(self._ids), body)
+        if path.startswith('v2/time_entries/'):
+            entry_id = int(path.rsplit('/', 1)[1])
+            with self._lock:
+                exists = entry_id in self.time_entries
+                if exists and method == 'DELETE':
+                    del self.time_entries[entry_id]
+            if not exists:
+                return 404, {'error': 'not found'}
+            if method == 'PATCH':
+                return 200, self._store_time_entry(entry_id, body)
+            return 200, {}
+
+        return 404, {'error': f'unknown endpoint {path}'}
+
+    def _paged(self, key, items, query):
+        page, page_items, total_pages = self._page(items, query)
+        return {key: page_items, 'page': page, 'per_page': self.settings.page_size, 'total_pages': total_pages,
+                'total_entries': len(items), 'next_page': page + 1 if page < total_pages else None}
+
+    def _find_time_entries(self, query):
+        project_id = int(query['project_id'])
+        with self._lock:
+            return sorted((entry for entry in self.time_entries.values()
+                           if entry['project']['id'] == project_id and query['from'] <= entry['spent_date'] <= query['to']),
+                          key=lambda entry: entry['id'])
+
+    def _store_time_entry(self, entry_id, values):
+        project_id, task_id = values['project_id'], values['task_id']
+        entry = {'id': entry_id, 'spent_date': values['spent_date'], 'notes': values.get('notes'),
+                 'started_time': values.get('started_time'), 'ended_time': values.get('ended_time'),
+                 'hours': values.get('hours', 1.0), 'project': {'id': project_id}, 'task': {'id': task_id},
+                 'task_assignment': {'id': 10000 + project_id * 100 + task_id - 1}}
+        with self._lock:
+            self.time_entries[entry_id] = entry
+        return entry
+
+
+class FakeTSheets(FakeServer):
+    """T-Sheets v1: current user, jobcode assignments and generated time sheets."""
+
+    def route(self, method, path, query, body):
+        if path == 'v1/current_user':
+            return 200, {'results': {'users': {str(USER_ID): {'id': USER_ID}}}}
+        if path == 'v1/jobcode_assignments':
+            jobcodes = list(range(1, self.settings.assignments + 1))
+            page, page_jobcodes, total_pages = self._page(jobcodes, query)
+            return 200, {'results': {'jobcode_assignments': {str(jobcode): {'id': jobcode, 'jobcode_id': jobcode,
+                                                                            'active': True}
+                                                             for jobcode in page_jobcodes}},
+                         'supplemental_data': {'jobcodes': {str(jobcode): {'id': jobcode, 'name': f'Jobcode {jobcode}',
+                                                                           'parent_id': 0}
+                                                            for jobcode in page_jobcodes}},
+                         'more': page < total_pages}
+        if path == 'v1/timesheets':
+            page, page_timesheets, total_pages = self._page(self._time_sheets(query), query)
+            return 200, {'results': {'timesheets': {str(timesheet['id']): timesheet for timesheet in page_timesheets}},
+                         'more': page < total_pages}
+        if path == 'v1/timesheets_deleted':
+            return 200, {'results': {'timesheets': []}, 'more': False}
+
+        return 404, {'error': f'unknown endpoint {path}'}
+
+    def _time_sheets(self, query):
+        jobcode = int(query['jobcode_ids'])
+        date = datetime.datetime.strptime(query['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.datetime.strptime(query['end_date'], '%Y-%m-%d').date()
+
+        time_sheets = []
+        while date <= end_date:
+            for index in range(self.settings.entries_per_day):
+                start = datetime.datetime.combine(date, datetime.time(8 + index))
+                time_sheets.append({'id': int(date.strftime('%Y%m%d')) * 100 + index, 'on_the_clock': False,
+                                    'jobcode_id': jobcode, 'date': date.isoformat(), 'duration': 3600,
+                                    'start': start.isoformat() + '-07:00',
+                                    'end': (start + datetime.timedelta(hours=1)).isoformat() + '-07:00',
+                                    'tz_str': 'America/Denver', 'notes': f'Entry {index}'})
+            date += datetime.timedelta(1)
+
+        return time_sheets
@@ -0,0 +1,167 @@
+"""
+End to end benchmarks of ``timesync process`` against the local stand-in servers in fake_servers.py.
+
+Each scenario starts fresh servers, writes a configuration and a process script into a temporary directory and runs
+timesync in a new process, so that nothing is shared between the scenarios.  timesync must be installed (``pip install
+-e .``) so that its plugins are registered.
+
+.. code-block:: bash
+
+  python benchmarks/run_benchmarks.py
+  python benchmarks/run_benchmarks.py --latency 0.1 --scenario copy_30_days --scenario delete_30_days
+  python benchmarks/run_benchmarks.py --harvest-rate-limit 100 --json results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_servers import FakeHarvest, FakeTSheets, ServerSettings
+
+from ruamel.yaml import YAML
+import tabulate
+
+END_DATE = '2019-12-31'
+
+SCENARIOS = {
+    'copy_1_day': {'days': 1},
+    'copy_30_days': {'days': 30},
+    'copy_365_days': {'days': 365},
+    'delete_30_days': {'days': 30, 'delete': True},
+    'many_assignments': {'days': 1, 'assignments': 2000},
+}
+
+
+def _build_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark timesync process against local fake servers')
+
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='scenario to run, can be repeated.  Default: all scenarios')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every request')
+    parser.add_argument('--page-size', type=int, default=100, help='number of items in each page')
+    parser.add_argument('--entries-per-day', type=int, default=4, help='number of t-sheets entries for each day')
+    parser.add_argument('--harvest-rate-limit', type=int, default=None,
+                        help='requests allowed by harvest every 15 seconds before returning 429')
+    parser.add_argument('--tsheets-rate-limit', type=int, default=None,
+                        help='requests allowed by t-sheets every 15 seconds before returning 429')
+    parser.add_argument('--client-rate-limit', action='store_true',
+                        help='keep the default client side rate limits of timesync, by default they are raised so '
+                             'that only the server behavior is measured')
+    parser.add_argument('--json', help='write the results to this file')
+
+    return parser
+
+
+def run_scenario(name, args):
+    """Run a scenario and return its results."""
+    scenario = SCENARIOS[name]
+
+    def settings(rate_limit):
+        return ServerSettings(latency=args.latency, page_size=args.page_size, rate_limit=rate_limit,
+                              assignments=scenario.get('assignments', 10), entries_per_day=args.entries_per_day)
+
+    harvest = FakeHarvest(settings(args.harvest_rate_limit)).start()
+    tsheets = FakeTSheets(settings(args.tsheets_rate_limit)).start()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            configuration_file = _write_configuration(directory, harvest, tsheets, args)
+
+            start_date = _start_date(scenario['days'])
+            copy_task = {'type': 'copy', 'date': 'range', 'start': start_date, 'end': END_DATE,
+                         'from': {'id': 'tsheets', 'jobcode': 1},
+                         'to': {'id': 'harvest', 'project': 1, 'task': 1}}
+
+            if scenario.get('delete'):
+                # The entries to delete are created by a copy that is not measured.
+                _run_timesync(directory, configuration_file, [copy_task])
+                harvest.reset_statistics()
+                tsheets.reset_statistics()
+
+                tasks = [{'type': 'delete', 'date': 'range', 'start': start_date, 'end': END_DATE,
+                          'from': {'id': 'harvest', 'project': 1, 'task': 1}}]
+            else:
+                tasks = [copy_task]
+
+            wall_time = _run_timesync(directory, configuration_file, tasks)
+    finally:
+        harvest.stop()
+        tsheets.stop()
+
+    requests = harvest.total_requests + tsheets.total_requests
+
+    return {
+        'scenario': name,
+        'wall_time': wall_time,
+        'requests': requests,
+        'requests_per_second': requests / wall_time if wall_time else 0.0,
+        'rate_limited': harvest.rate_limited + tsheets.rate_limited,
+        'harvest_requests': dict(harvest.request_counts),
+        'tsheets_requests': dict(tsheets.request_counts),
+    }
+
+
+def _start_date(days):
+    end_date = datetime.datetime.strptime(END_DATE, '%Y-%m-%d').date()
+    return (end_date - datetime.timedelta(days - 1)).isoformat()
+
+
+def _write_configuration(directory, harvest, tsheets, args):
+    harvest_configuration = {'account_id': 1, 'token': 'benchmark', 'api_root': harvest.url}
+    tsheets_configuration = {'token': 'benchmark', 'api_root': tsheets.url}
+
+    if not args.client_rate_limit:
+        harvest_configuration['rate_limit'] = {'requests': 1000000, 'period': 1}
+        tsheets_configuration['rate_limit'] = {'requests': 1000000, 'period': 1}
+
+    configuration = {
+        'connections': {'harvest': harvest_configuration, 't-sheets': tsheets_configuration},
+        'cache': {'directory': os.path.join(directory, 'cache')},
+        'catalog': {'filename': os.path.join(directory, 'catalog.sqlite')},
+        'state': {'filename': os.path.join(directory, 'state.sqlite')},
+    }
+
+    configuration_file = os.path.join(directory, 'config.yaml')
+    with open(configuration_file, 'w') as output_file:
+        YAML(typ='safe').dump(configuration, output_file)
+
+    return configuration_file
+
+
+def _run_timesync(directory, configuration_file, tasks):
+    """Run timesync process for the tasks and return the wall time."""
+    script_file = os.path.join(directory, 'process.yaml')
+    with open(script_file, 'w') as output_file:
+        YAML(typ='safe').dump({'tasks': tasks}, output_file)
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-m', 'timesync.main', '-c', configuration_file, 'process', script_file],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=directory)
+    wall_time = time.perf_counter() - start
+
+    if result.returncode != 0:
+        raise RuntimeError(f'timesync failed: {result.stderr.decode("utf-8", "replace")}')
+
+    return wall_time
+
+
+def main():
+    args = _build_arguments().parse_args()
+
+    results = [run_scenario(name, args) for name in args.scenario or sorted(SCENARIOS)]
+
+    rows = [(result['scenario'], f'{result["wall_time"]:.2f}', result['requests'],
+             f'{result["requests_per_second"]:.1f}', result['rate_limited']) for result in results]
+    print(tabulate.tabulate(rows, ['Scenario', 'Wall Time (s)', 'Requests', 'Requests/s', '429s'], tablefmt='simple'))
+
+    if args.json:
+        with open(args.json, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
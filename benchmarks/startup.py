@@ -0,0 +1,68 @@
+"""
+Benchmark of the start up time of the timesync command, measured by running ``timesync --help`` in new processes.
+
+.. code-block:: bash
+
+  python benchmarks/startup.py
+  python benchmarks/startup.py --runs 50 --imports 15
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMAND = [sys.executable, '-m', 'timesync.main', '--help']
+
+
+def _build_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the start up time of timesync')
+
+    parser.add_argument('--runs', type=int, default=20, help='number of times the command is run')
+    parser.add_argument('--imports', type=int, default=0,
+                        help='also list this many of the slowest imports reported by python -X importtime')
+
+    return parser
+
+
+def measure(runs):
+    """Run the command the number of times requested and return the wall time of each run."""
+    wall_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(COMMAND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        wall_times.append(time.perf_counter() - start)
+
+    return wall_times
+
+
+def slowest_imports(count):
+    """Return the modules with the largest cumulative import time as (microseconds, module) tuples."""
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + COMMAND[1:], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, check=True)
+
+    imports = []
+    for line in result.stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), module.rstrip()))
+
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    args = _build_arguments().parse_args()
+
+    wall_times = measure(args.runs)
+    print(f'{args.runs} runs: median {statistics.median(wall_times) * 1000:.1f} ms, '
+          f'min {min(wall_times) * 1000:.1f} ms, max {max(wall_times) * 1000:.1f} ms')
+
+    if args.imports:
+        print()
+        for cumulative, module in slowest_imports(args.imports):
+            print(f'{cumulative / 1000:8.1f} ms  {module}')
+
+
+if __name__ == '__main__':
+    main()
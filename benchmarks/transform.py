@@ -0,0 +1,87 @@
+"""
+Micro benchmark of the conversion of T-Sheets time sheets into time entries, the CPU cost paid for every record that is
+read.  The time sheets are generated in the format returned by the API, and half of them can be left without a start
+and end time so that the generated start times are measured as well.
+
+.. code-block:: bash
+
+  python benchmarks/transform.py
+  python benchmarks/transform.py --records 100000 --missing-times 0.5
+"""
+import argparse
+import datetime
+import logging
+import os
+import tempfile
+import timeit
+
+import dateutil.parser
+
+from timesync.tsheets import entries
+from timesync.utils import configuration, timestamps
+
+
+def _build_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the conversion of t-sheets time sheets')
+
+    parser.add_argument('--records', type=int, default=20000, help='number of time sheets converted in each run')
+    parser.add_argument('--runs', type=int, default=5, help='number of runs, the fastest is reported')
+    parser.add_argument('--missing-times', type=float, default=0.1,
+                        help='fraction of the time sheets without a start and end time')
+
+    return parser
+
+
+def generate_time_sheets(count, missing_times):
+    """Generate time sheets in the format returned by the API."""
+    missing_every = int(1 / missing_times) if missing_times else 0
+
+    time_sheets = []
+    for index in range(count):
+        date = datetime.date(2019, 1, 1) + datetime.timedelta(index // 4)
+        start = datetime.datetime.combine(date, datetime.time(8 + index % 4))
+        time_sheet = {'id': index, 'on_the_clock': False, 'jobcode_id': 1, 'date': date.isoformat(),
+                      'duration': 3600, 'start': start.isoformat() + '-07:00',
+                      'end': (start + datetime.timedelta(hours=1)).isoformat() + '-07:00',
+                      'tz_str': 'America/Denver', 'notes': f'Entry {index}'}
+
+        if missing_every and index % missing_every == 0:
+            time_sheet['start'] = time_sheet['end'] = ''
+
+        time_sheets.append(time_sheet)
+
+    return time_sheets
+
+
+def main():
+    args = _build_arguments().parse_args()
+
+    # The warnings logged for the time sheets without a start time are not part of the measurement.
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        configuration_file = os.path.join(directory, 'config.yaml')
+        with open(configuration_file, 'w') as output_file:
+            output_file.write('timeentries:\n  default_start_time: "08:00:00"\n')
+        configuration.get_configuration(configuration_file)
+
+    time_sheets = generate_time_sheets(args.records, args.missing_times)
+    start_times = [time_sheet['start'] for time_sheet in time_sheets if time_sheet['start']]
+
+    def convert():
+        for time_sheet in time_sheets:
+            entries._convert_timesheet(time_sheet)
+
+    results = [
+        ('transform', len(time_sheets), convert),
+        ('parse_timestamp', len(start_times), lambda: [timestamps.parse_timestamp(value) for value in start_times]),
+        ('dateutil.parser.parse', len(start_times), lambda: [dateutil.parser.parse(value) for value in start_times]),
+    ]
+
+    for name, count, method in results:
+        seconds = min(timeit.repeat(method, number=1, repeat=args.runs))
+        print(f'{name:<24} {seconds * 1000:8.1f} ms  {seconds / count * 1e6:6.2f} us/record')
+
+
+if __name__ == '__main__':
+    main()
@@ -36,7 +36,8 @@ setup(
         'ruamel.yaml>=0.15.70<0.16',
         'tabulate>=0.8.2<0.9',
         'python-dateutil==2.7.5',
-        'pytz==2018.9'
+        'pytz==2018.9',
+        'importlib_metadata; python_version < "3.8"',
     ],
 
     extras_require={
@@ -51,13 +52,40 @@ setup(
         'task_assignments': ['harvest=timesync.harvest.entries:task_assignments',
                              'tsheets=timesync.tsheets.entries:task_assignments', ],
 
+        'catalog_refresh': ['harvest=timesync.harvest.entries:refresh_catalog',
+                            'tsheets=timesync.tsheets.entries:refresh_catalog', ],
+
+        'configuration_validator': ['harvest=timesync.harvest.entries:validate_configuration',
+                                    'tsheets=timesync.tsheets.entries:validate_configuration', ],
+
         'timesheet_reader': ['tsheets=timesync.tsheets.entries:time_entry_reader',
                              'disk=timesync.disk.entries:time_entry_reader'],
 
+        'timesheet_range_reader': ['tsheets=timesync.tsheets.entries:time_entry_range_reader',
+                                   'disk=timesync.disk.entries:time_entry_range_reader'],
+
         'timesheet_writer': ['harvest=timesync.harvest.entries:time_sheet_writer',
                              'disk=timesync.disk.entries:time_sheet_writer'],
 
+        'timesheet_changes_reader': ['tsheets=timesync.tsheets.entries:time_entry_changes_reader', ],
+
+        'timesheet_reconcile_writer': ['harvest=timesync.harvest.entries:time_sheet_reconcile_writer', ],
+
+        'timesheet_sync_writer': ['harvest=timesync.harvest.entries:time_sheet_sync_writer', ],
+
         'timesheet_delete': ['harvest=timesync.harvest.entries:time_sheet_delete', ],
+
+        'timesheet_range_delete': ['harvest=timesync.harvest.entries:time_sheet_range_delete', ],
+
+        'timesheet_estimate': ['harvest=timesync.harvest.entries:estimate',
+                               'tsheets=timesync.tsheets.entries:estimate',
+                               'disk=timesync.disk.entries:estimate'],
+
+        'configuration_reload': ['harvest=timesync.harvest.entries:reset_configuration',
+                                 'tsheets=timesync.tsheets.entries:reset_configuration', ],
+
+        'timesheet_account': ['harvest=timesync.harvest.entries:account_key',
+                              'tsheets=timesync.tsheets.entries:account_key', ],
     },
 
     project_urls={
@@ -0,0 +1,38 @@
+"""
+Fixtures shared by the tests.
+"""
+import pytest
+
+from timesync.utils import configuration as config
+
+
+@pytest.fixture
+def configuration(monkeypatch, tmp_path):
+    """
+    Configuration of the run, with a harvest and a t-sheets connection that are never contacted, and the catalog and
+    state stored in the temporary directory of the test.
+    """
+    from timesync.harvest import connection as harvest
+    from timesync.tsheets import connection as tsheets
+    from timesync.utils import catalog, http_cache, state
+
+    values = {
+        'connections': {
+            'harvest': {'account_id': 1, 'token': 'harvest-token', 'api_root': 'http://harvest.invalid'},
+            't-sheets': {'token': 't-sheets-token', 'api_root': 'http://t-sheets.invalid'},
+        },
+        'cache': {'enabled': False},
+        'catalog': {'filename': str(tmp_path / 'catalog.sqlite')},
+        'state': {'filename': str(tmp_path / 'state.sqlite')},
+    }
+    monkeypatch.setattr(config, '_configuration', values)
+
+    yield values
+
+    harvest.reset_configuration()
+    tsheets.reset_configuration()
+    for get_database in (catalog.get_catalog, state.get_state_store):
+        if get_database.cache_info().currsize:
+            get_database().close()
+        get_database.cache_clear()
+    http_cache.get_cache.cache_clear()
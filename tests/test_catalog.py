@@ -0,0 +1,97 @@
+"""
+Tests of the local catalog of the task assignments.
+"""
+from timesync.utils import catalog
+
+ACCOUNT = 'account'
+
+
+def _catalog(tmp_path):
+    return catalog.Catalog(str(tmp_path / 'catalog.sqlite'), catalog.DEFAULT_SETTINGS['max_age'])
+
+
+def test_tsheets_jobcodes_without_an_assignment_are_left_out(tmp_path):
+    task_catalog = _catalog(tmp_path)
+
+    task_catalog.store_tsheets_jobcodes(ACCOUNT, [(1, 'Client', 0), (2, 'Project', 1), (3, 'Other Project', 1)])
+    task_catalog.store_tsheets_assignments(ACCOUNT, [(2, True)])
+
+    assert task_catalog.tsheets_jobcodes(ACCOUNT) == [(2, 'Project', 1, 'Client')]
+    assert task_catalog.tsheets_jobcodes(ACCOUNT, 'Client') == []
+    assert task_catalog.tsheets_jobcodes(ACCOUNT, 3) == []
+
+
+def test_tsheets_jobcodes_with_an_inactive_assignment_are_left_out(tmp_path):
+    task_catalog = _catalog(tmp_path)
+
+    task_catalog.store_tsheets_jobcodes(ACCOUNT, [(2, 'Project', 0)])
+    task_catalog.store_tsheets_assignments(ACCOUNT, [(2, False)])
+
+    assert task_catalog.tsheets_jobcodes(ACCOUNT, 2) == []
+
+
+class _HarvestClient:
+    """Client that lists the project assignments it is given, filtered by their update time."""
+
+    account_key = ACCOUNT
+
+    def __init__(self):
+        self.assignments = {}
+        self.queries = []
+
+    def page_workers(self):
+        return 1
+
+    def current_assignments(self, page=1, updated_since=None, revalidate=False):
+        self.queries.append(updated_since)
+        return {'total_pages': 1, 'project_assignments': [
+            {'project': {'id': project_id, 'name': f'Project {project_id}'}, 'is_active': True,
+             'task_assignments': [{'id': task_id, 'is_active': True,
+                                   'task': {'id': task_id, 'name': f'Task {task_id}'}}]}
+            for task_id, project_id in self.assignments.items()]}
+
+
+def _refresh(monkeypatch, task_catalog, client, **kwargs):
+    from timesync.harvest import entries
+
+    monkeypatch.setattr(entries.harvest, 'get_client', lambda connection=None: client)
+    entries.refresh_catalog(task_catalog, **kwargs)
+
+    return [assignment[0] for assignment in task_catalog.harvest_assignments(ACCOUNT)]
+
+
+def test_refresh_only_retrieves_the_changes_after_a_full_refresh(monkeypatch, tmp_path):
+    task_catalog = _catalog(tmp_path)
+    client = _HarvestClient()
+    client.assignments = {1: 10, 2: 10}
+
+    assert _refresh(monkeypatch, task_catalog, client) == [1, 2]
+    assert client.queries[-1] is None
+
+    del client.assignments[2]
+    assert _refresh(monkeypatch, task_catalog, client) == [1, 2]
+    assert client.queries[-1] is not None
+
+
+def test_refresh_removes_the_assignments_once_the_full_refresh_age_is_reached(monkeypatch, tmp_path):
+    task_catalog = _catalog(tmp_path)
+    client = _HarvestClient()
+    client.assignments = {1: 10, 2: 10}
+    _refresh(monkeypatch, task_catalog, client)
+
+    del client.assignments[2]
+    task_catalog.full_refresh_age = -1
+
+    assert _refresh(monkeypatch, task_catalog, client) == [1]
+    assert client.queries[-1] is None
+
+
+def test_full_refresh_removes_the_assignments(monkeypatch, tmp_path):
+    task_catalog = _catalog(tmp_path)
+    client = _HarvestClient()
+    client.assignments = {1: 10, 2: 10}
+    _refresh(monkeypatch, task_catalog, client)
+
+    del client.assignments[2]
+
+    assert _refresh(monkeypatch, task_catalog, client, full=True) == [1]
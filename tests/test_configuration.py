@@ -0,0 +1,86 @@
+"""
+Tests of the date values of the configuration.
+"""
+import datetime
+
+import pytest
+
+from timesync.utils import configuration as config
+
+
+def _freeze(monkeypatch, now):
+    """Freeze the current time of the date values, the local time is the same as UTC."""
+
+    class _FrozenDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now.astimezone(tz) if tz is not None else now.replace(tzinfo=None)
+
+    monkeypatch.setattr(config, 'datetime', _FrozenDatetime)
+
+
+def _today(monkeypatch, year, month, day):
+    _freeze(monkeypatch, datetime.datetime(year, month, day, 12, tzinfo=datetime.timezone.utc))
+
+
+def _dates(configuration):
+    return tuple(value.date() for value in config.date_range(configuration))
+
+
+@pytest.mark.parametrize('today, value, start, end', [
+    # Monday.
+    ((2019, 12, 2), 'this_week', (2019, 12, 2), (2019, 12, 2)),
+    ((2019, 12, 2), 'last_week', (2019, 11, 25), (2019, 12, 1)),
+    # Sunday, the first day of the month.
+    ((2019, 12, 1), 'this_week', (2019, 11, 25), (2019, 12, 1)),
+    ((2019, 12, 1), 'this_month', (2019, 12, 1), (2019, 12, 1)),
+    ((2019, 12, 1), 'last_month', (2019, 11, 1), (2019, 11, 30)),
+    # January, the previous week and month are in the previous year.
+    ((2020, 1, 1), 'this_week', (2019, 12, 30), (2020, 1, 1)),
+    ((2020, 1, 1), 'last_week', (2019, 12, 23), (2019, 12, 29)),
+    ((2020, 1, 1), 'yesterday', (2019, 12, 31), (2019, 12, 31)),
+    ((2020, 1, 15), 'this_month', (2020, 1, 1), (2020, 1, 15)),
+    ((2020, 1, 15), 'last_month', (2019, 12, 1), (2019, 12, 31)),
+    # Leap year.
+    ((2020, 3, 1), 'last_month', (2020, 2, 1), (2020, 2, 29)),
+])
+def test_relative_dates(monkeypatch, today, value, start, end):
+    _today(monkeypatch, *today)
+
+    assert _dates({'date': value}) == (datetime.date(*start), datetime.date(*end))
+
+
+@pytest.mark.parametrize('days, start', [(1, (2020, 1, 2)), (3, (2019, 12, 31)), (40, (2019, 11, 24))])
+def test_last_n_days(monkeypatch, days, start):
+    _today(monkeypatch, 2020, 1, 2)
+
+    configuration = {'date': {'last_n_days': days}}
+
+    assert _dates(configuration) == (datetime.date(*start), datetime.date(2020, 1, 2))
+    assert len(config.parse_date(configuration)) == days
+
+
+@pytest.mark.parametrize('value', [{'last_n_days': 0}, {'last_days': 3}])
+def test_invalid_last_n_days(monkeypatch, value):
+    _today(monkeypatch, 2020, 1, 2)
+
+    with pytest.raises(RuntimeError):
+        config.date_range({'date': value})
+
+
+def test_today_is_taken_in_the_timezone(monkeypatch):
+    _freeze(monkeypatch, datetime.datetime(2020, 1, 1, 3, tzinfo=datetime.timezone.utc))
+
+    assert _dates({'date': 'today'}) == (datetime.date(2020, 1, 1),) * 2
+    assert _dates({'date': 'today', 'timezone': 'America/Denver'}) == (datetime.date(2019, 12, 31),) * 2
+    assert _dates({'date': 'last_month', 'timezone': 'America/Denver'}) == (datetime.date(2019, 11, 1),
+                                                                             datetime.date(2019, 11, 30))
+
+
+def test_dates_in_a_timezone_are_at_its_midnight(monkeypatch):
+    _today(monkeypatch, 2019, 12, 2)
+
+    start_date, end_date = config.date_range({'date': 'last_week', 'timezone': 'America/Denver'})
+
+    assert start_date.isoformat() == '2019-11-25T00:00:00-07:00'
+    assert end_date.isoformat() == '2019-12-01T00:00:00-07:00'
@@ -0,0 +1,41 @@
+"""
+Tests of the disk readers and writers.
+"""
+import datetime
+
+import pytest
+
+from timesync.disk import entries
+from timesync.utils.records import TimeEntry
+
+DATE = datetime.datetime(2019, 12, 2)
+
+
+def _entry(record_id, hour, notes=None):
+    return TimeEntry(record_id, datetime.datetime(2019, 12, 2, hour), datetime.datetime(2019, 12, 2, hour, 30),
+                     notes=notes)
+
+
+def _read(configuration):
+    records = entries.time_entry_reader(DATE, configuration)
+    return sorted((entry.id or 0, entry.start.hour, entry.notes) for entry in records)
+
+
+@pytest.mark.parametrize('file_format', entries.FORMATS)
+def test_merge_adds_records_without_an_id(tmp_path, file_format):
+    configuration = {'filename': str(tmp_path / f'entries.{file_format}'), 'format': file_format}
+
+    entries.time_sheet_writer(configuration, [_entry(None, 8), _entry(1, 9, 'old')])
+    entries.time_sheet_writer(dict(configuration, mode='merge'),
+                              [_entry(None, 10), _entry(None, 11), _entry(1, 9, 'new')])
+
+    assert _read(configuration) == [(0, 8, None), (0, 10, None), (0, 11, None), (1, 9, 'new')]
+
+
+@pytest.mark.parametrize('file_format', entries.FORMATS)
+def test_replace_keeps_records_without_an_id(tmp_path, file_format):
+    configuration = {'filename': str(tmp_path / f'entries.{file_format}'), 'format': file_format}
+
+    entries.time_sheet_writer(configuration, [_entry(None, hour) for hour in range(8, 12)])
+
+    assert len(entries.time_entry_reader(DATE, configuration)) == 4
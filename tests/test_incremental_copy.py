@@ -0,0 +1,152 @@
+"""
+Tests of the incremental copies of the process scripts.
+"""
+import datetime
+
+import pytest
+
+from timesync.harvest import entries as harvest_entries
+from timesync.subcommands import process
+from timesync.utils import plugins, state
+from timesync.utils.records import TimeEntry
+
+TASK = {'date': 'range', 'start': '2019-12-01', 'end': '2019-12-05', 'incremental': True,
+        'from': {'id': 'fake', 'jobcode': 3}, 'to': {'id': 'harvest', 'project': 1, 'task': 2}}
+
+
+class _Source:
+    """Changes reader that returns the changes it is given, and the times it was asked for the changes since."""
+
+    def __init__(self):
+        self.changed = []
+        self.deleted = []
+        self.modified_since = []
+
+    def find_plugin(self, group, name):
+        if group == 'timesheet_changes_reader' and name == 'fake':
+            return self.changes_reader
+
+        return _find_plugin(group, name)
+
+    def changes_reader(self, modified_since, start_date, end_date, configuration):
+        self.modified_since.append(modified_since)
+        return {'changed': self.changed, 'deleted': self.deleted}
+
+
+class _HarvestClient:
+    """Client that keeps the time entries in memory."""
+
+    def __init__(self):
+        self.time_entries = {}
+        self.deletable = True
+        self._next_id = 100
+
+    def write_workers(self):
+        return 1
+
+    def create_time_entry(self, project_id, task_id, start_time, end_time, notes=None):
+        self._next_id += 1
+        self.time_entries[self._next_id] = notes
+        return {'id': self._next_id}
+
+    def update_time_entry(self, entry_id, project_id, task_id, start_time, end_time, notes=None):
+        if int(entry_id) not in self.time_entries:
+            return None
+
+        self.time_entries[int(entry_id)] = notes
+        return {'id': int(entry_id)}
+
+    def delete_time_entry(self, entry_id):
+        if not self.deletable:
+            return False
+
+        return self.time_entries.pop(int(entry_id), None) is not None
+
+
+_find_plugin = plugins.find_plugin
+
+
+@pytest.fixture
+def source(configuration, monkeypatch):
+    fake_source = _Source()
+    monkeypatch.setattr(plugins, 'find_plugin', fake_source.find_plugin)
+    return fake_source
+
+
+@pytest.fixture
+def client(configuration, monkeypatch):
+    fake_client = _HarvestClient()
+    monkeypatch.setattr(harvest_entries.harvest, 'client_for', lambda configuration: fake_client)
+    return fake_client
+
+
+def _entry(record_id, notes):
+    return TimeEntry(record_id, datetime.datetime(2019, 12, 2, 8), datetime.datetime(2019, 12, 2, 9), notes=notes)
+
+
+def _copied(record_id):
+    return state.get_state_store().copied_entries(process.incremental_task_key(TASK)).get(record_id)
+
+
+def _watermark():
+    return state.get_state_store().get_watermark(process.incremental_task_key(TASK))
+
+
+def test_watermark_advances_to_the_start_of_each_run(source, client):
+    before = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    process._copy_processor(TASK)
+    first_watermark = _watermark()
+
+    assert first_watermark >= before
+    assert source.modified_since == [None]
+
+    process._copy_processor(TASK)
+
+    assert source.modified_since == [None, first_watermark]
+    assert _watermark() >= first_watermark
+
+
+def test_watermark_is_kept_when_the_changes_are_not_written(source, client):
+    source.changed = [_entry(1, 'first')]
+    process._copy_processor(TASK)
+
+    watermark = datetime.datetime(2019, 12, 1, tzinfo=datetime.timezone.utc)
+    state.get_state_store().set_watermark(process.incremental_task_key(TASK), watermark)
+
+    client.deletable = False
+    source.changed, source.deleted = [], [1]
+    with pytest.raises(RuntimeError):
+        process._copy_processor(TASK)
+
+    assert source.modified_since == [None, watermark]
+    assert _watermark() == watermark
+    assert _copied(1) is not None
+
+
+def test_changed_entries_update_the_entry_they_were_copied_to(source, client):
+    source.changed = [_entry(1, 'first')]
+    process._copy_processor(TASK)
+
+    source.changed = [_entry(1, 'changed')]
+    process._copy_processor(TASK)
+
+    assert list(client.time_entries.values()) == ['changed']
+    assert _copied(1) == str(next(iter(client.time_entries)))
+
+
+def test_deleted_entries_delete_their_copy_and_are_forgotten(source, client):
+    source.changed = [_entry(1, 'first'), _entry(2, 'second')]
+    process._copy_processor(TASK)
+
+    source.changed, source.deleted = [], [1, 3]
+    process._copy_processor(TASK)
+
+    assert list(client.time_entries.values()) == ['second']
+    assert _copied(1) is None
+    assert _copied(2) is not None
+
+    # A source entry created again after it was deleted is copied again.
+    source.changed, source.deleted = [_entry(1, 'again')], []
+    process._copy_processor(TASK)
+
+    assert sorted(client.time_entries.values()) == ['again', 'second']
@@ -0,0 +1,94 @@
+"""
+Tests of the JSON Lines storage of time entries.
+"""
+import datetime
+import os
+
+from timesync.disk import jsonl
+from timesync.utils.records import TimeEntry
+
+DATE = datetime.date(2019, 12, 2)
+
+
+def _entry(record_id, hour, notes=None):
+    return TimeEntry(record_id, datetime.datetime(2019, 12, 2, hour), datetime.datetime(2019, 12, 2, hour, 30),
+                     notes=notes)
+
+
+def test_write_keeps_records_without_an_id(tmp_path):
+    filename = str(tmp_path / 'entries.jsonl')
+
+    jsonl.write(filename, [_entry(None, hour) for hour in range(8, 12)])
+
+    assert len(jsonl.read(filename, [DATE])[DATE]) == 4
+
+
+def test_write_keeps_records_with_the_same_id(tmp_path):
+    filename = str(tmp_path / 'entries.jsonl')
+
+    jsonl.write(filename, [_entry(1, 8), _entry(1, 9)])
+
+    assert [entry.start.hour for entry in jsonl.read(filename, [DATE])[DATE]] == [8, 9]
+
+
+def test_append_replaces_records_with_the_same_id(tmp_path):
+    filename = str(tmp_path / 'entries.jsonl')
+
+    jsonl.write(filename, [_entry(1, 8, 'old'), _entry(2, 9), _entry(None, 10)])
+    jsonl.append(filename, [_entry(1, 8, 'new'), _entry(None, 11)])
+
+    entries = jsonl.read(filename, [DATE])[DATE]
+    assert sorted((entry.id or 0, entry.start.hour, entry.notes) for entry in entries) == [
+        (0, 10, None), (0, 11, None), (1, 8, 'new'), (2, 9, None)]
+
+
+def test_rebuilt_index_keeps_records_without_an_id(tmp_path):
+    filename = str(tmp_path / 'entries.jsonl')
+
+    jsonl.write(filename, [_entry(None, 8), _entry(None, 9), _entry(1, 10)])
+    jsonl.append(filename, [_entry(1, 10, 'new')])
+    os.remove(jsonl.index_filename(filename))
+
+    entries = jsonl.read(filename, [DATE])[DATE]
+    assert sorted((entry.id or 0, entry.start.hour, entry.notes) for entry in entries) == [
+        (0, 8, None), (0, 9, None), (1, 10, 'new')]
+
+
+def test_index_is_rebuilt_when_the_data_file_is_replaced(tmp_path):
+    filename = str(tmp_path / 'entries.jsonl')
+
+    jsonl.write(filename, [_entry(1, 8), _entry(2, 9)])
+    assert len(jsonl.read(filename, [DATE])[DATE]) == 2
+
+    other_filename = str(tmp_path / 'other.jsonl')
+    jsonl.write(other_filename, [_entry(3, 10, 'replaced')])
+    os.replace(other_filename, filename)
+
+    entries = jsonl.read(filename, [DATE])[DATE]
+    assert [(entry.id, entry.notes) for entry in entries] == [(3, 'replaced')]
+
+
+def test_index_is_rebuilt_when_the_data_file_is_truncated(tmp_path):
+    filename = str(tmp_path / 'entries.jsonl')
+
+    jsonl.write(filename, [_entry(1, 8), _entry(2, 9)])
+    with open(filename, 'rb') as data_file:
+        first_line = data_file.readline()
+    with open(filename, 'wb') as data_file:
+        data_file.write(first_line)
+
+    assert [entry.id for entry in jsonl.read(filename, [DATE])[DATE]] == [1]
+
+
+def test_append_rebuilds_an_index_that_is_out_of_date(tmp_path):
+    filename = str(tmp_path / 'entries.jsonl')
+
+    jsonl.write(filename, [_entry(1, 8), _entry(2, 9)])
+    with open(filename, 'rb') as data_file:
+        first_line = data_file.readline()
+    with open(filename, 'wb') as data_file:
+        data_file.write(first_line)
+
+    jsonl.append(filename, [_entry(3, 10)])
+
+    assert [entry.id for entry in jsonl.read(filename, [DATE])[DATE]] == [1, 3]
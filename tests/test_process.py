@@ -0,0 +1,116 @@
+"""
+Tests of the process scripts.
+"""
+import datetime
+
+import pytest
+
+from timesync.subcommands import process
+from timesync.utils import plugins
+from timesync.utils.records import TimeEntry
+
+DATES = {'date': 'range', 'start': '2019-12-01', 'end': '2019-12-05'}
+
+
+class _Service:
+    """Reader and writer of a service that is never contacted, the writer fails after writing fail_after records."""
+
+    def __init__(self):
+        self.read_ranges = []
+        self.written = {}
+        self.fail_after = None
+
+    def find_plugin(self, group, name):
+        if name == 'fake':
+            return {'timesheet_range_reader': self.reader, 'timesheet_writer': self.writer}.get(group)
+
+        return _find_plugin(group, name)
+
+    def reader(self, start_date, end_date, configuration):
+        self.read_ranges.append((start_date.date(), end_date.date()))
+
+        date = start_date
+        while date <= end_date:
+            yield date.date(), [TimeEntry(f'{date.day}-{hour}', date.replace(hour=hour),
+                                          date.replace(hour=hour, minute=30)) for hour in (8, 9)]
+            date += datetime.timedelta(1)
+
+    def writer(self, configuration, records, progress=None):
+        written = self.written.setdefault(configuration['filename'], [])
+
+        for record in records:
+            if self.fail_after is not None and len(written) >= self.fail_after:
+                raise RuntimeError('Connection lost')
+
+            written.append(record.id)
+            if progress is not None:
+                progress(record)
+
+
+_find_plugin = plugins.find_plugin
+
+
+@pytest.fixture
+def service(configuration, monkeypatch):
+    fake_service = _Service()
+    monkeypatch.setattr(plugins, 'find_plugin', fake_service.find_plugin)
+    return fake_service
+
+
+def _copy(filename):
+    return dict(DATES, type='copy', **{'from': {'id': 'fake', 'filename': 'source'},
+                                       'to': {'id': 'fake', 'filename': filename}})
+
+
+def _run_interrupted(service, script, fail_after):
+    service.fail_after = fail_after
+    with pytest.raises(RuntimeError):
+        process.run_script(script, 'script.yaml')
+
+    service.fail_after = None
+    service.read_ranges.clear()
+
+
+def test_resume_skips_the_completed_dates_and_records(service):
+    script = {'tasks': [_copy('destination')]}
+    _run_interrupted(service, script, 5)
+
+    assert service.written['destination'] == ['1-8', '1-9', '2-8', '2-9', '3-8']
+
+    service.written.clear()
+    process.run_script(script, 'script.yaml', resume=True)
+
+    assert service.read_ranges == [(datetime.date(2019, 12, 3), datetime.date(2019, 12, 5))]
+    assert service.written['destination'] == ['3-9', '4-8', '4-9', '5-8', '5-9']
+
+
+def test_resume_skips_the_completed_tasks(service):
+    script = {'tasks': [dict(_copy('first'), end='2019-12-01'), _copy('second')]}
+    _run_interrupted(service, script, 3)
+
+    assert service.written == {'first': ['1-8', '1-9'], 'second': ['1-8', '1-9', '2-8']}
+
+    service.written.clear()
+    process.run_script(script, 'script.yaml', resume=True)
+
+    assert service.written == {'second': ['2-9', '3-8', '3-9', '4-8', '4-9', '5-8', '5-9']}
+
+
+def test_run_without_resume_starts_again(service):
+    script = {'tasks': [_copy('destination')]}
+    _run_interrupted(service, script, 5)
+
+    service.written.clear()
+    process.run_script(script, 'script.yaml')
+
+    assert len(service.written['destination']) == 10
+
+
+def test_changed_script_is_not_resumed(service):
+    script = {'tasks': [_copy('destination')]}
+    _run_interrupted(service, script, 5)
+
+    service.written.clear()
+    process.run_script({'tasks': [dict(_copy('destination'), end='2019-12-04')]}, 'script.yaml', resume=True)
+
+    assert len(service.written['destination']) == 8
@@ -0,0 +1,79 @@
+"""
+Tests of the rate limiter of the API connections.
+"""
+import bisect
+
+import pytest
+
+from timesync.utils import ratelimit
+
+
+class _Clock:
+    """Simulated time of the rate limiter, sleeping advances the time instead of waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    simulated_clock = _Clock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', simulated_clock.monotonic)
+    monkeypatch.setattr(ratelimit.time, 'sleep', simulated_clock.sleep)
+    return simulated_clock
+
+
+def _most_requests_in_a_period(times, period):
+    return max(bisect.bisect_left(times, start + period) - index for index, start in enumerate(times))
+
+
+@pytest.mark.parametrize('requests, period', [(100, 15), (300, 300)])
+def test_requests_never_exceed_the_budget_of_a_period(clock, requests, period):
+    limiter = ratelimit.SlidingWindow(requests, period)
+
+    sent = []
+    for _ in range(requests * 5):
+        limiter.acquire()
+        sent.append(clock.now)
+        clock.now += 0.01
+        limiter.release()
+
+    assert _most_requests_in_a_period(sent, period) == requests
+    assert sent[-1] - sent[0] >= 4 * period
+
+
+def test_requests_are_counted_from_their_responses(clock):
+    limiter = ratelimit.SlidingWindow(2, 15)
+
+    limiter.acquire()
+    limiter.acquire()
+    clock.now += 20
+    limiter.release()
+    limiter.release()
+
+    # The requests were sent 20 seconds ago, but their responses were received at the current time.
+    assert limiter.acquire() == pytest.approx(15)
+
+
+def test_remaining_requests_reported_by_the_service_reduce_the_budget(clock):
+    limiter = ratelimit.SlidingWindow(100, 15)
+
+    limiter.update({'X-RateLimit-Remaining': '1'})
+
+    assert limiter.acquire() == 0
+    limiter.release()
+    assert limiter.acquire() == pytest.approx(15)
+
+
+def test_block_delays_the_next_request(clock):
+    limiter = ratelimit.SlidingWindow(100, 15)
+
+    limiter.block(5)
+
+    assert limiter.acquire() == pytest.approx(5)
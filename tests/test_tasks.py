@@ -0,0 +1,49 @@
+"""
+Tests of the execution engine of the tasks of a process script.
+"""
+from timesync.utils import tasks
+
+DATES = {'date': 'range', 'start': '2019-12-01', 'end': '2019-12-05'}
+
+
+def _delete(**destination):
+    return dict(DATES, type='delete', **{'from': dict({'id': 'harvest', 'project': 1, 'task': 2}, **destination)})
+
+
+def _copy(**destination):
+    return dict(DATES, type='copy', **{'from': {'id': 'tsheets', 'jobcode': 3},
+                                       'to': dict({'id': 'harvest', 'project': 1, 'task': 2}, **destination)})
+
+
+def _dependencies(task_configurations):
+    return [[dependency.index for dependency in task.dependencies] for task in tasks.build_graph(task_configurations)]
+
+
+def test_default_connection_named_explicitly_is_the_same_resource(configuration):
+    assert _dependencies([_delete(), _copy(connection='harvest')]) == [[], [0]]
+
+
+def test_connections_to_the_same_account_are_the_same_resource(configuration):
+    configuration['connections']['harvest-copy'] = dict(configuration['connections']['harvest'])
+
+    assert _dependencies([_delete(connection='harvest-copy'), _copy()]) == [[], [0]]
+
+
+def test_connections_to_other_accounts_are_other_resources(configuration):
+    configuration['connections']['harvest-other'] = {'account_id': 2, 'token': 'other-token'}
+
+    assert _dependencies([_delete(), _copy(connection='harvest-other')]) == [[], []]
+
+
+def test_tasks_of_other_dates_do_not_depend_on_each_other(configuration):
+    later_copy = dict(_copy(), start='2019-12-06', end='2019-12-10')
+
+    assert _dependencies([_delete(), later_copy]) == [[], []]
+
+
+def test_tasks_of_an_unknown_type_are_skipped(configuration):
+    processed = []
+
+    tasks.run([dict(_delete(), type='move'), _copy()], {'copy': processed.append})
+
+    assert processed == [_copy()]
@@ -1,37 +1,198 @@
 """Collection of disk entry points for manipulating content in files instead of an API."""
+import datetime
+import itertools
 import logging
+import os
+import threading
+
+from timesync.disk import jsonl
+from timesync.utils.records import TimeEntryBatch
 
 from ruamel.yaml import YAML
 
 LOGGER = logging.getLogger(__name__)
 
+FORMATS = ('yaml', 'jsonl')
+MODES = ('replace', 'merge')
+
+# Number of records that are dumped at a time when writing a YAML file.
+YAML_CHUNK_SIZE = 500
+
+# Parsed files, absolute path to a tuple of the file signature (modification time, size) and the date index.
+_date_indexes = {}
+_date_indexes_lock = threading.Lock()
+
 
 def time_sheet_writer(configuration, records):
-    """Write the entries to the file defined in the configuration section."""
+    """
+    Write the entries to the file defined in the configuration section.  By default the file is replaced, in merge
+    mode the entries are added to the file and entries with the same id as an existing entry replace it.  Except when
+    merging into a YAML file, the entries are written as they are consumed from the iterable.
+    """
+    mode = configuration.get('mode', 'replace')
+    if mode not in MODES:
+        raise RuntimeError(f'Unknown disk writer mode {mode}, must be one of: {", ".join(MODES)}')
 
-    output_structure = {
-        'records': records
-    }
+    if _file_format(configuration) == 'jsonl':
+        if mode == 'merge':
+            jsonl.append(configuration['filename'], records)
+        else:
+            jsonl.write(configuration['filename'], records)
+        return
 
     parser = YAML(typ='rt')
 
     try:
-        with open(configuration['filename'], 'w') as output_file:
-            _configuration = parser.dump(output_structure, output_file)
+        if mode == 'merge' and os.path.exists(configuration['filename']):
+            with open(configuration['filename'], 'r') as data_file:
+                output_structure = parser.load(data_file) or {}
+
+            output_structure['records'] = _merge_records(output_structure.get('records') or [],
+                                                         TimeEntryBatch(records).to_dicts())
+
+            with open(configuration['filename'], 'w') as output_file:
+                parser.dump(output_structure, output_file)
+        else:
+            with open(configuration['filename'], 'w') as output_file:
+                _dump_records(parser, records, output_file)
     except FileNotFoundError:
         raise RuntimeError(f'Cannot write to file {configuration["filename"]}')
+    finally:
+        _forget_date_index(configuration['filename'])
 
 
 def time_entry_reader(date, configuration):
     """Read the entries and return a list of entries that are apart of the date provided."""
-    parser = YAML(typ='rt')
-    date = date.date()
+    if _file_format(configuration) == 'jsonl':
+        return jsonl.read(configuration['filename'], [date.date()])[date.date()]
+
+    date_index = _load_date_index(configuration['filename'])
+
+    return date_index.get(date.date(), TimeEntryBatch())[:]
+
+
+def time_entry_range_reader(start_date, end_date, configuration):
+    """
+    Generator that reads the entries between two dates (inclusive).
+    :return: generator of (datetime.date, TimeEntryBatch) in date order, every date in the range is provided.
+    """
+    dates = []
+    current_date = start_date.date()
+    while current_date <= end_date.date():
+        dates.append(current_date)
+        current_date += datetime.timedelta(1)
+
+    if _file_format(configuration) == 'jsonl':
+        yield from jsonl.iter_dates(configuration['filename'], dates)
+        return
+
+    date_index = _load_date_index(configuration['filename'])
+
+    for date in dates:
+        yield date, date_index.get(date, TimeEntryBatch())[:]
+
+
+def estimate(action, configuration, start_date, end_date, records):
+    """Files on disk are not rate limited, reading and writing them does not make any requests."""
+    from timesync.utils import planner
+
+    return planner.Estimate('disk')
+
+
+def _dump_records(parser, records, output_file):
+    """
+    Write the records document one chunk of records at a time.  A list dumped on its own has the same layout as the
+    items of the records list, so the chunks are appended after the records key.
+    """
+    records = iter(records)
+
+    chunk = TimeEntryBatch(itertools.islice(records, YAML_CHUNK_SIZE))
+    if not chunk:
+        parser.dump({'records': []}, output_file)
+        return
 
+    output_file.write('records:\n')
+    while chunk:
+        parser.dump(chunk.to_dicts(), output_file)
+        chunk = TimeEntryBatch(itertools.islice(records, YAML_CHUNK_SIZE))
+
+
+def _merge_records(existing_records, records):
+    """
+    Replace the existing records that have the same id as a record, and add the rest to the end.  Records without an
+    id never replace a record, they are always added, the same as appending them to a jsonl file.
+    """
+    positions = {}
+    for position, record in enumerate(existing_records):
+        if record.get('id') is not None:
+            positions.setdefault(record['id'], []).append(position)
+
+    for record in records:
+        replaced = positions.get(record['id']) if record['id'] is not None else None
+
+        if replaced is None:
+            if record['id'] is not None:
+                positions[record['id']] = [len(existing_records)]
+            existing_records.append(record)
+            continue
+
+        existing_records[replaced[0]] = record
+        for position in replaced[1:]:
+            existing_records[position] = None
+        del replaced[1:]
+
+    return [record for record in existing_records if record is not None]
+
+
+def _file_format(configuration):
+    """Retrieve the format of the file defined in the configuration section, defaults to yaml."""
+    file_format = configuration.get('format', 'yaml')
+
+    if file_format not in FORMATS:
+        raise RuntimeError(f'Unknown disk format {file_format}, must be one of: {", ".join(FORMATS)}')
+
+    return file_format
+
+
+def _load_date_index(filename):
+    """
+    Retrieve the records of the file indexed by date.  The file is only parsed again if its modification time or size
+    has changed since it was last parsed.
+    :param str filename: file to read
+    :return: dict of datetime.date to the TimeEntryBatch of that date
+    """
     try:
-        with open(configuration['filename'], 'r') as data_file:
-            time_entries = parser.load(data_file).get('records', [])
+        file_stat = os.stat(filename)
     except FileNotFoundError:
-        LOGGER.error('Cannot read file %s', configuration['filename'])
-        raise RuntimeError(f'Cannot read file {configuration["filename"]}')
+        LOGGER.error('Cannot read file %s', filename)
+        raise RuntimeError(f'Cannot read file {filename}')
+
+    key = os.path.abspath(filename)
+    signature = (file_stat.st_mtime_ns, file_stat.st_size)
+
+    with _date_indexes_lock:
+        cached_signature, date_index = _date_indexes.get(key, (None, None))
+        if cached_signature == signature:
+            return date_index
+
+        LOGGER.debug('Parsing file %s', filename)
+        parser = YAML(typ='rt')
+
+        try:
+            with open(filename, 'r') as data_file:
+                time_entries = (parser.load(data_file) or {}).get('records', [])
+        except FileNotFoundError:
+            LOGGER.error('Cannot read file %s', filename)
+            raise RuntimeError(f'Cannot read file {filename}')
+
+        date_index = TimeEntryBatch(time_entries).by_date()
+
+        _date_indexes[key] = (signature, date_index)
+
+    return date_index
+
 
-    return [te for te in time_entries if te['date'] == date]
+def _forget_date_index(filename):
+    """Remove the parsed records of a file that has been written to."""
+    with _date_indexes_lock:
+        _date_indexes.pop(os.path.abspath(filename), None)
@@ -0,0 +1,302 @@
+"""
+JSON Lines storage for time entries.  Each record is stored on its own line of the data file, and a sidecar index file
+maps the dates to the byte offsets of their records, so that the records of a date can be read without parsing the
+rest of the file.
+
+The index file contains one line for each record: ``date<TAB>offset<TAB>length<TAB>id<TAB>mode``.  The id is empty for
+records without one, and the mode is ``a`` for the records that were appended, which replace the previous records with
+the same id, or ``w`` for the records written when the file was replaced, which are all kept.  The index is written
+after the data file, and is rebuilt when the data file has been changed without it.
+"""
+import datetime
+import json
+import logging
+import mmap
+import os
+import threading
+
+from timesync.utils import timestamps
+from timesync.utils.records import TimeEntry, TimeEntryBatch, as_time_entry
+
+LOGGER = logging.getLogger(__name__)
+
+INDEX_SUFFIX = '.idx'
+
+# Modes of the index lines.
+WRITTEN = 'w'
+APPENDED = 'a'
+
+# Keys of the records that contain datetime and date values.
+DATETIME_KEYS = ('start', 'end')
+DATE_KEYS = ('date',)
+
+# Parsed index files, absolute path to a tuple of the file signature (modification time, size) and the date index.
+_date_indexes = {}
+_date_indexes_lock = threading.RLock()
+
+
+def index_filename(filename):
+    """Name of the index file of a data file."""
+    return f'{filename}{INDEX_SUFFIX}'
+
+
+def write(filename, records):
+    """
+    Write the records to the data file one at a time, replacing the contents of the file, and write its index.
+    :param str filename: data file
+    :param records: iterable of TimeEntry or dict records
+    :return: number of records written
+    """
+    count = 0
+
+    try:
+        with open(filename, 'wb') as data_file, open(index_filename(filename), 'w') as index_file:
+            for record in records:
+                _write_record(data_file, index_file, record, WRITTEN)
+                count += 1
+    except FileNotFoundError:
+        raise RuntimeError(f'Cannot write to file {filename}')
+    finally:
+        _index_written(filename)
+
+    return count
+
+
+def append(filename, records):
+    """
+    Append the records to the data file one at a time and add them to its index.  Records with an id that is already
+    in the file replace the existing record, the line of the existing record is no longer referenced by the index.  The
+    existing contents of the file are not read.
+    :param str filename: data file
+    :param records: iterable of TimeEntry or dict records
+    :return: number of records written
+    """
+    if os.path.exists(filename) and not _index_is_current(filename):
+        rebuild_index(filename)
+
+    count = 0
+
+    try:
+        with open(filename, 'ab') as data_file, open(index_filename(filename), 'a') as index_file:
+            for record in records:
+                _write_record(data_file, index_file, record, APPENDED)
+                count += 1
+    except FileNotFoundError:
+        raise RuntimeError(f'Cannot write to file {filename}')
+    finally:
+        _index_written(filename)
+
+    return count
+
+
+def read(filename, dates):
+    """
+    Read the records of the dates provided.
+    :param str filename: data file
+    :param dates: iterable of datetime.date
+    :return: dict of datetime.date to the TimeEntryBatch of that date, every date requested is present.
+    """
+    return dict(iter_dates(filename, dates))
+
+
+def iter_dates(filename, dates):
+    """
+    Generator that reads the records of the dates provided one date at a time.
+    :param str filename: data file
+    :param dates: iterable of datetime.date
+    :return: generator of (datetime.date, TimeEntryBatch) in the order of the dates, every date requested is provided.
+    """
+    date_index = _load_date_index(filename)
+
+    try:
+        with open(filename, 'rb') as data_file:
+            if os.fstat(data_file.fileno()).st_size == 0:
+                for date in dates:
+                    yield date, TimeEntryBatch()
+                return
+
+            with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for date in dates:
+                    yield date, TimeEntryBatch(_decode(json.loads(data[offset:offset + length].decode('utf-8')))
+                                               for offset, length in sorted(date_index.get(date, [])))
+    except FileNotFoundError:
+        LOGGER.error('Cannot read file %s', filename)
+        raise RuntimeError(f'Cannot read file {filename}')
+
+
+def rebuild_index(filename):
+    """
+    Write the index of a data file from its contents, used when the index file is missing or out of date.  The file
+    does not record which of its records were appended, so the records with an id are indexed as appended records:
+    only the last record of each id is kept.  The records without an id are all kept.
+    :param str filename: data file
+    """
+    LOGGER.info('Building index for file %s', filename)
+
+    offset = 0
+    with open(filename, 'rb') as data_file, open(index_filename(filename), 'w') as index_file:
+        for line in data_file:
+            record = json.loads(line.decode('utf-8'))
+            index_file.write(_index_line(record['date'], offset, len(line), record.get('id'), APPENDED))
+            offset += len(line)
+
+    _index_written(filename)
+
+
+def _write_record(data_file, index_file, record, mode):
+    """Append a record to the data file and its location to the index file."""
+    record = as_time_entry(record)
+    line = (json.dumps(_encode(record), separators=(',', ':')) + '\n').encode('utf-8')
+
+    offset = data_file.tell()
+    data_file.write(line)
+    index_file.write(_index_line(record.date.isoformat(), offset, len(line), record.id, mode))
+
+
+def _index_line(date, offset, length, record_id, mode):
+    return f'{date}\t{offset}\t{length}\t{"" if record_id is None else record_id}\t{mode}\n'
+
+
+def _parse_index_line(line):
+    """
+    Parse a line of the index file.
+    :return: tuple of the date, offset, length, id (None for records without one) and mode of the record
+    """
+    fields = line.rstrip('\n').split('\t')
+    date, offset, length, record_id = fields[:4]
+
+    # Index files written by earlier versions have no mode, all of their records replaced the records with the same id.
+    if len(fields) < 5:
+        return date, int(offset), int(length), None if record_id in ('', 'None') else record_id, APPENDED
+
+    return date, int(offset), int(length), record_id or None, fields[4]
+
+
+def _load_date_index(filename):
+    """
+    Retrieve the locations of the records of the file indexed by date.  An appended record replaces the previous records
+    with the same id, all of the other records are kept.  The index is rebuilt if the data file has been changed
+    without it, and is only parsed again if either file has changed since it was last parsed.
+    :param str filename: data file
+    :return: dict of datetime.date to the list of (offset, length) of the records for that date
+    """
+    key = os.path.abspath(filename)
+
+    with _date_indexes_lock:
+        cached_signature, date_index = _date_indexes.get(key, (None, None))
+        if cached_signature is not None and cached_signature == _signature(filename):
+            return date_index
+
+        if not os.path.exists(filename):
+            LOGGER.error('Cannot read file %s', filename)
+            raise RuntimeError(f'Cannot read file {filename}')
+
+        if not _index_is_current(filename):
+            rebuild_index(filename)
+
+        signature = _signature(filename)
+
+        locations = []
+        positions = {}
+        with open(index_filename(filename), 'r') as index_file:
+            for line in index_file:
+                date, offset, length, record_id, mode = _parse_index_line(line)
+
+                if record_id is not None:
+                    if mode == APPENDED:
+                        for position in positions.pop(record_id, ()):
+                            locations[position] = None
+                    positions.setdefault(record_id, []).append(len(locations))
+
+                locations.append((date, offset, length))
+
+        date_index = {}
+        for date, offset, length in filter(None, locations):
+            date_index.setdefault(datetime.date(*(int(part) for part in date.split('-'))), []).append((offset, length))
+
+        _date_indexes[key] = (signature, date_index)
+
+    return date_index
+
+
+def _index_is_current(filename):
+    """
+    Check to see if the index file describes the contents of the data file: the data file has not been modified since
+    the index was written, and the last record of the index ends at the end of the data file.
+    """
+    try:
+        data_stat = os.stat(filename)
+        index_stat = os.stat(index_filename(filename))
+    except FileNotFoundError:
+        return False
+
+    if data_stat.st_mtime_ns > index_stat.st_mtime_ns:
+        LOGGER.warning('File %s was modified after its index', filename)
+        return False
+
+    if _indexed_size(filename) != data_stat.st_size:
+        LOGGER.warning('Index of file %s does not match its size', filename)
+        return False
+
+    return True
+
+
+def _indexed_size(filename):
+    """Size of the data file described by the index, the end of the last record of the index."""
+    with open(index_filename(filename), 'rb') as index_file:
+        index_file.seek(0, os.SEEK_END)
+        index_file.seek(max(index_file.tell() - 4096, 0))
+        lines = index_file.read().splitlines()
+
+    if not lines:
+        return 0
+
+    _, offset, length, _, _ = _parse_index_line(lines[-1].decode('utf-8'))
+    return offset + length
+
+
+def _signature(filename):
+    """Modification times and sizes of a data file and its index, the parsed index is used until they change."""
+    try:
+        return tuple((file_stat.st_mtime_ns, file_stat.st_size)
+                     for file_stat in (os.stat(filename), os.stat(index_filename(filename))))
+    except FileNotFoundError:
+        return None
+
+
+def _index_written(filename):
+    """
+    Mark the index of a data file as written after the data file, so that later changes to the data file alone are
+    detected, and remove its parsed index.
+    """
+    if os.path.exists(index_filename(filename)):
+        os.utime(index_filename(filename))
+
+    _forget_date_index(filename)
+
+
+def _forget_date_index(filename):
+    """Remove the parsed index of a file that has been written to."""
+    with _date_indexes_lock:
+        _date_indexes.pop(os.path.abspath(filename), None)
+
+
+def _encode(record):
+    """Convert a time entry into a dict record with its datetime and date values as ISO 8601 strings."""
+    encoded = record.to_dict()
+    for key in DATETIME_KEYS + DATE_KEYS:
+        if encoded.get(key) is not None:
+            encoded[key] = encoded[key].isoformat()
+    return encoded
+
+
+def _decode(record):
+    """Convert a dict record with ISO 8601 strings back into a time entry."""
+    for key in DATETIME_KEYS:
+        if record.get(key) is not None:
+            record[key] = timestamps.parse_timestamp(record[key])
+    for key in DATE_KEYS:
+        if record.get(key) is not None:
+            record[key] = timestamps.parse_date(record[key])
+    return TimeEntry.from_dict(record)
+
@@ -1,162 +1,224 @@
 """
-Connection that handles the request wrapping along with any of the authentication code that is required.
+Connection that handles the request wrapping along with any of the authentication code that is required.  A client is
+created for each connection of the configuration, so that many harvest accounts can be used by the same run.
 """
-import functools
 import logging
-import time
-
-from timesync.utils import configuration as config
-
-import requests
 
+from timesync.utils import http
 
 LOGGER = logging.getLogger(__name__)
 API_ROOT = 'https://api.harvestapp.com'
 
+# Connection of the configuration used by the readers/writers/deleters that do not define a connection.
+DEFAULT_CONNECTION = 'harvest'
+
+# Requests allowed by harvest in each period of seconds, and the number of items in each page of a query.
+RATE_LIMIT = (100, 15)
+PAGE_SIZE = 100
+
+# Seconds that the responses of the endpoints that rarely change are cached for.
+CACHE_TIME_TO_LIVE = {
+    'v2/users/me': 24 * 60 * 60,
+    'v2/company': 24 * 60 * 60,
+    'v2/users/me/project_assignments': 60 * 60,
+}
+
+
+class HarvestClient(http.Client):
+    """Client of the harvest account and user of a connection of the configuration."""
+
+    BACKEND = 'harvest'
+    DISPLAY_NAME = 'Harvest'
+    API_ROOT = API_ROOT
+    RATE_LIMIT = RATE_LIMIT
+    CACHE_TIME_TO_LIVE = CACHE_TIME_TO_LIVE
+
+    def __init__(self, connection_name=DEFAULT_CONNECTION):
+        """
+        :param str connection_name: key of the connection in the connections section of the configuration.
+        """
+        connection = http.get_connection(connection_name)
+
+        try:
+            token = connection['token']
+            account_id = connection['account_id']
+        except KeyError:
+            raise RuntimeError(f'Harvest Configuration details missing for connection {connection_name}')
+
+        headers = {'Authorization': f'Bearer {token}',
+                   'Harvest-Account-Id': f'{account_id}',
+                   'User-Agent': 'timesync (rerobins@reardenlogic.com)'}
+
+        # Harvest allows 100 requests every 15 seconds for an account, shared by all of the connections to it.
+        super().__init__(connection_name, headers, f'{account_id} {headers["Authorization"]}', account_id)
+
+    def current_user_details(self):
+        """Return data about the current user."""
+        return self._cached('v2/users/me', lambda: self._get('v2/users/me'))
+
+    def get_company_settings(self):
+        """
+        Company settings will determine how to set the values in the time sheets (start/end times, or just duration)
+        """
+        def fetch():
+            result = self._get('v2/company')
+            LOGGER.debug('Company Stats: %s', result)
+            return result
+
+        return self._cached('v2/company', fetch)
+
+    def current_assignments(self, page=1, updated_since=None, revalidate=False):
+        """
+        Retrieve all of the project assignments associated with the current user.  This is used to check configuration
+        and to provide a list of all of the tasks that can be used in the configuration file.
+        :param int page: the page to fetch data of
+        :param datetime.datetime updated_since: only retrieve the project assignments updated after this time.
+        :param bool revalidate: check a cached response with the API even if it has not expired
+        :return: dict
+        """
+        query_params = {'page': page}
+
+        if updated_since is not None:
+            query_params['updated_since'] = updated_since.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        return self._get('v2/users/me/project_assignments', query_params, revalidate)
+
+    def get_time_entries(self, work_date, project_id, current_page=1):
+        """
+        Retrieve all of the time sheets that are associated with the current logged in user.
+        :param datetime.date work_date: the date to retrieve the time sheets for.
+        :param int project_id: the job code
+        :param int current_page: the page to fetch data of
+        :return: list of time sheets for the parameters provided.
+        """
+        return self.get_time_entries_range(work_date, work_date, project_id, current_page)
+
+    def get_time_entries_range(self, start_date, end_date, project_id, current_page=1):
+        """
+        Retrieve all of the time sheets between two dates (inclusive) that are associated with the current logged in
+        user.
+        :param datetime.date start_date: the first date to retrieve the time sheets for.
+        :param datetime.date end_date: the last date to retrieve the time sheets for.
+        :param int project_id: the job code
+        :param int current_page: the page to fetch data of
+        :return: list of time sheets for the parameters provided.
+        """
+
+        query_params = {'project_id': f'{project_id}',
+                        'from': start_date.strftime('%Y-%m-%d'),
+                        'to': end_date.strftime('%Y-%m-%d'),
+                        'user_id': self.current_user_details()['id'],
+                        'page': current_page
+                        }
+
+        return self._get('v2/time_entries', query_params)
+
+    def create_time_entry(self, project_id, task_id, start_time, end_time, notes=None):
+        """
+        Create a new time entry for the project and task provided between the time hours.  This will check to see if a
+        duration should be stored or if start and end time values should be provided.
+        :param int project_id:
+        :param int task_id:
+        :param datetime.datetime start_time:
+        :param datetime.datetime end_time:
+        :param notes: any additional notes to be stored in the time entry
+        :return: the time entry that was created
+        """
+        payload = self.time_entry_payload(project_id, task_id, start_time, end_time, notes)
+
+        return self._post('v2/time_entries', payload)
+
+    def update_time_entry(self, entry_id, project_id, task_id, start_time, end_time, notes=None):
+        """
+        Replace the values of an existing time entry, see create_time_entry for the parameters.
+        :param int entry_id: identifier of the time entry to update
+        :return: the time entry that was updated, or None if the time entry does not exist
+        """
+        payload = self.time_entry_payload(project_id, task_id, start_time, end_time, notes)
+
+        # Harvest does not clear the notes when they are left out of an update.
+        payload.setdefault('notes', '')
+
+        return self._patch(f'v2/time_entries/{entry_id}', payload)
+
+    def time_entry_payload(self, project_id, task_id, start_time, end_time, notes):
+        """Build the values of a time entry based on the company settings."""
+        company_settings = self.get_company_settings()
+
+        payload = {
+            'project_id': project_id,
+            'task_id': task_id,
+            'spent_date': start_time.strftime('%Y-%m-%d'),
+        }
+
+        if notes:
+            payload['notes'] = notes
+
+        # Need to store start and end times.
+        if company_settings['wants_timestamp_timers']:
+
+            time_format = '%H:%M'
+            if company_settings['clock'] == '12h':
+                time_format = '%I:%M%p'
+
+            payload['started_time'] = start_time.time().strftime(time_format).lower()
+            payload['ended_time'] = end_time.time().strftime(time_format).lower()
 
-@functools.lru_cache(maxsize=1)
-def current_user_details():
-    """Return data about the current user."""
-    return _get('v2/users/me')
-
-
-@functools.lru_cache(maxsize=1)
-def get_company_settings():
-    """Company settings will determine how to set the values in the time sheets (start/end times, or just duration)"""
-    result =  _get('v2/company')
-    LOGGER.debug('Company Stats: %s', result)
-    return result
-
-
-@functools.lru_cache(maxsize=1)
-def current_assignments(page=1):
-    """
-    Retrieve all of the project assignments associated with the current user.  This is used to check configuration and
-    to provide a list of all of the tasks that can be used in the configuration file.
-    :return: dict
-    """
-    query_params = {'page': page}
-
-    return _get('v2/users/me/project_assignments', query_params)
-
-
-def get_time_entries(work_date, project_id, current_page=1):
-    """
-    Retrieve all of the time sheets that are associated with the current logged in user.
-    :param datetime.date work_date: the date to retrieve the time sheets for.
-    :param int project_id: the job code
-    :param int current_page: the page to fetch data of
-    :return: list of time sheets for the parameters provided.
-    """
-
-    query_params = {'project_id': f'{project_id}',
-                    'from': work_date.strftime('%Y-%m-%d'),
-                    'to': work_date.strftime('%Y-%m-%d'),
-                    'user_id': current_user_details()['id'],
-                    'page': current_page
-                    }
-
-    return _get('/v2/time_entries', query_params)
+        else:
+            duration = end_time - start_time
 
+            hours = round(duration.total_seconds() / 3600, 2)
+            payload['hours'] = hours
+
+        return payload
 
-def create_time_entry(project_id, task_id, start_time, end_time, notes=None):
-    """
-    Create a new time entry for the project and task provided between the time hours.  This will check to see if a
-    duration should be stored or if start and end time values should be provided.
-    :param int project_id:
-    :param int task_id:
-    :param datetime.datetime start_time:
-    :param datetime.datetime end_time:
-    :param notes: any additional notes to be stored in the time entry
-    :return:
-    """
-    company_settings = get_company_settings()
-
-    payload = {
-        'project_id': project_id,
-        'task_id': task_id,
-        'spent_date': start_time.strftime('%Y-%m-%d'),
-    }
-
-    if notes:
-        payload['notes'] = notes
-
-    # Need to store start and end times.
-    if company_settings['wants_timestamp_timers']:
-
-        time_format = '%H:%M'
-        if company_settings['clock'] == '12h':
-            time_format = '%I:%M%p'
-
-        payload['started_time'] = start_time.time().strftime(time_format).lower()
-        payload['ended_time'] = end_time.time().strftime(time_format).lower()
-
-    else:
-        duration = end_time - start_time
+    def delete_time_entry(self, entry_id):
+        return self._delete(f'v2/time_entries/{entry_id}')
 
-        hours = round(duration.total_seconds() / 3600, 2)
-        payload['hours'] = hours
+    def _post(self, api_path, post_parameters=None):
+        results = self._request('POST', api_path, json=post_parameters)
+        self._check_access(results)
 
-    _post('v2/time_entries', payload)
+        if not results.ok:
+            raise RuntimeError(f'Error posting to Harvest API: {results.status_code} {results.text}')
 
+        return results.json()
 
-def delete_time_entry(entry_id):
-    return _delete(f'v2/time_entries/{entry_id}')
+    def _patch(self, api_path, patch_parameters=None):
+        results = self._request('PATCH', api_path, json=patch_parameters)
+        self._check_access(results)
 
+        if results.status_code == 404:
+            return None
+        elif not results.ok:
+            raise RuntimeError(f'Error updating Harvest API: {results.status_code} {results.text}')
 
-def _get(api_path, query_parameters=None):
-    """Retrieve data from the path provided."""
-    headers = _get_headers()
-    results = requests.get(f'{API_ROOT}/{api_path}', headers=headers, params=query_parameters)
+        return results.json()
 
-    if results.status_code == 401:
-        raise RuntimeError(f'Error Access Harvest API: {results.json()["error_description"]}')
-    elif results.status_code == 429:
-        LOGGER.warning('Rate Limit reached, sleeping for 15 seconds before re-running.')
-        time.sleep(15)
-        return _post(api_path, query_parameters)
+    def _delete(self, api_path):
+        result = self._request('DELETE', api_path)
 
-    return results.json()
+        return result.status_code == 200
 
 
-def _post(api_path, post_parameters=None):
-    headers = _get_headers()
+_clients = http.Clients(HarvestClient, DEFAULT_CONNECTION)
 
-    results = requests.post(f'{API_ROOT}/{api_path}', headers=headers, json=post_parameters)
 
-    if results.status_code == 401:
-        raise RuntimeError(f'Error Access Harvest API: {results.json()["error_description"]}')
-    elif results.status_code == 429:
-        LOGGER.warning('Rate Limit reached, sleeping for 15 seconds before re-running.')
-        time.sleep(15)
-        return _post(api_path, post_parameters)
-
-    return results.json()
-
-
-def _delete(api_path):
-    headers = _get_headers()
+def get_client(connection_name=None):
+    """
+    Retrieve the client of a connection of the configuration, the client is created the first time it is used.
+    :param str connection_name: key of the connection in the connections section of the configuration, None for the
+    default connection
+    :return: HarvestClient
+    """
+    return _clients.get(connection_name)
 
-    result = requests.delete(f'{API_ROOT}/{api_path}', headers=headers)
 
-    return result.status_code == 200
+def client_for(configuration):
+    """Retrieve the client of the ``connection`` of a reader/writer/deleter configuration."""
+    return get_client(configuration.get('connection'))
 
 
-@functools.lru_cache(maxsize=1)
-def _get_headers():
-    """
-    Load the configuration file and create the headers required for accessing the harvest apis.
-    :return: dictionary of headers
-    """
-    try:
-        connections = config.get_configuration()['connections']
-        harvest_configuration = connections['harvest']
-
-        token = harvest_configuration['token']
-        account_id = harvest_configuration['account_id']
-    except KeyError:
-        raise RuntimeError('Harvest Configuration details missing')
-
-    return {'Authorization': f'Bearer {token}',
-            'Harvest-Account-Id': f'{account_id}',
-            'User-Agent': 'timesync (rerobins@reardenlogic.com)'}
+def reset_configuration():
+    """Close and forget the clients created from the configuration, they are created again by the next request."""
+    _clients.reset()
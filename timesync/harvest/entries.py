@@ -1,78 +1,144 @@
 """
 Entry points that are used to query the data in the APIs.
 """
+import datetime
 import logging
 
 from timesync.harvest import connection as harvest
+from timesync.utils import catalog, executor, pagination
+from timesync.utils.records import as_time_entry
 
 import tabulate
 
 LOGGER = logging.getLogger(__name__)
 
 
-def time_entries(date, project_id):
+def time_entries(client, date, project_id):
     """
     Generator that iterates through all of the time entries of a specified day and project.
     :return:
     """
-    current_page = 1
+    return time_entries_range(client, date, date, project_id)
 
-    while True:
-        _time_entries = harvest.get_time_entries(date, project_id, current_page)
 
+def time_entries_range(client, start_date, end_date, project_id):
+    """
+    Generator that iterates through all of the time entries between two dates (inclusive) for a project.
+    :return:
+    """
+    def fetch_page(page):
+        return client.get_time_entries_range(start_date, end_date, project_id, page)
+
+    for _time_entries in pagination.total_pages(fetch_page, client.page_workers()):
         for time_entry in _time_entries['time_entries']:
             yield time_entry
 
-        current_page = _time_entries['next_page']
-        if current_page is None:
-            break
 
-
-def project_assignments():
+def project_assignments(client, updated_since=None, revalidate=False):
     """
     Generator that will provide all of the assignments that a user has
+    :param client: client of the harvest connection
+    :param datetime.datetime updated_since: only provide the assignments updated after this time.
+    :param bool revalidate: check the cached responses with the API even if they have not expired
     :return:
     """
-    current_page = 1
-    while True:
-
-        assignment_data = harvest.current_assignments(current_page)
+    def fetch_page(page):
+        return client.current_assignments(page, updated_since, revalidate)
 
+    for assignment_data in pagination.total_pages(fetch_page, client.page_workers()):
         for project_assignment in assignment_data['project_assignments']:
             yield project_assignment
 
-        current_page = assignment_data['next_page']
-        if current_page is None:
-            break
-
 
-def task_assignments():
+def task_assignments(connection=None):
     """
     Retrieve all of the task assignments that are associated with the currently logged in user.
+    :param str connection: connection of the configuration, None for the default connection
     """
-    data_rows = []
+    task_catalog = catalog.get_catalog()
+    refresh_catalog(task_catalog, connection=connection)
 
-    for project_assignment in project_assignments():
+    data_rows = [(project_id, project_name, task_id, task_name, task_assignment_id)
+                 for task_assignment_id, project_id, project_name, task_id, task_name, _ in
+                 task_catalog.harvest_assignments(harvest.get_client(connection).account_key, active_only=True)]
+
+    headers = ['Project Id', 'Project Name', 'Task Id', 'Task Name', 'Task Assignment']
+    print(tabulate.tabulate(data_rows, headers, tablefmt='simple'))
+
+
+def refresh_catalog(task_catalog, full=False, if_stale=False, connection=None):
+    """
+    Refresh the task assignments of the current user in the catalog.  Only the assignments that were updated since the
+    last refresh are retrieved, unless a full refresh is requested or the last full refresh is older than the full
+    refresh age.  A full refresh replaces the assignments of the account once all of them are retrieved, and checks the
+    cached responses with the API.
+    :param task_catalog: catalog to refresh
+    :param bool full: replace the contents of the catalog instead of updating it
+    :param bool if_stale: only refresh the catalog if it is older than its maximum age
+    :param str connection: connection of the configuration, None for the default connection
+    """
+    client = harvest.get_client(connection)
+    account = client.account_key
+
+    if if_stale and not task_catalog.is_stale(account):
+        return
+
+    # Removed assignments are only found by listing all of the assignments, which replaces the catalog of the account.
+    full = full or task_catalog.needs_full_refresh(account)
+    updated_since = None if full else task_catalog.refreshed_at(account)
+    refreshed_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+    LOGGER.info('Refreshing harvest catalog, updated since: %s', updated_since)
+
+    assignments = []
+    for project_assignment in project_assignments(client, updated_since, revalidate=full):
 
         project_id = project_assignment['project']['id']
         project_name = project_assignment['project']['name']
 
         for task_assignment in project_assignment['task_assignments']:
+            assignments.append((task_assignment['id'], project_id, project_name,
+                                task_assignment['task']['id'], task_assignment['task']['name'],
+                                bool(project_assignment.get('is_active', True) and task_assignment['is_active'])))
 
-            if task_assignment['is_active']:
+    task_catalog.store_harvest_assignments(account, assignments, replace=full)
+    task_catalog.set_refreshed_at(account, refreshed_at, full)
 
-                task_id = task_assignment['task']['id']
-                task_name = task_assignment['task']['name']
 
-                data_rows.append((project_id, project_name, task_id, task_name, task_assignment['id']))
+def validate_configuration(configuration, task_catalog):
+    """
+    Check the project and task of a reader/writer/deleter configuration against the catalog.  Projects and tasks that
+    are defined by name are replaced with their ids.
+    :return: list of error messages
+    """
+    if 'project' not in configuration or 'task' not in configuration:
+        return ['harvest requires both a project and a task']
 
-    headers = ['Project Id', 'Project Name', 'Task Id', 'Task Name', 'Task Assignment']
-    print(tabulate.tabulate(data_rows, headers, tablefmt='simple'))
+    account = harvest.client_for(configuration).account_key
+
+    found_assignments = task_catalog.harvest_assignments(account, configuration['project'], configuration['task'],
+                                                         active_only=True)
+    matches = {(project_id, task_id) for _, project_id, _, task_id, _, _ in found_assignments}
+
+    if len(matches) == 1:
+        configuration['project'], configuration['task'] = matches.pop()
+        return []
+    elif matches:
+        return [f'harvest project {configuration["project"]} and task {configuration["task"]} match more than one '
+                f'task assignment, use their ids instead']
 
+    if not task_catalog.harvest_assignments(account, configuration['project']):
+        return [f'harvest project {configuration["project"]} is not assigned to the current user']
 
-def time_sheet_writer(configuration, records):
+    return [f'harvest task {configuration["task"]} is not an active task of project {configuration["project"]}']
+
+
+def time_sheet_writer(configuration, records, progress=None):
     """"
     Write the records to the harvest application defined by configuration.
+    :param configuration:
+    :param records: iterable of records
+    :param progress: optional method called with each record once its time entry has been created
     """
 
     try:
@@ -81,9 +147,164 @@ def time_sheet_writer(configuration, records):
     except KeyError:
         raise RuntimeError('Harvest writer is not configured properly')
 
+    client = harvest.client_for(configuration)
+
+    def create_record(record):
+        LOGGER.info('Inserting record: %s -> %s [%s]', record.start, record.end, record.notes)
+        client.create_time_entry(project_id, task_id, record.start, record.end, record.notes)
+
+        if progress is not None:
+            progress(record)
+
+    executor.run_batch(create_record, (as_time_entry(record) for record in records), client.write_workers(),
+                       'time entry insert')
+
+
+def time_sheet_reconcile_writer(configuration, records, start_date, end_date):
+    """
+    Make the time entries of the harvest application defined by configuration between two dates (inclusive) match the
+    records provided.  Time entries that already match a record are left alone, the remaining records update a time
+    entry of the same day that does not match any record, or create a new time entry.  Time entries that are left over
+    are deleted.
+    :param configuration:
+    :param records: records that should be in the application
+    :param start_date: first date of the records
+    :param end_date: last date of the records
+    """
+
+    try:
+        task_id = configuration['task']
+        project_id = configuration['project']
+    except KeyError:
+        raise RuntimeError('Harvest writer is not configured properly')
+
+    client = harvest.client_for(configuration)
+
+    unmatched_entries = {}
+    for time_entry in time_entries_range(client, start_date, end_date, project_id):
+        if time_entry['task']['id'] == task_id:
+            unmatched_entries.setdefault(_entry_key(time_entry), []).append(time_entry)
+
+    unmatched_records = []
     for record in records:
-        LOGGER.info('Inserting record: %s -> %s [%s]', record['start'], record['end'], record['notes'])
-        harvest.create_time_entry(project_id, task_id, record['start'], record['end'], record['notes'])
+        record = as_time_entry(record)
+        payload = client.time_entry_payload(project_id, task_id, record.start, record.end, record.notes)
+        matches = unmatched_entries.get(_entry_key(payload))
+
+        if matches:
+            matches.pop()
+        else:
+            unmatched_records.append((payload['spent_date'], record))
+
+    leftover_entries = {}
+    for matches in unmatched_entries.values():
+        for time_entry in matches:
+            leftover_entries.setdefault(time_entry['spent_date'], []).append(time_entry['id'])
+
+    updates = []
+    creates = []
+    for spent_date, record in unmatched_records:
+        if leftover_entries.get(spent_date):
+            updates.append((leftover_entries[spent_date].pop(), record))
+        else:
+            creates.append(record)
+
+    deletes = [entry_id for entry_ids in leftover_entries.values() for entry_id in entry_ids]
+
+    LOGGER.info('Reconciling %s -> %s: %s creates, %s updates, %s deletes', start_date, end_date, len(creates),
+                len(updates), len(deletes))
+
+    def create_record(record):
+        LOGGER.info('Inserting record: %s -> %s [%s]', record.start, record.end, record.notes)
+        client.create_time_entry(project_id, task_id, record.start, record.end, record.notes)
+
+    def update_record(update):
+        entry_id, record = update
+        LOGGER.info('Updating record: %s -> %s [%s]', record.start, record.end, record.notes)
+        return client.update_time_entry(entry_id, project_id, task_id, record.start, record.end,
+                                         record.notes) is not None
+
+    executor.run_batch(update_record, updates, client.write_workers(), 'time entry update')
+    executor.run_batch(create_record, creates, client.write_workers(), 'time entry insert')
+    executor.run_batch(client.delete_time_entry, deletes, client.write_workers(), 'time entry delete')
+
+
+def _entry_key(values):
+    """
+    Build the key used to match a time entry to a record from the values of a time entry, or from the payload that
+    would be used to create it.  Start and end times are compared when they are stored, otherwise the hours are.
+    """
+    if values.get('started_time') and values.get('ended_time'):
+        duration = (_normalize_time(values['started_time']), _normalize_time(values['ended_time']))
+    else:
+        duration = round(float(values.get('hours') or 0), 2)
+
+    return values['spent_date'], duration, (values.get('notes') or '').strip()
+
+
+def _normalize_time(value):
+    """Convert a time value in either the 12h (8:00am) or 24h (08:00) clock format into minutes since midnight."""
+    value = value.strip().lower()
+
+    meridiem = None
+    if value.endswith(('am', 'pm')):
+        meridiem = value[-2:]
+        value = value[:-2]
+
+    hours, minutes = (int(part) for part in value.split(':')[:2])
+
+    if meridiem is not None:
+        hours = hours % 12 + (12 if meridiem == 'pm' else 0)
+
+    return hours * 60 + minutes
+
+
+def time_sheet_sync_writer(configuration, changes, copied_entries):
+    """
+    Apply the changes of a source to the harvest application defined by configuration.  Changed records that have been
+    copied before update their time entry, the others create a new time entry.  Deleted records delete the time entry
+    they were copied to.
+    :param configuration:
+    :param dict changes: 'changed' records and 'deleted' record ids as returned by a changes reader
+    :param copied_entries: mapping of the source record ids to the time entry ids, updated as the changes are applied
+    """
+
+    try:
+        task_id = configuration['task']
+        project_id = configuration['project']
+    except KeyError:
+        raise RuntimeError('Harvest writer is not configured properly')
+
+    client = harvest.client_for(configuration)
+
+    def write_record(record):
+        record = as_time_entry(record)
+        entry_id = copied_entries.get(record.id)
+
+        if entry_id is not None:
+            LOGGER.info('Updating record: %s -> %s [%s]', record.start, record.end, record.notes)
+            if client.update_time_entry(entry_id, project_id, task_id, record.start, record.end,
+                                         record.notes) is not None:
+                return
+            LOGGER.warning('Time entry %s of record %s no longer exists, creating it again', entry_id, record.id)
+
+        LOGGER.info('Inserting record: %s -> %s [%s]', record.start, record.end, record.notes)
+        time_entry = client.create_time_entry(project_id, task_id, record.start, record.end, record.notes)
+        copied_entries.record(record.id, time_entry['id'])
+
+    def delete_record(record_id):
+        entry_id = copied_entries.get(record_id)
+        if entry_id is None:
+            return
+
+        LOGGER.info('Deleting time entry %s of record %s', entry_id, record_id)
+        if client.delete_time_entry(entry_id):
+            copied_entries.forget(record_id)
+        else:
+            return False
+
+    executor.run_batch(write_record, changes['changed'], client.write_workers(), 'time entry write')
+    executor.run_batch(delete_record, changes['deleted'], client.write_workers(), 'time entry delete')
 
 
 def time_sheet_delete(configuration, date):
@@ -93,6 +314,18 @@ def time_sheet_delete(configuration, date):
     :param date:
     :return:
     """
+    time_sheet_range_delete(configuration, date, date)
+
+
+def time_sheet_range_delete(configuration, start_date, end_date):
+    """
+    Delete all of the time entries between two dates (inclusive) for the configuration provided.  The task assignments
+    are resolved once and the candidate entries are fetched with a single query for the whole range.
+    :param configuration:
+    :param start_date:
+    :param end_date:
+    :return:
+    """
 
     try:
         task_id = configuration['task']
@@ -100,25 +333,71 @@ def time_sheet_delete(configuration, date):
     except KeyError:
         raise RuntimeError('Harvest writer is not configured properly')
 
-    # First need to find all of the work assignment identifiers from the project based on the task id provided.
-    found_task_assignments = []
-    for project_assignment in project_assignments():
-        if project_assignment['project']['id'] == project_id:
+    client = harvest.client_for(configuration)
 
-            for task_assignment in project_assignment['task_assignments']:
-                if task_assignment['task']['id'] == task_id:
-                    found_task_assignments.append(task_assignment['id'])
+    found_task_assignments = _find_task_assignments(client, project_id, task_id)
 
     LOGGER.debug(f'Found task assignments: %s', found_task_assignments)
 
     entries_to_delete = []
 
-    for time_entry in time_entries(date, project_id):
+    for time_entry in time_entries_range(client, start_date, end_date, project_id):
         if time_entry['task_assignment']['id'] in found_task_assignments:
             entries_to_delete.append(time_entry['id'])
 
-    LOGGER.info('Entries to delete %s %s', date, entries_to_delete)
+    LOGGER.info('Entries to delete %s -> %s %s', start_date, end_date, entries_to_delete)
+
+    executor.run_batch(client.delete_time_entry, entries_to_delete, client.write_workers(), 'time entry delete')
+
+
+def reset_configuration():
+    """Forget the values loaded from the configuration, called when the configuration file is loaded again."""
+    harvest.reset_configuration()
+
+
+def account_key(configuration):
+    """Key of the harvest account and user that a reader/writer/deleter configuration touches the entries of."""
+    return harvest.client_for(configuration).account_key
+
+
+def estimate(action, configuration, start_date, end_date, records):
+    """
+    Estimate the requests made to harvest by an action of a task, without making any requests.
+    :param str action: 'write', 'reconcile', 'sync' or 'delete'
+    :param configuration:
+    :param start_date: first date of the task
+    :param end_date: last date of the task
+    :param int records: number of records expected
+    :return: planner.Estimate
+    """
+    from timesync.utils import planner
+
+    client = harvest.client_for(configuration)
+
+    reads = writes = deletes = 0
+    if action in ('reconcile', 'delete'):
+        reads = planner.pages(records, harvest.PAGE_SIZE)
+    if action in ('write', 'reconcile', 'sync'):
+        writes = records
+    if action == 'delete':
+        deletes = records
+
+    return planner.Estimate(client.connection_name, reads, writes, deletes, client.rate_budget(), client.page_workers(),
+                            client.write_workers())
+
+
+def _find_task_assignments(client, project_id, task_id):
+    """
+    Find all of the work assignment identifiers from the project based on the task id provided.  The catalog is
+    refreshed when it does not contain any.
+    :return: list of task assignment ids
+    """
+    task_catalog = catalog.get_catalog()
+    refresh_catalog(task_catalog, if_stale=True, connection=client.connection_name)
+
+    found_task_assignments = task_catalog.harvest_assignments(client.account_key, project_id, task_id)
+    if not found_task_assignments:
+        refresh_catalog(task_catalog, connection=client.connection_name)
+        found_task_assignments = task_catalog.harvest_assignments(client.account_key, project_id, task_id)
 
-    for entry in entries_to_delete:
-        if not harvest.delete_time_entry(entry):
-            LOGGER.error(f'ERROR deleting time entry: %s', entry)
+    return [task_assignment[0] for task_assignment in found_task_assignments]
@@ -3,16 +3,12 @@ Command line entry point for the script.
 """
 import argparse
 import logging
-import logging.config
-import pkg_resources
 import sys
 
 
-from timesync.subcommands import task_assignments, process
-from timesync.utils import configuration
-
-from ruamel.yaml import YAML
-from ruamel.yaml.parser import ParserError as YAMLParserError
+from timesync.subcommands import catalog, task_assignments, process, serve
+from timesync.utils import configuration, metrics
+from timesync.utils.plugins import metadata
 
 
 def _build_arguments():
@@ -22,10 +18,17 @@ def _build_arguments():
                         help=f'Specify a configuration file, default is {configuration.DEFAULT_CONFIGURATION_FILE}')
     parser.add_argument('-l', '--logger-config',
                         help=f'Specify a logger configuration file.  If not defined, default configuration is used.')
+    parser.add_argument('--metrics-json',
+                        help='Write the metrics of the requests made to the APIs to this file as JSON.')
+    parser.add_argument('--metrics-prom',
+                        help='Write the metrics of the requests made to the APIs to this file in the Prometheus text '
+                             'file format.')
 
     subparsers = parser.add_subparsers(help='sub-command help')
     task_assignments.create_argument_parser(subparsers)
+    catalog.create_argument_parser(subparsers)
     process.create_argument_parser(subparsers)
+    serve.create_argument_parser(subparsers)
 
     return parser
 
@@ -36,11 +39,16 @@ def main():
 
     # Configure logging for the application
     if args.logger_config:
+        from logging.config import dictConfig
+
+        from ruamel.yaml import YAML
+        from ruamel.yaml.parser import ParserError as YAMLParserError
+
         try:
             with open(args.logger_config) as logging_configuration:
                 yaml_parser = YAML(typ='rt')
                 logging_definition = yaml_parser.load(logging_configuration)
-            logging.config.dictConfig(logging_definition)
+            dictConfig(logging_definition)
         except FileNotFoundError:
             logger = logging.getLogger(__name__)
             logger.error('Could not find file: %s', args.logger_config)
@@ -60,7 +68,7 @@ def main():
     logger = logging.getLogger(__name__)
 
     # Display the version information for the application.
-    version_information = pkg_resources.get_distribution('timesync').version
+    version_information = metadata.version('timesync')
     logger.info(f'Time Sync -- Version: %s', version_information)
 
     try:
@@ -75,6 +83,28 @@ def main():
     except RuntimeError as rte:
         logger.error(rte)
         sys.exit(-1)
+    finally:
+        _export_metrics(args)
+
+
+def _export_metrics(args):
+    """Log the summary of the requests made to the APIs, and write the metrics files that were requested."""
+    logger = logging.getLogger(__name__)
+
+    summary = metrics.REGISTRY.summary()
+    if summary is not None:
+        logger.info('Request summary:\n%s', summary)
+
+    for filename, export in ((args.metrics_json, metrics.REGISTRY.to_json),
+                             (args.metrics_prom, metrics.REGISTRY.to_prometheus)):
+        if filename is None:
+            continue
+
+        try:
+            with open(filename, 'w') as metrics_file:
+                metrics_file.write(export())
+        except OSError as ose:
+            logger.error('Could not write metrics file %s: %s', filename, ose)
 
 
 if __name__ == '__main__':
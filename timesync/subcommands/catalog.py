@@ -0,0 +1,26 @@
+"""
+Create the sub command for refreshing the local catalog of task assignments.
+"""
+from timesync.utils import plugins
+
+
+def create_argument_parser(subparser):
+    parser = subparser.add_parser('catalog', help='Refresh the local catalog of the task assignments of a time sheet '
+                                                  'service.')
+
+    parser.add_argument('service', type=str, help='time sheet service to refresh', default=None)
+    parser.add_argument('--full', action='store_true', help='replace the catalog instead of only retrieving the '
+                                                            'assignments that changed since the last refresh')
+
+    parser.add_argument('--connection', type=str, default=None,
+                        help='connection of the configuration to use, the harvest or t-sheets connection is used by '
+                             'default')
+
+    parser.set_defaults(func=_main)
+
+
+def _main(args):
+    from timesync.utils import catalog
+
+    refresh_method = plugins.load_plugin('catalog_refresh', args.service)
+    refresh_method(catalog.get_catalog(), full=args.full, connection=args.connection)
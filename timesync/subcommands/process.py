@@ -2,62 +2,381 @@
 Processes a script file of tasks.
 """
 import argparse
+import collections.abc
+import hashlib
+import inspect
+import json
 import logging
+import threading
+from datetime import datetime, timedelta, timezone
 
-from ruamel.yaml import YAML
-from ruamel.yaml.parser import ParserError as YAMLParserError
-
-from timesync.utils import plugins
-from timesync.utils.configuration import parse_date
+from timesync.utils import pipeline, plugins
+from timesync.utils.configuration import date_range, iter_dates, iter_windows
+from timesync.utils.records import as_time_entry
 
 LOGGER = logging.getLogger(__name__)
 
+# Number of dates that are read ahead of the dates that are being written, two of the default t-sheets read windows.
+DEFAULT_READ_AHEAD = 62
+
 
 def create_argument_parser(subparser):
     parser = subparser.add_parser('process', help='Process the contents of a script file')
 
     parser.add_argument('file', type=argparse.FileType('r'), help='file to import the data structure from')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the last run of the script that did not finish, the tasks, dates and records '
+                             'that were completed are skipped')
+    parser.add_argument('--plan', action='store_true',
+                        help='print the requests and the time that each task is expected to take without running the '
+                             'tasks or making any requests')
+    parser.add_argument('--records-per-day', type=float, default=None,
+                        help='records of each day expected by --plan for the data that has never been copied')
 
     parser.set_defaults(func=_main)
 
 
 def _main(args):
+    tasks = load_script(args.file)
+
+    if args.plan:
+        from timesync.utils import planner
+
+        planner.print_plan(planner.plan(tasks['tasks'], args.records_per_day))
+        return
+
+    run_script(tasks, args.file.name, args.resume)
+
+
+def load_script(script_file):
+    """
+    Parse a process script.
+    :param script_file: open file of the script
+    :return: dict
+    """
+    # Only needed when running a script, imported here to keep the start up time of the other commands low.
+    from ruamel.yaml import YAML
+    from ruamel.yaml.parser import ParserError as YAMLParserError
 
     parser = YAML(typ='rt')
     try:
-        tasks = parser.load(args.file)
+        return parser.load(script_file)
     except YAMLParserError as ype:
-        raise RuntimeError(f'Cannot parse process file {args.file.name}, see {ype.problem_mark}')
+        raise RuntimeError(f'Cannot parse process file {script_file.name}, see {ype.problem_mark}')
+
+
+def run_script(tasks, name, resume=False):
+    """
+    Run all of the tasks of a process script.
+    :param dict tasks: process script
+    :param str name: name of the script used in the log messages
+    :param bool resume: continue the last run of the script if it did not finish
+    :raises RuntimeError: if any of the tasks failed
+    """
+    from timesync.utils import catalog, state
+    from timesync.utils import tasks as engine
+
+    # The progress of the run is journaled against the tasks as they are written in the script.
+    task_keys = {id(configuration): _task_key(index, configuration)
+                 for index, configuration in enumerate(tasks['tasks'])}
+    journal = state.get_state_store().journal(_json_key(tasks['tasks']))
+
+    if resume and journal.exists():
+        LOGGER.info('Resuming the last run of %s', name)
+    else:
+        if resume:
+            LOGGER.info('Nothing to resume for %s, running all of the tasks', name)
+        journal.clear()
+
+    def journaled(handler):
+        def _handler(configuration):
+            task_journal = journal.task(task_keys[id(configuration)])
+            if task_journal.is_complete():
+                LOGGER.info('Skipping task that was completed by the previous run')
+                return
+
+            handler(configuration, task_journal)
+            task_journal.complete()
+
+        return _handler
+
+    handlers = {
+        'copy': journaled(_copy_processor),
+        'delete': journaled(_delete_process),
+    }
+
+    catalog.preflight(tasks['tasks'], handlers)
+
+    try:
+        engine.run(tasks['tasks'], handlers, tasks.get('concurrency', engine.DEFAULT_CONCURRENCY))
+    except RuntimeError:
+        LOGGER.error('Run the script again with --resume to continue from the tasks that did not complete')
+        raise
+
+    journal.clear()
+
+
+def _copy_processor(configuration, task_journal=None):
+    """
+    Copy the entries of the dates of the task.  When a journal is provided and the writer reports its progress, the
+    dates and records that were written are recorded in the journal and skipped when the task is run again.
+    """
+
+    if configuration.get('incremental', False):
+        _incremental_copy_processor(configuration)
+        return
+
+    start_date, end_date = date_range(configuration)
+
+    reader = plugins.find_plugin('timesheet_range_reader', configuration['from']['id'])
+    if reader is None:
+        reader = _daily_reader(plugins.load_plugin('timesheet_reader', configuration['from']['id']))
+
+    if configuration.get('reconcile', False):
+        writer = plugins.find_plugin('timesheet_reconcile_writer', configuration['to']['id'])
+        if writer is None:
+            raise RuntimeError(f'Reconcile is not supported when writing to {configuration["to"]["id"]}')
+    else:
+        writer = plugins.load_plugin('timesheet_writer', configuration['to']['id'])
+
+    progress = None
+    completed_dates = frozenset()
+    if task_journal is not None and 'progress' in inspect.signature(writer).parameters:
+        progress = _CopyProgress(task_journal)
+        completed_dates = progress.completed_dates
+
+        if completed_dates:
+            remaining_range = _remaining_range(configuration, completed_dates)
+            if remaining_range is None:
+                LOGGER.info('All of the dates of the task were written by the previous run')
+                return
+
+            start_date, end_date = remaining_range
+
+    counts = {'records': 0, 'days': 0}
+    batches = _counted(_windowed_batches(reader, configuration, start_date, end_date, completed_dates), counts)
+
+    # The dates are read in a separate thread while the writer consumes the records of the dates already read.
+    read_ahead = int(configuration.get('read_ahead', DEFAULT_READ_AHEAD))
+    date_batches = pipeline.prefetch(batches, read_ahead)
+
+    try:
+        if configuration.get('reconcile', False):
+            writer(configuration['to'], _records(date_batches), start_date, end_date)
+        elif progress is not None:
+            writer(configuration['to'], progress.records(date_batches), progress=progress.written)
+        else:
+            writer(configuration['to'], _records(date_batches))
+    finally:
+        date_batches.close()
+
+    # The number of records of each day is used by the plans of the next runs.
+    from timesync.utils import planner
+
+    planner.record_counts(configuration, counts['records'], counts['days'])
+
+
+class _CopyProgress:
+    """
+    Journal of the records of a copy.  Records that were written by a previous run are skipped, and a date is completed
+    once all of its records have been written.
+    """
+
+    def __init__(self, task_journal):
+        self._journal = task_journal
+        self._lock = threading.Lock()
+
+        self.completed_dates = task_journal.completed_dates()
+        self._written = task_journal.written_records()
+
+        # Number of records of each date that have not been written yet, and the dates whose records were all read.
+        self._pending = {}
+        self._read_dates = set()
+
+    def records(self, date_batches):
+        """Generator of the records of the dates that have not been written yet."""
+        for date, batch in date_batches:
+            records = [as_time_entry(record) for record in batch]
+            remaining = [record for record in records if _record_key(record) not in self._written]
+
+            if len(remaining) < len(records):
+                LOGGER.info('Skipping %s records of %s that were written by the previous run',
+                            len(records) - len(remaining), date)
+
+            with self._lock:
+                for record in remaining:
+                    self._pending[record.date] = self._pending.get(record.date, 0) + 1
+
+            yield from remaining
+
+            with self._lock:
+                self._read_dates.add(date)
+                completed = not self._pending.get(date)
+
+            if completed:
+                self._journal.complete_date(date)
+
+    def written(self, record):
+        """Progress callback of the writer, called once a record has been written."""
+        record = as_time_entry(record)
+
+        with self._lock:
+            self._pending[record.date] -= 1
+            completed = not self._pending[record.date] and record.date in self._read_dates
+
+        self._journal.record_written(record.date, _record_key(record))
+        if completed:
+            self._journal.complete_date(record.date)
+
+
+def _incremental_copy_processor(configuration):
+    """
+    Copy only the entries that changed since the last time the task was run.  The time of the last run and the
+    destination entries created from each source entry are kept in the state store.
+    """
+
+    start_date, end_date = date_range(configuration)
+
+    reader = plugins.find_plugin('timesheet_changes_reader', configuration['from']['id'])
+    writer = plugins.find_plugin('timesheet_sync_writer', configuration['to']['id'])
+
+    if reader is None or writer is None:
+        raise RuntimeError(f'Incremental copy is not supported from {configuration["from"]["id"]} '
+                           f'to {configuration["to"]["id"]}')
+
+    from timesync.utils import state
+
+    store = state.get_state_store()
+    task_key = incremental_task_key(configuration)
+
+    modified_since = store.get_watermark(task_key)
+    synced_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+    LOGGER.info('Copying entries modified since: %s', modified_since)
+
+    changes = reader(modified_since, start_date, end_date, configuration['from'])
+    writer(configuration['to'], changes, store.copied_entries(task_key))
+
+    store.set_watermark(task_key, synced_at)
+
+
+def incremental_task_key(configuration):
+    """Key of the watermark and of the copied entries of an incremental copy task in the state store."""
+    return json.dumps([dict(configuration['from']), dict(configuration['to'])], sort_keys=True, default=str)
+
+
+def _records(date_batches):
+    """Generator of the records of the (date, records) provided."""
+    for _, batch in date_batches:
+        yield from batch
+
+
+def _counted(date_batches, counts):
+    """Generator of the (date, records) provided, counting the dates and records as they are read."""
+    for date, batch in date_batches:
+        counts['days'] += 1
+        counts['records'] += len(batch)
+        yield date, batch
+
+
+def _record_key(record):
+    """Key of a TimeEntry in the journal, its id or the values of the record when it does not have one."""
+    if record.id is not None:
+        return str(record.id)
+
+    return f'{record.start.isoformat()} {record.end.isoformat()} {record.notes}'
+
+
+def _task_key(index, configuration):
+    """Key of a task in the journal, based on its position in the script, its configuration and its dates."""
+    return _json_key([index, configuration, *date_range(configuration)])
+
+
+def _json_key(value):
+    """Key of a value that can be converted into JSON."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _remaining_range(configuration, completed_dates):
+    """First and last dates of a task that are not completed, None if all of them are."""
+    remaining_range = None
+
+    for date in iter_dates(configuration):
+        if date.date() not in completed_dates:
+            remaining_range = (date, date) if remaining_range is None else (remaining_range[0], date)
+
+    return remaining_range
+
+
+def _date_ranges(configuration, start_date, end_date):
+    """
+    Ranges of dates that the readers and deleters are called with.  The whole range of the task by default, or the
+    contiguous windows of the ``window`` value of the task (week, month or a number of days).
+    """
+    window = configuration.get('window')
+    if window is None:
+        yield start_date, end_date
+        return
+
+    for window_start, window_end in iter_windows(configuration, window):
+        if window_end < start_date:
+            continue
+        if window_start > end_date:
+            return
+
+        yield max(window_start, start_date), min(window_end, end_date)
+
 
-    for task in tasks['tasks']:
+def _windowed_batches(reader, configuration, start_date, end_date, skipped_dates):
+    """Generator of the (date, records) of a range reader for each range of dates of the task."""
+    for window_start, window_end in _date_ranges(configuration, start_date, end_date):
+        LOGGER.debug('Reading dates: %s -> %s', window_start, window_end)
+        yield from _date_batches(reader(window_start, window_end, configuration['from']), window_start, window_end,
+                                 skipped_dates)
 
-        if task['type'] == 'copy':
-            _copy_processor(task)
-        elif task['type'] == 'delete':
-            _delete_process(task)
 
+def _date_batches(results, start_date, end_date, skipped_dates=frozenset()):
+    """
+    Generator of the (date, records) of a range reader for the dates between two dates (inclusive), leaving out the
+    skipped dates.  Range readers provide the dates in order, readers that return a dict of date to records are also
+    supported.
+    """
+    first_date, last_date = start_date.date(), end_date.date()
 
-def _copy_processor(configuration):
+    if isinstance(results, collections.abc.Mapping):
+        dates = (first_date + timedelta(day) for day in range((last_date - first_date).days + 1))
+        results = [(date, results.get(date) or []) for date in dates]
 
-    dates = parse_date(configuration)
+    for date, batch in results:
+        if first_date <= date <= last_date and date not in skipped_dates:
+            LOGGER.debug('Results %s: %s', date, batch)
+            yield date, batch
 
-    reader = plugins.load_plugin('timesheet_reader', configuration['from']['id'])
-    writer = plugins.load_plugin('timesheet_writer', configuration['to']['id'])
 
-    results = []
-    for date in dates:
-        results += reader(date, configuration['from'])
+def _daily_reader(reader):
+    """
+    Adapt a reader that only handles a single date to the range reader contract by calling it for every date in the
+    range.
+    """
 
-    LOGGER.debug(f'Results : {results}')
+    def _range_reader(start_date, end_date, configuration):
+        current_date = start_date
+        while current_date <= end_date:
+            yield current_date.date(), reader(current_date, configuration)
+            current_date += timedelta(1)
 
-    writer(configuration['to'], results)
+    return _range_reader
 
 
-def _delete_process(configuration):
+def _delete_process(configuration, task_journal=None):
 
-    dates = parse_date(configuration)
+    deleter = plugins.find_plugin('timesheet_range_delete', configuration['from']['id'])
+    if deleter is not None:
+        for start_date, end_date in _date_ranges(configuration, *date_range(configuration)):
+            deleter(configuration['from'], start_date, end_date)
+        return
 
     deleter = plugins.load_plugin('timesheet_delete', configuration['from']['id'])
 
-    for date in dates:
+    for date in iter_dates(configuration):
         deleter(configuration['from'], date)
@@ -0,0 +1,184 @@
+"""
+Runs process scripts on a schedule in a long running process.  The connections, caches and plugins are kept between
+the runs, and are only reset when the configuration file changes.
+"""
+import logging
+import os
+import signal
+
+from timesync.subcommands import process
+from timesync.utils import configuration as config
+from timesync.utils import plugins, scheduler
+
+LOGGER = logging.getLogger(__name__)
+
+
+def create_argument_parser(subparser):
+    parser = subparser.add_parser('serve', help='Run process scripts on the schedule defined in a schedule file')
+
+    parser.add_argument('file', type=str, help='schedule file defining the process scripts to run')
+
+    parser.set_defaults(func=_main)
+
+
+def _main(args):
+    schedule = _Schedule(args.file)
+    jobs_scheduler = scheduler.Scheduler(schedule.settings.get('concurrency', scheduler.DEFAULT_CONCURRENCY),
+                                         schedule.settings.get('poll_interval', scheduler.DEFAULT_POLL_INTERVAL))
+    jobs_scheduler.set_jobs(schedule.jobs())
+
+    # The configuration is loaded before the first run so that its changes can be detected.
+    config.get_configuration()
+    watcher = _FileWatcher([config.get_configuration_path(), args.file])
+
+    def on_poll():
+        if not watcher.changed():
+            return
+
+        # Runs in progress keep using the values they started with, the reload waits for them to finish.
+        jobs_scheduler.pause()
+        if not jobs_scheduler.is_idle():
+            return
+
+        _reload(schedule, jobs_scheduler)
+        watcher.reset()
+        jobs_scheduler.resume()
+
+    def stop(signal_number, frame):
+        LOGGER.info('Stopping, received signal %s', signal_number)
+        jobs_scheduler.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signal_number, frame: watcher.force())
+
+    LOGGER.info('Serving %s jobs of %s', len(jobs_scheduler.jobs), args.file)
+    jobs_scheduler.run(on_poll)
+
+
+def _reload(schedule, jobs_scheduler):
+    """Load the configuration and the schedule files again, the previous values are kept if a file cannot be loaded."""
+    LOGGER.info('Reloading the configuration')
+
+    try:
+        config.reload_configuration()
+    except RuntimeError as rte:
+        LOGGER.error('Keeping the previous configuration: %s', rte)
+    else:
+        _reset_caches()
+
+    try:
+        jobs_scheduler.set_jobs(schedule.reload().jobs())
+    except RuntimeError as rte:
+        LOGGER.error('Keeping the previous schedule: %s', rte)
+
+
+def _reset_caches():
+    """Forget all of the values that were created from the previous configuration."""
+    from timesync.utils import catalog, http_cache, state
+
+    for _, reset in plugins.iter_plugins('configuration_reload'):
+        reset()
+
+    # The databases opened with the previous configuration are closed, a new connection is opened by the next run.
+    for get_database in (catalog.get_catalog, state.get_state_store):
+        if get_database.cache_info().currsize:
+            get_database().close()
+        get_database.cache_clear()
+
+    http_cache.get_cache.cache_clear()
+
+
+class _Schedule:
+    """Contents of a schedule file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.settings = self._load()
+
+    def reload(self):
+        self.settings = self._load()
+        return self
+
+    def jobs(self):
+        """
+        Build a job for each of the process scripts of the schedule.
+        :return: list of scheduler.Job
+        """
+        jobs = []
+        directory = os.path.dirname(os.path.abspath(self.filename))
+
+        for job_configuration in self.settings.get('jobs') or []:
+            try:
+                script = os.path.join(directory, job_configuration['script'])
+                interval = scheduler.parse_interval(job_configuration['every'])
+            except KeyError as key_error:
+                raise RuntimeError(f'Schedule job is missing {key_error} in {self.filename}')
+
+            if any(job.name == script for job in jobs):
+                raise RuntimeError(f'Script {script} is scheduled more than once in {self.filename}')
+
+            jobs.append(scheduler.Job(script, _script_runner(script, job_configuration.get('resume', True)), interval,
+                                      scheduler.parse_interval(job_configuration.get('jitter', 0))))
+
+        if not jobs:
+            raise RuntimeError(f'No jobs are defined in {self.filename}')
+
+        return jobs
+
+    def _load(self):
+        from ruamel.yaml import YAML
+        from ruamel.yaml.parser import ParserError as YAMLParserError
+
+        try:
+            with open(self.filename) as schedule_file:
+                return YAML(typ='safe').load(schedule_file) or {}
+        except FileNotFoundError:
+            raise RuntimeError(f'Cannot find schedule file {self.filename}')
+        except YAMLParserError as ype:
+            raise RuntimeError(f'Cannot parse schedule file {self.filename}, see {ype.problem_mark}')
+
+
+class _FileWatcher:
+    """Detects the changes of files from their modification times."""
+
+    def __init__(self, filenames):
+        self._filenames = [filename for filename in filenames if filename is not None]
+        self._forced = False
+        self._times = self._modification_times()
+
+    def changed(self):
+        return self._forced or self._modification_times() != self._times
+
+    def force(self):
+        """Report a change on the next check, even if the files have not changed."""
+        self._forced = True
+
+    def reset(self):
+        self._forced = False
+        self._times = self._modification_times()
+
+    def _modification_times(self):
+        times = []
+        for filename in self._filenames:
+            try:
+                times.append(os.stat(filename).st_mtime_ns)
+            except OSError:
+                times.append(None)
+        return times
+
+
+def _script_runner(script, resume):
+    """Method that runs a process script, the script is read again for each run."""
+
+    def _run():
+        try:
+            with open(script) as script_file:
+                tasks = process.load_script(script_file)
+        except OSError as ose:
+            raise RuntimeError(f'Cannot read process file {script}: {ose}')
+
+        process.run_script(tasks, script, resume)
+
+    return _run
@@ -10,10 +10,14 @@ def create_argument_parser(subparser):
 
     parser.add_argument('service', type=str, help='time sheet service to query', default=None)
 
+    parser.add_argument('--connection', type=str, default=None,
+                        help='connection of the configuration to use, the harvest or t-sheets connection is used by '
+                             'default')
+
     parser.set_defaults(func=_main)
 
 
 def _main(args):
 
     task_assignment_method = plugins.load_plugin('task_assignments', args.service)
-    task_assignment_method()
+    task_assignment_method(connection=args.connection)
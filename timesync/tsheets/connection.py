@@ -1,88 +1,161 @@
 """
-Connection and access points for the t-sheets API.
+Connection and access points for the t-sheets API.  A client is created for each connection of the configuration, so
+that the tokens of many t-sheets users can be used by the same run.
 """
-import functools
 import logging
 
-from timesync.utils import configuration as config
-
-import requests
-
+from timesync.utils import http
 
 LOGGER = logging.getLogger(__name__)
 API_ROOT = 'https://rest.tsheets.com/api'
 
-
-@functools.lru_cache(maxsize=1)
-def current_user_details():
-    """Return data about the current user."""
-    return list(_get('v1/current_user')['results']['users'].values())[0]
-
-
-def current_assignments(current_page=1):
-    """
-    Retrieve all of the project assignments associated with the current user.  This is used to check configuration and
-    to provide a list of all of the tasks that can be used in the configuration file.
-    :return: dict
-    """
-    current_user_id = current_user_details()['id']
-
-    params = {
-        'user_ids': current_user_id,
-        'active': 'yes',
-        'page': current_page
-    }
-
-    LOGGER.debug('Parameters %s', params)
-
-    return _get('v1/jobcode_assignments', params)
-
-
-def get_time_sheets(work_date, job_code, page=1):
+# Connection of the configuration used by the readers that do not define a connection.
+DEFAULT_CONNECTION = 't-sheets'
+
+# Requests allowed by t-sheets in each period of seconds for a token, and the number of items in each page of a query.
+RATE_LIMIT = (300, 300)
+PAGE_SIZE = 200
+
+# Seconds that the responses of the endpoints that rarely change are cached for.
+CACHE_TIME_TO_LIVE = {
+    'v1/current_user': 24 * 60 * 60,
+    'v1/jobcode_assignments': 60 * 60,
+}
+
+
+class TSheetsClient(http.Client):
+    """Client of the t-sheets user of a connection of the configuration."""
+
+    BACKEND = 't-sheets'
+    DISPLAY_NAME = 'T-Sheets'
+    API_ROOT = API_ROOT
+    RATE_LIMIT = RATE_LIMIT
+    CACHE_TIME_TO_LIVE = CACHE_TIME_TO_LIVE
+
+    def __init__(self, connection_name=DEFAULT_CONNECTION):
+        """
+        :param str connection_name: key of the connection in the connections section of the configuration.
+        """
+        try:
+            token = http.get_connection(connection_name)['token']
+        except KeyError:
+            raise RuntimeError(f'T-Sheets Configuration details missing for connection {connection_name}')
+
+        headers = {'Authorization': f'Bearer {token}'}
+
+        # T-Sheets allows 300 requests every 5 minutes for each token.
+        super().__init__(connection_name, headers, headers['Authorization'])
+
+    def current_user_details(self):
+        """Return data about the current user, fetched once for the life of the client."""
+        return self._cached('v1/current_user',
+                            lambda: list(self._get('v1/current_user')['results']['users'].values())[0])
+
+    def current_assignments(self, current_page=1, modified_since=None, revalidate=False):
+        """
+        Retrieve all of the project assignments associated with the current user.  This is used to check configuration
+        and to provide a list of all of the tasks that can be used in the configuration file.
+        :param int current_page: the page number to retrieve
+        :param datetime.datetime modified_since: only retrieve the assignments modified after this time, including the
+        assignments that are no longer active.
+        :param bool revalidate: check a cached response with the API even if it has not expired
+        :return: dict
+        """
+        current_user_id = self.current_user_details()['id']
+
+        params = {
+            'user_ids': current_user_id,
+            'active': 'yes',
+            'page': current_page
+        }
+
+        if modified_since is not None:
+            params['active'] = 'both'
+            params['modified_since'] = modified_since.isoformat(timespec='seconds')
+
+        LOGGER.debug('Parameters %s', params)
+
+        return self._get('v1/jobcode_assignments', params, revalidate)
+
+    def get_time_sheets(self, work_date, job_code, page=1):
+        """
+        Retrieve all of the time sheets that are associated with the current logged in user.
+        :param datetime.date work_date: the date to retrieve the time sheets for.
+        :param int job_code: the job code
+        :param int page: the page number to retrieve
+        :return: list of time sheets for the parameters provided.
+        """
+        return self.get_time_sheets_range(work_date, work_date, job_code, page)
+
+    def get_time_sheets_range(self, start_date, end_date, job_code, page=1, modified_since=None):
+        """
+        Retrieve all of the time sheets between two dates (inclusive) that are associated with the current logged in
+        user.
+        :param datetime.date start_date: the first date to retrieve the time sheets for.
+        :param datetime.date end_date: the last date to retrieve the time sheets for.
+        :param int job_code: the job code
+        :param int page: the page number to retrieve
+        :param datetime.datetime modified_since: only retrieve the time sheets modified after this time.
+        :return: list of time sheets for the parameters provided.
+        """
+        current_user_id = self.current_user_details()['id']
+        query_params = {'jobcode_ids': f'{job_code}',
+                        'start_date': start_date.strftime('%Y-%m-%d'),
+                        'end_date': end_date.strftime('%Y-%m-%d'),
+                        'supplemental_data': 'no',
+                        'user_ids': f'{current_user_id}',
+                        'page': page
+                        }
+
+        if modified_since is not None:
+            query_params['modified_since'] = modified_since.isoformat(timespec='seconds')
+
+        LOGGER.debug(f'query_params: {query_params}')
+
+        return self._get('v1/timesheets', query_params)
+
+    def get_deleted_time_sheets(self, start_date, end_date, job_code, modified_since, page=1):
+        """
+        Retrieve the time sheets between two dates (inclusive) of the current logged in user that have been deleted.
+        :param datetime.date start_date: the first date to retrieve the time sheets for.
+        :param datetime.date end_date: the last date to retrieve the time sheets for.
+        :param int job_code: the job code
+        :param datetime.datetime modified_since: only retrieve the time sheets deleted after this time.
+        :param int page: the page number to retrieve
+        :return: list of deleted time sheets for the parameters provided.
+        """
+        current_user_id = self.current_user_details()['id']
+        query_params = {'jobcode_ids': f'{job_code}',
+                        'start_date': start_date.strftime('%Y-%m-%d'),
+                        'end_date': end_date.strftime('%Y-%m-%d'),
+                        'modified_since': modified_since.isoformat(timespec='seconds'),
+                        'user_ids': f'{current_user_id}',
+                        'page': page
+                        }
+
+        LOGGER.debug(f'query_params: {query_params}')
+
+        return self._get('v1/timesheets_deleted', query_params)
+
+
+_clients = http.Clients(TSheetsClient, DEFAULT_CONNECTION)
+
+
+def get_client(connection_name=None):
     """
-    Retrieve all of the time sheets that are associated with the current logged in user.
-    :param datetime.date work_date: the date to retrieve the time sheets for.
-    :param int job_code: the job code
-    :param int page: the page number to retrieve
-    :return: list of time sheets for the parameters provided.
+    Retrieve the client of a connection of the configuration, the client is created the first time it is used.
+    :param str connection_name: key of the connection in the connections section of the configuration, None for the
+    default connection
+    :return: TSheetsClient
     """
-    current_user_id = current_user_details()['id']
-    query_params = {'jobcode_ids': f'{job_code}',
-                    'start_date': work_date.strftime('%Y-%m-%d'),
-                    'end_date': work_date.strftime('%Y-%m-%d'),
-                    'supplemental_data': 'no',
-                    'user_ids': f'{current_user_id}',
-                    'page': page
-                    }
-
-    LOGGER.debug(f'query_params: {query_params}')
-
-    return _get('v1/timesheets', query_params)
-
+    return _clients.get(connection_name)
 
-def _get(api_path, query_parameters=None):
-    """Retrieve data from the path provided."""
-    headers = _get_headers()
-    results = requests.get(f'{API_ROOT}/{api_path}', headers=headers, params=query_parameters)
 
-    if results.status_code == 401:
-        raise RuntimeError(f'Error Access T-Sheets API: {results.json()["error_description"]}')
-
-    return results.json()
-
-
-@functools.lru_cache(maxsize=1)
-def _get_headers():
-    """
-    Load the configuration file and create the headers required for accessing the harvest apis.
-    :return: dictionary of headers
-    """
-    try:
-        connections = config.get_configuration()['connections']
-        tsheets_configuration = connections['t-sheets']
+def client_for(configuration):
+    """Retrieve the client of the ``connection`` of a reader configuration."""
+    return get_client(configuration.get('connection'))
 
-        token = tsheets_configuration['token']
-    except KeyError:
-        raise RuntimeError('T-Sheets Configuration details missing')
 
-    return {'Authorization': f'Bearer {token}'}
+def reset_configuration():
+    """Close and forget the clients created from the configuration, they are created again by the next request."""
+    _clients.reset()
@@ -2,92 +2,233 @@
 Entry points that are used to query the data in the APIs.
 """
 import datetime
+import functools
 import logging
-from operator import itemgetter
 
 from timesync.tsheets import connection as tsheets
+from timesync.utils import catalog
 from timesync.utils import configuration as config
+from timesync.utils import pagination, timestamps
+from timesync.utils.records import TimeEntry, TimeEntryBatch
 
-import dateutil.parser
-from pytz import timezone as py_timezone
 import tabulate
 
 
 LOGGER = logging.getLogger(__name__)
 
+# Number of days requested in a single time sheet query when reading a range of dates.
+DEFAULT_WINDOW_DAYS = 31
 
-def task_assignments():
+
+def task_assignments(connection=None):
     """
     Retrieve all of the task assignments that are associated with the currently logged in user.
+    :param str connection: connection of the configuration, None for the default connection
     """
-    current_page = 1
+    task_catalog = catalog.get_catalog()
+    refresh_catalog(task_catalog, connection=connection)
 
-    jobcodes = {}
+    account = tsheets.get_client(connection).account_key
+    data_rows = [(parent_id, parent_name, jobcode_id, name)
+                 for jobcode_id, name, parent_id, parent_name in task_catalog.tsheets_jobcodes(account)]
 
-    # Need to loop over this until there is no more data to use
-    while True:
-        assignment_data = tsheets.current_assignments(current_page)
+    headers = ['Parent Id', 'Parent Name', 'Job Code Id', 'Job Code Name']
+    print(tabulate.tabulate(data_rows, headers, tablefmt='simple'))
 
-        for jobcode_assignment in assignment_data['results']['jobcode_assignments'].values():
 
-            jobcode_id = jobcode_assignment['jobcode_id']
-            jobcodes[jobcode_id] = {'id': jobcode_id}
+def refresh_catalog(task_catalog, full=False, if_stale=False, connection=None):
+    """
+    Refresh the jobcodes assigned to the current user in the catalog.  Only the assignments that were modified since
+    the last refresh are retrieved, unless a full refresh is requested or the last full refresh is older than the
+    full refresh age.  A full refresh replaces the jobcodes of the account once all of them are retrieved, and checks
+    the cached responses with the API.
+    :param task_catalog: catalog to refresh
+    :param bool full: replace the contents of the catalog instead of updating it
+    :param bool if_stale: only refresh the catalog if it is older than its maximum age
+    :param str connection: connection of the configuration, None for the default connection
+    """
+    client = tsheets.get_client(connection)
+    account = client.account_key
 
-        for jobcode_definition in assignment_data['supplemental_data']['jobcodes'].values():
-            definition = jobcodes.setdefault(jobcode_definition['id'], {})
+    if if_stale and not task_catalog.is_stale(account):
+        return
 
-            definition['name'] = jobcode_definition['name']
-            definition['parent_id'] = jobcode_definition['parent_id']
+    # Removed assignments are only found by listing all of the assignments, which replaces the catalog of the account.
+    full = full or task_catalog.needs_full_refresh(account)
+    modified_since = None if full else task_catalog.refreshed_at(account)
+    refreshed_at = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
 
-        if assignment_data['more'] is False:
-            break
+    LOGGER.info('Refreshing t-sheets catalog, modified since: %s', modified_since)
 
-        current_page += 1
-        LOGGER.debug('Fetching page: %s', current_page)
+    def fetch_page(page):
+        return client.current_assignments(page, modified_since, revalidate=full)
 
-    data_rows = []
-    for jobcode_value in jobcodes.values():
-        if jobcode_value['parent_id'] != 0:
-            results = [jobcode_value['parent_id'], jobcodes[jobcode_value['parent_id']]['name']]
-        else:
-            results = [0, '']
+    jobcodes = []
+    assignments = []
 
-        results.append(jobcode_value['id'])
-        results.append(jobcode_value['name'])
+    for assignment_data in pagination.more_pages(fetch_page, client.page_workers(), _is_last_page):
 
-        data_rows.append(results)
+        for jobcode_assignment in (assignment_data['results']['jobcode_assignments'] or {}).values():
+            assignments.append((jobcode_assignment['jobcode_id'], jobcode_assignment.get('active', True)))
 
-    data_rows = sorted(data_rows, key=itemgetter(0, 2))
+        for jobcode_definition in (assignment_data['supplemental_data']['jobcodes'] or {}).values():
+            jobcodes.append((jobcode_definition['id'], jobcode_definition['name'], jobcode_definition['parent_id']))
 
-    headers = ['Parent Id', 'Parent Name', 'Job Code Id', 'Job Code Name']
-    print(tabulate.tabulate(data_rows, headers, tablefmt='simple'))
+    task_catalog.store_tsheets_jobcodes(account, jobcodes, replace=full)
+    task_catalog.store_tsheets_assignments(account, assignments)
+    task_catalog.set_refreshed_at(account, refreshed_at, full)
+
+
+def validate_configuration(configuration, task_catalog):
+    """
+    Check the jobcode of a reader configuration against the catalog.  Jobcodes that are defined by name are replaced
+    with their ids.
+    :return: list of error messages
+    """
+    if 'jobcode' not in configuration:
+        return ['tsheets requires a jobcode']
+
+    matches = {jobcode_id for jobcode_id, _, _, _ in
+               task_catalog.tsheets_jobcodes(tsheets.client_for(configuration).account_key, configuration['jobcode'])}
+
+    if len(matches) == 1:
+        configuration['jobcode'] = matches.pop()
+        return []
+    elif matches:
+        return [f'tsheets jobcode {configuration["jobcode"]} matches more than one jobcode, use its id instead']
+
+    return [f'tsheets jobcode {configuration["jobcode"]} is not assigned to the current user']
 
 
 def time_entry_reader(date_value, configuration):
     """Read the time sheet entries from the API and return them to the caller."""
-    current_page = 1
+    try:
+        jobcode = configuration['jobcode']
+    except KeyError:
+        raise RuntimeError('Could not find jobcode to copy from')
 
+    LOGGER.debug(f'processing values for date: {date_value}')
+
+    time_entries = TimeEntryBatch(_time_entries(tsheets.client_for(configuration), date_value, date_value, jobcode))
+
+    if not time_entries:
+        LOGGER.info('No timesheets available for date: %s', date_value)
+
+    return time_entries
+
+
+def time_entry_range_reader(start_date, end_date, configuration):
+    """
+    Generator that reads the time sheet entries between two dates (inclusive) from the API.  The range is split into
+    windows of ``window_days`` days (default: DEFAULT_WINDOW_DAYS) and a single query is paged through for each window,
+    the entries of a window are provided before the next window is read.
+    :param datetime.datetime start_date: first date to read
+    :param datetime.datetime end_date: last date to read
+    :param dict configuration: reader configuration
+    :return: generator of (datetime.date, TimeEntryBatch) in date order, every date in the range is provided.
+    """
     try:
         jobcode = configuration['jobcode']
     except KeyError:
         raise RuntimeError('Could not find jobcode to copy from')
 
-    time_entries = []
+    window_days = int(configuration.get('window_days', DEFAULT_WINDOW_DAYS))
+    if window_days < 1:
+        raise RuntimeError('window_days must be a positive number of days')
 
-    LOGGER.debug(f'processing values for date: {date_value}')
+    client = tsheets.client_for(configuration)
+    start_date = _as_date(start_date)
+    end_date = _as_date(end_date)
+
+    for window_start, window_end in config.windows(start_date, end_date, window_days):
+        LOGGER.debug('processing values for dates: %s -> %s', window_start, window_end)
+
+        time_entries = {}
+        for time_entry in _time_entries(client, window_start, window_end, jobcode):
+            time_entries.setdefault(time_entry.date, TimeEntryBatch()).append(time_entry)
 
-    while True:
-        results = tsheets.get_time_sheets(date_value, jobcode, page=current_page)
+        current_date = window_start
+        while current_date <= window_end:
+            yield current_date, time_entries.get(current_date, TimeEntryBatch())
+            current_date += datetime.timedelta(1)
 
-        LOGGER.debug(f'{results}')
 
-        timesheets = results['results']['timesheets']
+def time_entry_changes_reader(modified_since, start_date, end_date, configuration):
+    """
+    Read the time sheet entries between two dates (inclusive) that have changed since the time provided.
+    :param datetime.datetime modified_since: timezone aware time of the last read, None to read all of the entries
+    :param datetime.datetime start_date: first date to read
+    :param datetime.datetime end_date: last date to read
+    :param dict configuration: reader configuration
+    :return: dict containing the 'changed' TimeEntryBatch and the ids of the 'deleted' entries
+    """
+    try:
+        jobcode = configuration['jobcode']
+    except KeyError:
+        raise RuntimeError('Could not find jobcode to copy from')
 
-        if not timesheets:
-            LOGGER.info('No timesheets available for date: %s', date_value)
-            return time_entries
+    client = tsheets.client_for(configuration)
+    start_date = _as_date(start_date)
+    end_date = _as_date(end_date)
 
-        for timesheet in timesheets.values():
+    changed = TimeEntryBatch(_time_entries(client, start_date, end_date, jobcode, modified_since))
+    deleted = []
+
+    if modified_since is not None:
+        def fetch_page(page):
+            return client.get_deleted_time_sheets(start_date, end_date, jobcode, modified_since, page=page)
+
+        for results in pagination.more_pages(fetch_page, client.page_workers(), _is_last_page):
+            deleted += [timesheet['id'] for timesheet in (results['results']['timesheets'] or {}).values()]
+
+    LOGGER.info('Changed timesheets since %s: %s, deleted: %s', modified_since, len(changed), len(deleted))
+
+    return {'changed': changed, 'deleted': deleted}
+
+
+def estimate(action, configuration, start_date, end_date, records):
+    """
+    Estimate the requests made to t-sheets by an action of a task, without making any requests.  A query is paged
+    through for each window of dates read.
+    :param str action: 'read' or 'changes'
+    :param dict configuration: reader configuration
+    :param datetime.datetime start_date: first date of the task
+    :param datetime.datetime end_date: last date of the task
+    :param int records: number of records expected
+    :return: planner.Estimate
+    """
+    from timesync.utils import planner
+
+    if action not in ('read', 'changes'):
+        raise RuntimeError(f'T-Sheets does not support {action}')
+
+    if action == 'changes':
+        # A single query of the changed time sheets, and one of the deleted time sheets.
+        reads = planner.pages(records, tsheets.PAGE_SIZE) + 1
+    else:
+        days = (_as_date(end_date) - _as_date(start_date)).days + 1
+        window_days = max(int(configuration.get('window_days', DEFAULT_WINDOW_DAYS)), 1)
+        windows = -(-days // window_days)
+        reads = windows * planner.pages(records / windows, tsheets.PAGE_SIZE)
+
+    client = tsheets.client_for(configuration)
+    return planner.Estimate(client.connection_name, reads, budget=client.rate_budget(),
+                            page_workers=client.page_workers())
+
+
+def _time_entries(client, start_date, end_date, jobcode, modified_since=None):
+    """
+    Generator that pages through all of the time sheets for the jobcode between the dates provided and yields the
+    converted time entries.
+    """
+    def fetch_page(page):
+        return client.get_time_sheets_range(start_date, end_date, jobcode, page=page, modified_since=modified_since)
+
+    for results in pagination.more_pages(fetch_page, client.page_workers(), _is_last_page):
+
+        LOGGER.debug('%s', results)
+
+        for timesheet in (results['results']['timesheets'] or {}).values():
 
             LOGGER.debug(timesheet)
 
@@ -96,34 +237,37 @@ def time_entry_reader(date_value, configuration):
                 LOGGER.warning('Record %s is marked as on the clock.  Skipping..', timesheet['id'])
                 continue
 
-            # Check to see if the start and end time have to be generated
-            if not timesheet['start'] or not timesheet['end']:
-                start_time, end_time = build_start_end_time(timesheet['date'], timesheet['duration'],
-                                                            timesheet['tz_str'])
-                LOGGER.warning('Record %s does not contain start or end time. Setting to: %s => %s.',
-                               timesheet['id'], start_time, end_time)
+            yield _convert_timesheet(timesheet)
 
-            else:
-                start_time = dateutil.parser.parse(timesheet['start'])
-                end_time = dateutil.parser.parse(timesheet['end'])
 
-            timesheet_value = {
-                'id': timesheet['id'],
-                'start': start_time,
-                'end': end_time,
-                'duration': timesheet['duration'],
-                'date': datetime.datetime.strptime(timesheet['date'], '%Y-%m-%d').date(),
-                'notes': timesheet['notes']
-            }
+def _is_last_page(results):
+    """Check to see if there are pages of data after the results provided."""
+    return not results['more'] or not any(results['results'].values())
 
-            time_entries.append(timesheet_value)
 
-        if not results['more']:
-            break
+def _convert_timesheet(timesheet):
+    """Convert a timesheet record from the API into the TimeEntry shared by the readers and writers."""
 
-        current_page += 1
+    # Check to see if the start and end time have to be generated
+    if not timesheet['start'] or not timesheet['end']:
+        start_time, end_time = build_start_end_time(timesheet['date'], timesheet['duration'],
+                                                    timesheet['tz_str'])
+        LOGGER.warning('Record %s does not contain start or end time. Setting to: %s => %s.',
+                       timesheet['id'], start_time, end_time)
+
+    else:
+        start_time = timestamps.parse_timestamp(timesheet['start'])
+        end_time = timestamps.parse_timestamp(timesheet['end'])
+
+    return TimeEntry(timesheet['id'], start_time, end_time, timesheet['duration'],
+                     timestamps.parse_date(timesheet['date']), timesheet['notes'])
 
-    return time_entries
+
+def _as_date(value):
+    """Strip the time component from a datetime, dates are returned unchanged."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
 
 
 def build_start_end_time(date_string, duration, timezone_str):
@@ -134,16 +278,29 @@ def build_start_end_time(date_string, duration, timezone_str):
     :param str timezone_str: string containing the timezone name
     :return tuple containing the start datetime and end datetime
     """
-    configuration_start_time = config.get_configuration().get('timeentries', {}).get('default_start_time', '08:00:00')
-    configuration_start_time = [int(a) for a in configuration_start_time.split(':')]
-
-    date_value = datetime.datetime.strptime(date_string, '%Y-%m-%d')
-    time_value = datetime.time(configuration_start_time[0], configuration_start_time[1], configuration_start_time[2])
-
-    start_time = datetime.datetime.combine(date_value.date(), time_value)
-    timezone = py_timezone(timezone_str)
-    start_time = timezone.localize(start_time)
+    start_time = datetime.datetime.combine(timestamps.parse_date(date_string), _default_start_time())
+    start_time = timestamps.get_timezone(timezone_str).localize(start_time)
     end_time = start_time + datetime.timedelta(seconds=duration)
 
     return start_time, end_time
 
+
+def reset_configuration():
+    """Forget the values loaded from the configuration, called when the configuration file is loaded again."""
+    _default_start_time.cache_clear()
+    tsheets.reset_configuration()
+
+
+def account_key(configuration):
+    """Key of the t-sheets user that a reader configuration reads the time sheets of."""
+    return tsheets.client_for(configuration).account_key
+
+
+@functools.lru_cache(maxsize=1)
+def _default_start_time():
+    """Time of day that records without a start time are started at, the ``timeentries.default_start_time`` value."""
+    configuration_start_time = config.get_configuration().get('timeentries', {}).get('default_start_time', '08:00:00')
+    configuration_start_time = [int(a) for a in configuration_start_time.split(':')]
+
+    return datetime.time(configuration_start_time[0], configuration_start_time[1], configuration_start_time[2])
+
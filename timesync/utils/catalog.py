@@ -0,0 +1,313 @@
+"""
+Local catalog of the projects, tasks and task assignments of harvest and of the jobcodes of t-sheets.  The catalog is
+stored in a SQLite database so that the identifiers used in the process scripts can be checked without calling the
+APIs, and is refreshed incrementally from the APIs by the catalog_refresh plugins.  Incremental refreshes do not report
+the assignments that were removed, so the catalog of an account is replaced by a full refresh once in a while.
+"""
+import datetime
+import functools
+import logging
+import os
+import sqlite3
+import threading
+
+from timesync.utils import configuration as config
+from timesync.utils import plugins
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    # Location of the catalog database.
+    'filename': os.path.join('~', '.local', 'share', 'timesync', 'catalog.sqlite'),
+
+    # Seconds after which the catalog of a service is refreshed before it is used.
+    'max_age': 24 * 60 * 60,
+
+    # Seconds after which a refresh replaces the catalog of a service instead of only retrieving the changes.
+    'full_refresh_age': 7 * 24 * 60 * 60,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refreshes (
+    account TEXT PRIMARY KEY,
+    refreshed_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS full_refreshes (
+    account TEXT PRIMARY KEY,
+    refreshed_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS harvest_assignments (
+    account TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    project_id INTEGER NOT NULL,
+    project_name TEXT NOT NULL,
+    task_id INTEGER NOT NULL,
+    task_name TEXT NOT NULL,
+    is_active INTEGER NOT NULL,
+    PRIMARY KEY (account, id)
+);
+
+CREATE INDEX IF NOT EXISTS harvest_assignments_project ON harvest_assignments (account, project_id, task_id);
+CREATE INDEX IF NOT EXISTS harvest_assignments_project_name ON harvest_assignments (account, project_name);
+CREATE INDEX IF NOT EXISTS harvest_assignments_task_name ON harvest_assignments (account, task_name);
+
+CREATE TABLE IF NOT EXISTS tsheets_jobcodes (
+    account TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    parent_id INTEGER NOT NULL,
+    assigned INTEGER,
+    PRIMARY KEY (account, id)
+);
+
+CREATE INDEX IF NOT EXISTS tsheets_jobcodes_name ON tsheets_jobcodes (account, name);
+CREATE INDEX IF NOT EXISTS tsheets_jobcodes_parent ON tsheets_jobcodes (account, parent_id);
+"""
+
+
+class Catalog:
+    """Thread safe access to the catalog database."""
+
+    def __init__(self, filename, max_age, full_refresh_age=DEFAULT_SETTINGS['full_refresh_age']):
+        filename = os.path.expanduser(filename)
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.max_age = float(max_age)
+        self.full_refresh_age = float(full_refresh_age)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close the connection to the database, the catalog cannot be used afterwards."""
+        with self._lock:
+            self._connection.close()
+
+    def refreshed_at(self, account):
+        """
+        Retrieve the time that the catalog of an account was last refreshed.
+        :param str account: key of the service account
+        :return: timezone aware datetime.datetime or None if the catalog was never refreshed
+        """
+        return self._refreshed_at('refreshes', account)
+
+    def is_stale(self, account):
+        """Check to see if the catalog of an account was never refreshed or is older than the maximum age."""
+        return _is_older(self.refreshed_at(account), self.max_age)
+
+    def needs_full_refresh(self, account):
+        """Check to see if the catalog of an account was never replaced, or was replaced before the full refresh age."""
+        return _is_older(self._refreshed_at('full_refreshes', account), self.full_refresh_age)
+
+    def set_refreshed_at(self, account, refreshed_at, full=False):
+        """
+        Store the time that the catalog of an account was refreshed.
+        :param str account: key of the service account
+        :param datetime.datetime refreshed_at: timezone aware time that the refresh started at
+        :param bool full: the refresh replaced the catalog of the account
+        """
+        tables = ('refreshes', 'full_refreshes') if full else ('refreshes',)
+
+        for table in tables:
+            self._execute(f'INSERT OR REPLACE INTO {table} (account, refreshed_at) VALUES (?, ?)',
+                          (account, refreshed_at.strftime('%Y-%m-%dT%H:%M:%S%z')))
+
+    def clear(self, account):
+        """Remove the catalog of an account."""
+        with self._lock, self._connection:
+            for table in ('refreshes', 'full_refreshes', 'harvest_assignments', 'tsheets_jobcodes'):
+                self._connection.execute(f'DELETE FROM {table} WHERE account = ?', (account,))
+
+    def store_harvest_assignments(self, account, assignments, replace=False):
+        """
+        Add or replace harvest task assignments.
+        :param str account: key of the service account
+        :param assignments: iterable of (id, project_id, project_name, task_id, task_name, is_active)
+        :param bool replace: remove the task assignments of the account that are not provided
+        """
+        with self._lock, self._connection:
+            if replace:
+                self._connection.execute('DELETE FROM harvest_assignments WHERE account = ?', (account,))
+
+            self._connection.executemany('INSERT OR REPLACE INTO harvest_assignments '
+                                         '(account, id, project_id, project_name, task_id, task_name, is_active) '
+                                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                         ((account,) + tuple(assignment) for assignment in assignments))
+
+    def harvest_assignments(self, account, project=None, task=None, active_only=False):
+        """
+        Find harvest task assignments.
+        :param str account: key of the service account
+        :param project: id or name of the project, None for all projects
+        :param task: id or name of the task, None for all tasks
+        :param bool active_only: only find the active task assignments
+        :return: list of (id, project_id, project_name, task_id, task_name, is_active)
+        """
+        statement = ('SELECT id, project_id, project_name, task_id, task_name, is_active FROM harvest_assignments '
+                     'WHERE account = ?')
+        parameters = [account]
+
+        for value, id_column, name_column in ((project, 'project_id', 'project_name'), (task, 'task_id', 'task_name')):
+            if value is not None:
+                statement += f' AND ({id_column} = ? OR {name_column} = ?)'
+                parameters += [_as_id(value), str(value)]
+
+        if active_only:
+            statement += ' AND is_active = 1'
+
+        return self._execute(statement + ' ORDER BY project_id, task_id', parameters)
+
+    def store_tsheets_jobcodes(self, account, jobcodes, replace=False):
+        """
+        Add or replace t-sheets jobcodes, the assigned value is kept for jobcodes without an assignment.
+        :param str account: key of the service account
+        :param jobcodes: iterable of (id, name, parent_id)
+        :param bool replace: remove the jobcodes and assignments of the account that are not provided
+        """
+        jobcodes = list(jobcodes)
+
+        with self._lock, self._connection:
+            if replace:
+                self._connection.execute('DELETE FROM tsheets_jobcodes WHERE account = ?', (account,))
+
+            self._connection.executemany('INSERT OR IGNORE INTO tsheets_jobcodes (account, id, name, parent_id) '
+                                         'VALUES (?, ?, ?, ?)',
+                                         ((account,) + tuple(jobcode) for jobcode in jobcodes))
+            self._connection.executemany('UPDATE tsheets_jobcodes SET name = ?, parent_id = ? '
+                                         'WHERE account = ? AND id = ?',
+                                         ((name, parent_id, account, jobcode_id)
+                                          for jobcode_id, name, parent_id in jobcodes))
+
+    def store_tsheets_assignments(self, account, assignments):
+        """
+        Store the jobcodes assigned to the user.
+        :param str account: key of the service account
+        :param assignments: iterable of (jobcode id, active)
+        """
+        with self._lock, self._connection:
+            self._connection.executemany('UPDATE tsheets_jobcodes SET assigned = ? WHERE account = ? AND id = ?',
+                                         ((int(active), account, jobcode_id) for jobcode_id, active in assignments))
+
+    def tsheets_jobcodes(self, account, jobcode=None):
+        """
+        Find the t-sheets jobcodes assigned to the user, jobcodes that were only stored as the parent of a jobcode or
+        whose assignment is no longer active are left out.
+        :param str account: key of the service account
+        :param jobcode: id or name of the jobcode, None for all of the jobcodes
+        :return: list of (id, name, parent_id, parent_name)
+        """
+        statement = ('SELECT jobcode.id, jobcode.name, jobcode.parent_id, COALESCE(parent.name, \'\') '
+                     'FROM tsheets_jobcodes AS jobcode '
+                     'LEFT JOIN tsheets_jobcodes AS parent '
+                     'ON parent.account = jobcode.account AND parent.id = jobcode.parent_id '
+                     'WHERE jobcode.account = ? AND jobcode.assigned = 1')
+        parameters = [account]
+
+        if jobcode is not None:
+            statement += ' AND (jobcode.id = ? OR jobcode.name = ?)'
+            parameters += [_as_id(jobcode), str(jobcode)]
+
+        return self._execute(statement + ' ORDER BY jobcode.parent_id, jobcode.id', parameters)
+
+    def _refreshed_at(self, table, account):
+        rows = self._execute(f'SELECT refreshed_at FROM {table} WHERE account = ?', (account,))
+        if not rows:
+            return None
+
+        return datetime.datetime.strptime(rows[0][0], '%Y-%m-%dT%H:%M:%S%z')
+
+    def _execute(self, statement, parameters):
+        with self._lock, self._connection:
+            return self._connection.execute(statement, parameters).fetchall()
+
+
+@functools.lru_cache(maxsize=1)
+def get_catalog():
+    """
+    Retrieve the catalog defined by the ``catalog`` section of the configuration.
+    :return: Catalog
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(config.get_configuration().get('catalog') or {})
+
+    try:
+        return Catalog(settings['filename'], settings['max_age'], settings['full_refresh_age'])
+    except (OSError, sqlite3.Error) as error:
+        raise RuntimeError(f'Cannot open catalog file {settings["filename"]}: {error}')
+
+
+def preflight(task_configurations, task_types=None):
+    """
+    Check all of the reader/writer/deleter configurations of a process script against the catalog before any data is
+    read or written.  Catalogs that are older than their maximum age are refreshed first, and the catalogs of the
+    services with errors are refreshed once more in case the errors are caused by new assignments.
+    :param list task_configurations: tasks section of the process script
+    :param task_types: types of the tasks that are run, the tasks of the other types are not checked.  None to check
+    all of the tasks.
+    :raises RuntimeError: if any of the configurations is not valid
+    """
+    task_catalog = get_catalog()
+
+    sections = [(index, configuration[key]) for index, configuration in enumerate(task_configurations)
+                if task_types is None or configuration['type'] in task_types
+                for key in ('from', 'to') if key in configuration]
+
+    # The catalog of each connection of a service is refreshed, connections that are not defined use the default one.
+    for service, connection in sorted({_connection(section) for _, section in sections}, key=str):
+        refresher = plugins.find_plugin('catalog_refresh', service)
+        if refresher is not None:
+            refresher(task_catalog, if_stale=True, connection=connection)
+
+    errors = _validate(task_catalog, sections)
+
+    if errors:
+        for service, connection in sorted({connection for connection, _ in errors}, key=str):
+            plugins.load_plugin('catalog_refresh', service)(task_catalog, connection=connection)
+
+        errors = _validate(task_catalog, sections)
+
+    if errors:
+        raise RuntimeError('Process script is not valid:\n' + '\n'.join(message for _, message in errors))
+
+
+def _validate(task_catalog, sections):
+    """
+    Validate the configurations with the validator of their service, returns a list of ((service, connection), error
+    message).
+    """
+    errors = []
+
+    for index, section in sections:
+        validator = plugins.find_plugin('configuration_validator', section['id'])
+        if validator is None:
+            continue
+
+        errors += [(_connection(section), f'task {index + 1}: {message}')
+                   for message in validator(section, task_catalog)]
+
+    return errors
+
+
+def _connection(section):
+    """Service and connection of a reader/writer/deleter configuration."""
+    return section['id'], section.get('connection')
+
+
+def _is_older(refreshed_at, max_age):
+    """Check to see if a refresh never happened or happened more than max_age seconds ago."""
+    if refreshed_at is None:
+        return True
+
+    return (datetime.datetime.now(datetime.timezone.utc) - refreshed_at).total_seconds() > max_age
+
+
+def _as_id(value):
+    """Convert a value into an integer identifier, values that are not integers match no identifier."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
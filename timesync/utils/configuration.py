@@ -1,18 +1,20 @@
 """
 Module for loading and maintaining configuration values.
 """
+import collections.abc
 import logging
 
-from datetime import datetime, timedelta
-
-from ruamel.yaml import YAML
-from ruamel.yaml.parser import ParserError as YAMLParserError
+from datetime import date, datetime, time, timedelta
 
 _configuration = None
+_configuration_path = None
 LOGGER = logging.getLogger(__name__)
 DATE_FORMAT_STRING = '%Y-%m-%d'
 DEFAULT_CONFIGURATION_FILE = './config.yaml'
 
+# Calendar windows that a range of dates can be split into, besides a number of days.
+WINDOWS = ('week', 'month')
+
 
 def get_configuration(configuration_path=DEFAULT_CONFIGURATION_FILE):
     """
@@ -20,47 +22,194 @@ def get_configuration(configuration_path=DEFAULT_CONFIGURATION_FILE):
     :param str configuration_path: path to parse yaml from.
     :return: dict
     """
-    global _configuration
+    global _configuration, _configuration_path
 
     if _configuration is None:
-        LOGGER.debug('Loading configuration: %s', configuration_path)
-        parser = YAML(typ='rt')
+        _configuration = _load_configuration(configuration_path)
+        _configuration_path = configuration_path
+
+    return _configuration
+
+
+def get_configuration_path():
+    """Path of the configuration file that was loaded, None if it has not been loaded yet."""
+    return _configuration_path
 
-        try:
-            with open(configuration_path) as configuration_file:
-                _configuration = parser.load(configuration_file)
-        except FileNotFoundError:
-            raise RuntimeError(f'Cannot find configuration file {configuration_path}')
-        except YAMLParserError as ype:
-            raise RuntimeError(f'Cannot parse configuration file {configuration_path}, see {ype.problem_mark}')
 
+def reload_configuration():
+    """
+    Load the configuration file again, the values that were loaded before are kept if the file cannot be loaded.
+    :return: dict
+    :raises RuntimeError: if the file cannot be loaded
+    """
+    global _configuration
+
+    _configuration = _load_configuration(_configuration_path or DEFAULT_CONFIGURATION_FILE)
     return _configuration
 
 
+def _load_configuration(configuration_path):
+    from ruamel.yaml import YAML
+    from ruamel.yaml.parser import ParserError as YAMLParserError
+
+    LOGGER.debug('Loading configuration: %s', configuration_path)
+    parser = YAML(typ='rt')
+
+    try:
+        with open(configuration_path) as configuration_file:
+            return parser.load(configuration_file)
+    except FileNotFoundError:
+        raise RuntimeError(f'Cannot find configuration file {configuration_path}')
+    except YAMLParserError as ype:
+        raise RuntimeError(f'Cannot parse configuration file {configuration_path}, see {ype.problem_mark}')
+
+
 def parse_date(configuration, date_key='date', start_key='start', end_key='end'):
     """
     Parse a date value out of the configuration dictionary provided using the provided keys.  Always returns a list of
-    dates.
+    dates, see iter_dates for the values that are supported.
     :param dict configuration:
     :param str date_key:
     :param str start_key:
     :param str end_key:
     :return: list of dates
     """
-    return_value = []
-
-    if configuration[date_key] == 'today':
-        return_value.append(datetime.now())
-    elif configuration[date_key] == 'yesterday':
-        return_value.append(datetime.now() - timedelta(1))
-    elif configuration[date_key] == 'range':
-        current_date = datetime.strptime(configuration[start_key], DATE_FORMAT_STRING)
-        end_date = datetime.strptime(configuration[end_key], DATE_FORMAT_STRING)
-
-        while current_date <= end_date:
-            return_value.append(current_date)
-            current_date += timedelta(1)
-    else:
-        return_value.append(datetime.strptime(configuration[date_key], DATE_FORMAT_STRING))
-
-    return return_value
+    return list(iter_dates(configuration, date_key, start_key, end_key))
+
+
+def date_range(configuration, date_key='date', start_key='start', end_key='end'):
+    """
+    First and last dates (inclusive) of a date value of the configuration, without building the dates in between.
+    :return: tuple of the first and last datetime.datetime, at midnight
+    """
+    start_date, end_date, timezone = _date_bounds(configuration, date_key, start_key, end_key)
+    return _at_midnight(start_date, timezone), _at_midnight(end_date, timezone)
+
+
+def iter_dates(configuration, date_key='date', start_key='start', end_key='end'):
+    """
+    Generator of the dates of a date value of the configuration, the dates are created as they are consumed.  The date
+    value can be:
+
+    * ``today``, ``yesterday`` or a ``YYYY-MM-DD`` date
+    * ``range``, the dates from the start value to the end value (inclusive)
+    * ``this_week``/``this_month``, from the first day of the week (Monday) or month up to today
+    * ``last_week``/``last_month``, all of the days of the previous week or month
+    * ``{last_n_days: N}``, the N days up to and including today
+
+    The current date is taken in the timezone of the ``timezone`` value of the configuration (e.g. America/Denver)
+    when it is defined, and the dates are then timezone aware.  Otherwise the local time is used.
+    :return: generator of datetime.datetime, at midnight
+    """
+    start_date, end_date, timezone = _date_bounds(configuration, date_key, start_key, end_key)
+
+    current_date = start_date
+    while current_date <= end_date:
+        yield _at_midnight(current_date, timezone)
+        current_date += timedelta(1)
+
+
+def iter_windows(configuration, window, date_key='date', start_key='start', end_key='end'):
+    """
+    Generator of contiguous windows covering the dates of a date value of the configuration, see iter_dates.
+    :param dict configuration:
+    :param window: 'week' or 'month' for calendar weeks (Monday to Sunday) and months, or a number of days
+    :return: generator of the first and last datetime.datetime (inclusive) of each window, at midnight
+    """
+    start_date, end_date, timezone = _date_bounds(configuration, date_key, start_key, end_key)
+
+    for window_start, window_end in windows(start_date, end_date, window):
+        yield _at_midnight(window_start, timezone), _at_midnight(window_end, timezone)
+
+
+def windows(start_date, end_date, window):
+    """
+    Split the dates between two dates (inclusive) into contiguous windows, the first and last windows are cut to the
+    range.
+    :param datetime.date start_date: first date
+    :param datetime.date end_date: last date
+    :param window: 'week' or 'month' for calendar weeks (Monday to Sunday) and months, or a number of days
+    :return: generator of the first and last datetime.date (inclusive) of each window
+    """
+    if window not in WINDOWS:
+        try:
+            window = int(window)
+        except (TypeError, ValueError):
+            window = 0
+
+        if window < 1:
+            raise RuntimeError(f'Window must be one of {", ".join(WINDOWS)} or a positive number of days')
+
+    window_start = start_date
+    while window_start <= end_date:
+        if window == 'week':
+            window_end = window_start + timedelta(6 - window_start.weekday())
+        elif window == 'month':
+            window_end = _next_month(window_start) - timedelta(1)
+        else:
+            window_end = window_start + timedelta(window - 1)
+
+        window_end = min(window_end, end_date)
+        yield window_start, window_end
+
+        window_start = window_end + timedelta(1)
+
+
+def _date_bounds(configuration, date_key, start_key, end_key):
+    """First and last dates (inclusive) of a date value, along with the timezone they are in (None for local time)."""
+    timezone = configuration.get('timezone')
+    if timezone is not None:
+        from timesync.utils import timestamps
+
+        timezone = timestamps.get_timezone(timezone)
+
+    today = (datetime.now(timezone) if timezone is not None else datetime.now()).date()
+    value = configuration[date_key]
+
+    if isinstance(value, collections.abc.Mapping):
+        if 'last_n_days' not in value:
+            raise RuntimeError(f'Unknown date value: {dict(value)}')
+
+        days = int(value['last_n_days'])
+        if days < 1:
+            raise RuntimeError('last_n_days must be a positive number of days')
+
+        return today - timedelta(days - 1), today, timezone
+
+    if value == 'today':
+        return today, today, timezone
+    elif value == 'yesterday':
+        return today - timedelta(1), today - timedelta(1), timezone
+    elif value == 'this_week':
+        return today - timedelta(today.weekday()), today, timezone
+    elif value == 'last_week':
+        start_date = today - timedelta(today.weekday() + 7)
+        return start_date, start_date + timedelta(6), timezone
+    elif value == 'this_month':
+        return today.replace(day=1), today, timezone
+    elif value == 'last_month':
+        end_date = today.replace(day=1) - timedelta(1)
+        return end_date.replace(day=1), end_date, timezone
+    elif value == 'range':
+        return _as_date(configuration[start_key]), _as_date(configuration[end_key]), timezone
+
+    date_value = _as_date(value)
+    return date_value, date_value, timezone
+
+
+def _as_date(value):
+    """Parse a YYYY-MM-DD value, YAML files can also provide it as a date."""
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, DATE_FORMAT_STRING).date()
+
+
+def _at_midnight(date_value, timezone):
+    midnight = datetime.combine(date_value, time())
+    return timezone.localize(midnight) if timezone is not None else midnight
+
+
+def _next_month(date_value):
+    if date_value.month == 12:
+        return date(date_value.year + 1, 1, 1)
+    return date(date_value.year, date_value.month + 1, 1)
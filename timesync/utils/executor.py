@@ -0,0 +1,55 @@
+"""
+Executor that runs a method for a batch of records with a bounded pool of workers.  Failures of individual records are
+collected so that the rest of the batch is not held up, and are reported once the batch has finished.
+"""
+import concurrent.futures
+import itertools
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def run_batch(method, records, max_workers, description='record'):
+    """
+    Call method for each of the records with at most max_workers calls in flight.  A call fails if it raises an
+    exception or returns False.  Records are consumed from the iterable as workers become available.
+    :param method: method that is called with each record
+    :param records: iterable of records
+    :param int max_workers: maximum number of calls in flight
+    :param str description: name of the records used in the log and error messages
+    :return: number of records that were processed
+    :raises RuntimeError: once all of the records are processed if any of the calls failed
+    """
+    max_workers = max(int(max_workers), 1)
+    records = iter(records)
+
+    processed = 0
+    failures = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(method, record): record
+                   for record in itertools.islice(records, max_workers * 2)}
+
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                record = pending.pop(future)
+                processed += 1
+
+                try:
+                    if future.result() is False:
+                        failures.append((record, 'request was not successful'))
+                except Exception as exc:  # Collect all failures, they are reported once the batch is finished.
+                    failures.append((record, exc))
+
+            for record in itertools.islice(records, len(done)):
+                pending[executor.submit(method, record)] = record
+
+    for record, reason in failures:
+        LOGGER.error('ERROR processing %s %s: %s', description, record, reason)
+
+    if failures:
+        raise RuntimeError(f'{len(failures)} of {processed} {description}s failed')
+
+    return processed
@@ -0,0 +1,300 @@
+"""
+Shared HTTP client layer for the API connection modules.  Each connection of the configuration has a client with a
+single long lived session so that connections are kept alive and pooled between requests, responses are compressed and
+transient failures are retried at the transport level.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from timesync.utils import configuration as config
+from timesync.utils import http_cache, metrics, ratelimit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    # Number of connection pools (one per host) to cache.
+    'pool_connections': 4,
+
+    # Maximum number of connections kept alive in each pool.
+    'pool_maxsize': 10,
+
+    # Number of times a request is retried after a connection error or one of RETRY_STATUS_CODES.
+    'retries': 3,
+
+    # Retries sleep for backoff_factor * (2 ** (retry number - 1)) seconds.
+    'backoff_factor': 0.5,
+
+    # Seconds to wait for the server to connect and to send data.
+    'timeout': 30,
+
+    # Maximum number of pages of a paginated query that are fetched at the same time.
+    'page_workers': 4,
+
+    # Maximum number of records that are written or deleted at the same time.
+    'write_workers': 8,
+}
+
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class Session(requests.Session):
+    """Session that applies a default timeout to all of the requests that do not define one."""
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class Client:
+    """
+    Client of a connection of the configuration, with its own session, rate limiter and cached values.  The clients of
+    the services define the class attributes below and authenticate their requests with the headers they provide.
+    """
+
+    # Name of the service used in the metrics and to share the rate limiter of an account between connections.
+    BACKEND = None
+
+    # Name of the service used in the error messages.
+    DISPLAY_NAME = None
+
+    # Default root of the API, can be changed with the ``api_root`` value of the connection.
+    API_ROOT = None
+
+    # Requests allowed by the service in each period of seconds for an account.
+    RATE_LIMIT = None
+
+    # Seconds that the responses of the endpoints that rarely change are cached for.
+    CACHE_TIME_TO_LIVE = {}
+
+    def __init__(self, connection_name, headers, identity, account=None):
+        """
+        :param str connection_name: key of the connection in the connections section of the configuration.
+        :param dict headers: headers that authenticate the requests of the connection
+        :param str identity: value identifying the account and user of the connection, used in the keys of the cached
+        values
+        :param str account: account that the rate budget of the service applies to, the account key of the client by
+        default
+        """
+        connection = get_connection(connection_name)
+
+        self.connection_name = connection_name
+        self.headers = headers
+        self.api_root = connection.get('api_root', self.API_ROOT)
+        self.identity = identity
+        self.account_key = hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+        # Seconds that the responses of each endpoint are cached for, the defaults can be changed in the ``cache_ttl``
+        # section of the connection.  Endpoints with a value of null are not cached.
+        self.cache_time_to_live = dict(self.CACHE_TIME_TO_LIVE)
+        self.cache_time_to_live.update(connection.get('cache_ttl') or {})
+
+        self.settings = get_settings(connection_name)
+        self.session = create_session(self.settings, self.headers)
+        self.rate_limiter = ratelimit.get_bucket(connection_name, self.account_key if account is None else account,
+                                                 *self.RATE_LIMIT, service=self.BACKEND)
+
+        self._lock = threading.Lock()
+        self._value_locks = {}
+        self._values = {}
+
+    def close(self):
+        self.session.close()
+
+    def page_workers(self):
+        """Number of pages of a paginated query that can be fetched at the same time."""
+        return int(self.settings['page_workers'])
+
+    def write_workers(self):
+        """Number of time entries that can be created or deleted at the same time."""
+        return int(self.settings['write_workers'])
+
+    def rate_budget(self):
+        """Number of requests allowed in each period of seconds, see the ``rate_limit`` value of the configuration."""
+        return ratelimit.get_budget(self.connection_name, *self.RATE_LIMIT)
+
+    def _cached(self, key, fetch):
+        """
+        Retrieve a value that is fetched once for the life of the client.  Callers that ask for a value while it is
+        being fetched wait for it instead of fetching it again.
+        """
+        with self._lock:
+            value_lock = self._value_locks.setdefault(key, threading.Lock())
+
+        with value_lock:
+            if key not in self._values:
+                self._values[key] = fetch()
+            return self._values[key]
+
+    def _check_access(self, results):
+        """Raise an error for a response to a request that was not authorized."""
+        if results.status_code == 401:
+            raise RuntimeError(f'Error Access {self.DISPLAY_NAME} API: {results.json()["error_description"]}')
+
+    def _get(self, api_path, query_parameters=None, revalidate=False):
+        """
+        Retrieve data from the path provided, responses of the endpoints in the cache time to live are cached.  Cached
+        responses are checked with the API before they are used when revalidate is set.
+        """
+
+        def send(headers=None):
+            results = self._request('GET', api_path, params=query_parameters, headers=headers)
+            self._check_access(results)
+            return results
+
+        time_to_live = self.cache_time_to_live.get(api_path)
+        if time_to_live is None:
+            return send().json()
+
+        return http_cache.get(http_cache.cache_key(self.identity, f'{self.api_root}/{api_path}', query_parameters),
+                              time_to_live, send, revalidate)
+
+    def _request(self, method, api_path, **kwargs):
+        """
+        Send a request once the rate limiter allows it.  Requests that are rejected by the rate limit of the API are
+        re-sent after waiting for the time requested by the API.
+        """
+        while True:
+            metrics.REGISTRY.record_rate_limit_wait(self.BACKEND, self.rate_limiter.acquire())
+            try:
+                results = send(self.session, self.BACKEND, method, f'{self.api_root}/{api_path}', api_path, **kwargs)
+            finally:
+                self.rate_limiter.release()
+
+            if results.status_code != 429:
+                self.rate_limiter.update(results.headers)
+                return results
+
+            delay = ratelimit.retry_after(results.headers)
+            LOGGER.warning('Rate Limit reached, sleeping for %s seconds before re-running.', delay)
+            metrics.REGISTRY.record_retry(self.BACKEND, method, api_path)
+            self.rate_limiter.block(delay)
+
+
+class Clients:
+    """Clients of the connections of a service, each client is created the first time it is used."""
+
+    def __init__(self, client_class, default_connection):
+        """
+        :param client_class: Client subclass of the service, created with the name of a connection
+        :param str default_connection: connection used when a configuration does not define one
+        """
+        self.client_class = client_class
+        self.default_connection = default_connection
+
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, connection_name=None):
+        """
+        Retrieve the client of a connection of the configuration.
+        :param str connection_name: key of the connection in the connections section of the configuration, None for
+        the default connection
+        :return: Client
+        """
+        connection_name = connection_name or self.default_connection
+
+        with self._lock:
+            client = self._clients.get(connection_name)
+
+            if client is None:
+                client = self.client_class(connection_name)
+                self._clients[connection_name] = client
+
+        return client
+
+    def reset(self):
+        """Close and forget the clients, they are created again by the next request."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+
+        for client in clients:
+            client.close()
+
+
+def get_connection(connection_name):
+    """
+    Retrieve the section of a connection in the connections section of the configuration.
+    :param str connection_name: key of the connection
+    :return: dict, empty if the connection is not defined
+    """
+    return config.get_configuration().get('connections', {}).get(connection_name) or {}
+
+
+def get_settings(connection_name):
+    """
+    Retrieve the HTTP settings for a connection.  Values are read from the ``http`` section of the connection
+    configuration and fall back to DEFAULT_SETTINGS.
+    :param str connection_name: key of the connection in the connections section of the configuration.
+    :return: dict
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(get_connection(connection_name).get('http') or {})
+
+    return settings
+
+
+def create_session(settings, headers=None):
+    """
+    Create a new session with keep-alive connection pooling, compression and the retry policy defined in the settings.
+    :param dict settings: HTTP settings as returned by get_settings
+    :param dict headers: headers that are sent with every request
+    :return: Session
+    """
+    LOGGER.debug('Creating session: %s', settings)
+
+    retries = int(settings['retries'])
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                  backoff_factor=float(settings['backoff_factor']),
+                  status_forcelist=RETRY_STATUS_CODES,
+                  raise_on_status=False)
+
+    adapter = HTTPAdapter(pool_connections=int(settings['pool_connections']),
+                          pool_maxsize=int(settings['pool_maxsize']),
+                          max_retries=retry)
+
+    session = Session(timeout=settings['timeout'])
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                            'Connection': 'keep-alive'})
+    if headers:
+        session.headers.update(headers)
+
+    return session
+
+
+def send(session, backend, method, url, api_path, **kwargs):
+    """
+    Send a request with the session and record its metrics, including the retries made by the transport.
+    :param Session session: session to send the request with
+    :param str backend: name of the service used in the metrics
+    :param str method: HTTP method
+    :param str url: full url of the request
+    :param str api_path: path of the request used in the metrics
+    :return: response
+    """
+    start = time.perf_counter()
+    response = session.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    request_body = response.request.body or b''
+    metrics.REGISTRY.record_request(backend, method, api_path, response.status_code, elapsed,
+                                    len(request_body), len(response.content))
+
+    retries = getattr(response.raw, 'retries', None)
+    if retries is not None and retries.history:
+        metrics.REGISTRY.record_retry(backend, method, api_path, len(retries.history))
+
+    return response
@@ -0,0 +1,185 @@
+"""
+Persistent cache for the responses of API endpoints whose data rarely changes.  Responses are stored on disk so that
+they are shared between runs, are used without a request until their time to live expires, and are then revalidated
+with the ETag / Last-Modified values of the stored response.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from timesync.utils import configuration as config
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    # Set to false to disable the cache.
+    'enabled': True,
+
+    # Directory that the responses are stored in.
+    'directory': os.path.join('~', '.cache', 'timesync'),
+
+    # Maximum number of bytes stored, the least recently used responses are removed past this size.
+    'max_size': 50 * 1024 * 1024,
+}
+
+
+class Cache:
+    """Directory of cached responses, each response is stored as a JSON document named after the hash of its key."""
+
+    def __init__(self, directory, max_size):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = int(max_size)
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self, key):
+        """
+        Retrieve a stored response.
+        :param str key: key of the response
+        :return: dict containing the stored time, the validators and the body of the response, or None
+        """
+        path = self._path(key)
+
+        try:
+            with open(path, 'r') as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return entry if entry.get('key') == key else None
+
+    def store(self, key, entry):
+        """
+        Store a response, and remove the least recently used responses if the cache is over its maximum size.
+        :param str key: key of the response
+        :param dict entry: stored time, validators and body of the response
+        """
+        entry = dict(entry, key=key)
+
+        with self._lock:
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(file_descriptor, 'w') as entry_file:
+                    json.dump(entry, entry_file)
+                os.replace(temporary_path, self._path(key))
+            except OSError as ose:
+                LOGGER.warning('Could not store cached response: %s', ose)
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                return
+
+            self._evict()
+
+    def clear(self):
+        """Remove all of the stored responses."""
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.json'):
+                    os.remove(entry.path)
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+                except OSError:
+                    continue
+
+        total_size = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            LOGGER.debug('Removing cached response: %s', path)
+            total_size -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+
+@functools.lru_cache(maxsize=1)
+def get_cache():
+    """
+    Retrieve the cache defined by the ``cache`` section of the configuration.
+    :return: Cache or None if caching is disabled
+    """
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(config.get_configuration().get('cache') or {})
+
+    if not settings['enabled']:
+        return None
+
+    try:
+        return Cache(settings['directory'], settings['max_size'])
+    except OSError as ose:
+        LOGGER.warning('Cannot use cache directory %s: %s', settings['directory'], ose)
+        return None
+
+
+def get(key, time_to_live, send, revalidate=False):
+    """
+    Retrieve the body of a response from the cache, or from the API if it is not cached or has expired.
+    :param str key: key of the response, must identify the account, endpoint and parameters of the request
+    :param float time_to_live: seconds that a stored response is used without revalidating it
+    :param send: method that takes a dict of additional headers, sends the request and returns the response
+    :param bool revalidate: check a stored response with the API even if it has not expired
+    :return: decoded JSON body of the response
+    """
+    cache = get_cache()
+    entry = cache.load(key) if cache is not None else None
+
+    if entry is not None and not revalidate and time.time() - entry['stored'] < time_to_live:
+        LOGGER.debug('Using cached response: %s', key)
+        return entry['body']
+
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    response = send(headers)
+
+    if response.status_code == 304 and entry is not None:
+        LOGGER.debug('Revalidated cached response: %s', key)
+        entry['stored'] = time.time()
+        cache.store(key, entry)
+        return entry['body']
+
+    body = response.json()
+
+    if cache is not None and response.status_code == 200:
+        cache.store(key, {'stored': time.time(),
+                          'etag': response.headers.get('ETag'),
+                          'last_modified': response.headers.get('Last-Modified'),
+                          'body': body})
+
+    return body
+
+
+def cache_key(identity, url, query_parameters=None):
+    """
+    Build the key of a request.
+    :param str identity: value identifying the account the request is made with, it is hashed before being used
+    :param str url: url of the request
+    :param dict query_parameters: query parameters of the request
+    :return: str
+    """
+    identity = hashlib.sha256(identity.encode('utf-8')).hexdigest()
+    parameters = '&'.join(f'{key}={value}' for key, value in sorted((query_parameters or {}).items()))
+
+    return f'{identity} {url}?{parameters}'
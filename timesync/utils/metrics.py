@@ -0,0 +1,194 @@
+"""
+Instrumentation of the requests made to the APIs.  The connection modules record every request, retry and rate limit
+wait here, and a summary is provided once the command is finished.  The metrics can also be exported as JSON or in the
+Prometheus text file format.
+"""
+import collections
+import json
+import re
+import threading
+
+# Upper bounds of the latency histogram buckets in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+_IDENTIFIER_PATTERN = re.compile(r'/\d+(?=/|$)')
+
+
+class EndpointMetrics:
+    """Counters and latency histogram of the requests made to an endpoint that returned a status."""
+
+    __slots__ = ('count', 'seconds', 'bytes_sent', 'bytes_received', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, seconds, bytes_sent, bytes_received):
+        self.count += 1
+        self.seconds += seconds
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+
+    def to_dict(self):
+        return {'count': self.count, 'seconds': self.seconds, 'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'latency_buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.buckets)}}
+
+
+class Registry:
+    """Thread safe collection of the metrics of a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = collections.defaultdict(EndpointMetrics)
+            self.retries = collections.Counter()
+            self.rate_limit_seconds = collections.Counter()
+
+    def record_request(self, backend, method, api_path, status, seconds, bytes_sent=0, bytes_received=0):
+        """
+        Record a request that received a response.
+        :param str backend: name of the service
+        :param str method: HTTP method
+        :param str api_path: path of the request, identifiers in the path are grouped together
+        :param int status: status code of the response
+        :param float seconds: time spent waiting for the response
+        :param int bytes_sent: size of the request body
+        :param int bytes_received: size of the response body
+        """
+        key = (backend, f'{method} {endpoint(api_path)}', status)
+        with self._lock:
+            self.requests[key].add(seconds, bytes_sent, bytes_received)
+
+    def record_retry(self, backend, method, api_path, count=1):
+        """Record requests that were sent again after a failure or a rate limit response."""
+        with self._lock:
+            self.retries[(backend, f'{method} {endpoint(api_path)}')] += count
+
+    def record_rate_limit_wait(self, backend, seconds):
+        """Record the time spent waiting for the rate limiter."""
+        if seconds <= 0:
+            return
+
+        with self._lock:
+            self.rate_limit_seconds[backend] += seconds
+
+    def summary(self):
+        """
+        Build a table of the requests made to each endpoint, followed by the totals of each service.
+        :return: str or None if no requests were made
+        """
+        import tabulate
+
+        with self._lock:
+            if not self.requests:
+                return None
+
+            rows = [(backend, name, status, metrics.count, f'{metrics.seconds:.2f}',
+                     f'{metrics.seconds / metrics.count:.3f}', metrics.bytes_received,
+                     self.retries.get((backend, name), 0))
+                    for (backend, name, status), metrics in sorted(self.requests.items())]
+
+            backends = sorted({backend for backend, _, _ in self.requests})
+            totals = [(backend,
+                       sum(metrics.count for key, metrics in self.requests.items() if key[0] == backend),
+                       sum(metrics.count for key, metrics in self.requests.items()
+                           if key[0] == backend and key[2] == 429),
+                       sum(count for key, count in self.retries.items() if key[0] == backend),
+                       f'{self.rate_limit_seconds.get(backend, 0.0):.2f}')
+                      for backend in backends]
+
+        return '\n'.join([
+            tabulate.tabulate(rows, ['Service', 'Endpoint', 'Status', 'Requests', 'Seconds', 'Average', 'Bytes',
+                                     'Retries'], tablefmt='simple'),
+            '',
+            tabulate.tabulate(totals, ['Service', 'Requests', '429s', 'Retries', 'Rate Limit Wait'],
+                              tablefmt='simple'),
+        ])
+
+    def to_json(self):
+        """Export the metrics as a JSON document."""
+        with self._lock:
+            document = {
+                'requests': [dict(backend=backend, endpoint=name, status=status, **metrics.to_dict())
+                             for (backend, name, status), metrics in sorted(self.requests.items())],
+                'retries': [{'backend': backend, 'endpoint': name, 'count': count}
+                            for (backend, name), count in sorted(self.retries.items())],
+                'rate_limit_seconds': dict(self.rate_limit_seconds),
+            }
+
+        return json.dumps(document, indent=2)
+
+    def to_prometheus(self):
+        """Export the metrics in the Prometheus text file format."""
+        lines = [
+            '# HELP timesync_http_requests_total Requests made to the APIs.',
+            '# TYPE timesync_http_requests_total counter',
+        ]
+
+        with self._lock:
+            requests = sorted(self.requests.items())
+            retries = sorted(self.retries.items())
+            rate_limit_seconds = sorted(self.rate_limit_seconds.items())
+
+        for (backend, name, status), metrics in requests:
+            lines.append(f'timesync_http_requests_total{_labels(backend, name, status)} {metrics.count}')
+
+        lines += ['# HELP timesync_http_request_bytes_total Bytes received from the APIs.',
+                  '# TYPE timesync_http_request_bytes_total counter']
+        for (backend, name, status), metrics in requests:
+            lines.append(f'timesync_http_request_bytes_total{_labels(backend, name, status)} {metrics.bytes_received}')
+
+        lines += ['# HELP timesync_http_request_duration_seconds Latency of the requests made to the APIs.',
+                  '# TYPE timesync_http_request_duration_seconds histogram']
+        for (backend, name, status), metrics in requests:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                cumulative += count
+                upper = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'timesync_http_request_duration_seconds_bucket'
+                             f'{_labels(backend, name, status, le=upper)} {cumulative}')
+            lines.append(f'timesync_http_request_duration_seconds_sum{_labels(backend, name, status)} '
+                         f'{metrics.seconds}')
+            lines.append(f'timesync_http_request_duration_seconds_count{_labels(backend, name, status)} '
+                         f'{metrics.count}')
+
+        lines += ['# HELP timesync_http_retries_total Requests sent again after a failure or a rate limit response.',
+                  '# TYPE timesync_http_retries_total counter']
+        for (backend, name), count in retries:
+            lines.append(f'timesync_http_retries_total{_labels(backend, name)} {count}')
+
+        lines += ['# HELP timesync_rate_limit_wait_seconds_total Time spent waiting for the rate limiter.',
+                  '# TYPE timesync_rate_limit_wait_seconds_total counter']
+        for backend, seconds in rate_limit_seconds:
+            lines.append(f'timesync_rate_limit_wait_seconds_total{{backend="{backend}"}} {seconds}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def endpoint(api_path):
+    """Group the paths of an endpoint together by replacing the identifiers in the path."""
+    return _IDENTIFIER_PATTERN.sub('/{id}', '/' + api_path.strip('/'))[1:]
+
+
+def _labels(backend, name, status=None, **extra):
+    method, path = name.split(' ', 1)
+    labels = [f'backend="{backend}"', f'method="{method}"', f'endpoint="{path}"']
+    if status is not None:
+        labels.append(f'status="{status}"')
+    labels += [f'{key}="{value}"' for key, value in extra.items()]
+    return '{' + ','.join(labels) + '}'
+
+
+REGISTRY = Registry()
@@ -0,0 +1,66 @@
+"""
+Pagination engine for the API connections.  The first page of a query is fetched to find out how much data there is,
+the remaining pages are then fetched concurrently with a bounded number of workers and provided in page order.
+"""
+import collections
+import concurrent.futures
+import itertools
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+def total_pages(fetch_page, max_workers, total_key='total_pages'):
+    """
+    Generator for APIs that report the number of pages in the response (Harvest).
+    :param fetch_page: method that takes the page number and returns the page data
+    :param int max_workers: maximum number of pages that are fetched at the same time
+    :param str total_key: key of the page data that contains the total number of pages
+    :return: generator of page data in page order
+    """
+    first_page = fetch_page(1)
+    yield first_page
+
+    page_count = first_page.get(total_key) or 1
+    LOGGER.debug('Fetching %s pages', page_count)
+
+    yield from _fetch_ahead(fetch_page, range(2, page_count + 1), max_workers, lambda page_data: False)
+
+
+def more_pages(fetch_page, max_workers, is_last_page):
+    """
+    Generator for APIs that only report if there is more data after the current page (T-Sheets).  Pages are probed
+    ahead of the page that is being consumed, any pages that were requested past the last page are discarded.
+    :param fetch_page: method that takes the page number and returns the page data
+    :param int max_workers: maximum number of pages that are fetched at the same time
+    :param is_last_page: method that takes the page data and returns True if there are no pages after it
+    :return: generator of page data in page order
+    """
+    first_page = fetch_page(1)
+    yield first_page
+
+    if is_last_page(first_page):
+        return
+
+    yield from _fetch_ahead(fetch_page, itertools.count(2), max_workers, is_last_page)
+
+
+def _fetch_ahead(fetch_page, pages, max_workers, is_last_page):
+    """Fetch the pages with at most max_workers requests in flight, yielding the results in page order."""
+    pages = iter(pages)
+    max_workers = max(int(max_workers), 1)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque(executor.submit(fetch_page, page) for page in itertools.islice(pages, max_workers))
+
+        while pending:
+            page_data = pending.popleft().result()
+            yield page_data
+
+            if is_last_page(page_data):
+                for future in pending:
+                    future.cancel()
+                break
+
+            for page in itertools.islice(pages, 1):
+                pending.append(executor.submit(fetch_page, page))
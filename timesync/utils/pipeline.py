@@ -0,0 +1,74 @@
+"""
+Streaming of the results of a reader to a writer.  The reader is run in its own thread and hands its results over
+through a bounded queue, so that the next dates are read while the current ones are written, and only a limited number
+of results are held in memory no matter how large the range of dates is.
+"""
+import queue
+import threading
+
+# Seconds between the checks of the producer thread for a consumer that has stopped.
+_POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class _Failure:
+    """Exception raised by the producer thread, raised again in the consumer."""
+
+    __slots__ = ('exception',)
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def prefetch(items, max_items):
+    """
+    Generator that iterates through items in a background thread, at most max_items are read ahead of the item that is
+    being consumed.  Exceptions raised while iterating are raised by the generator once the items before them have been
+    consumed.  The background thread stops when the generator is closed.
+    :param items: iterable to read ahead
+    :param int max_items: maximum number of items waiting to be consumed
+    :return: generator of the items in their original order
+    """
+    buffer = queue.Queue(maxsize=max(int(max_items), 1))
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except Exception as exc:  # Handed over to the consumer, which raises it in its own thread.
+            put(_Failure(exc))
+        else:
+            put(_DONE)
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    producer = threading.Thread(target=produce, name='timesync-prefetch', daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = buffer.get()
+
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exception
+
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
@@ -0,0 +1,269 @@
+"""
+Dry run planner of a process script.  Every task is expanded into its dates and its plugins are loaded, then the
+services estimate the requests needed for the task and the time they take within their rate budgets.  The planner
+does not make any requests, the number of records of each day is based on the records counted by the previous copies
+of the same data.
+"""
+import datetime
+import json
+import logging
+
+from timesync.utils import plugins, state
+from timesync.utils import tasks as engine
+from timesync.utils.configuration import date_range
+
+LOGGER = logging.getLogger(__name__)
+
+# Records of each day assumed for data that has never been copied.
+DEFAULT_RECORDS_PER_DAY = 4
+
+# Seconds assumed for each request.
+DEFAULT_LATENCY = 0.5
+
+# Types of the tasks that are planned, the other tasks are skipped the same as when the script is run.
+TASK_TYPES = ('copy', 'delete')
+
+
+class Estimate:
+    """Requests that a service is expected to receive for a reader, writer or deleter of a task."""
+
+    __slots__ = ('backend', 'reads', 'writes', 'deletes', 'budget', 'page_workers', 'write_workers')
+
+    def __init__(self, backend, reads=0, writes=0, deletes=0, budget=None, page_workers=1, write_workers=1):
+        """
+        :param str backend: name of the service
+        :param int reads: number of pages that are read
+        :param int writes: number of records that are created or updated
+        :param int deletes: number of records that are deleted
+        :param tuple budget: requests allowed in each period of seconds, None if the service is not rate limited
+        :param int page_workers: pages that are read at the same time
+        :param int write_workers: records that are written or deleted at the same time
+        """
+        self.backend = backend
+        self.reads = reads
+        self.writes = writes
+        self.deletes = deletes
+        self.budget = budget
+        self.page_workers = max(int(page_workers), 1)
+        self.write_workers = max(int(write_workers), 1)
+
+    @property
+    def requests(self):
+        return self.reads + self.writes + self.deletes
+
+    def seconds(self, latency=DEFAULT_LATENCY):
+        """Time expected for the requests, limited either by the workers or by the rate budget of the service."""
+        worker_seconds = (self.reads * latency / self.page_workers +
+                          (self.writes + self.deletes) * latency / self.write_workers)
+        return max(worker_seconds, rate_limited_seconds(self.requests, self.budget))
+
+
+class TaskPlan:
+    """Estimates of a task of the script."""
+
+    __slots__ = ('task', 'records', 'estimates', 'seconds')
+
+    def __init__(self, task, records, estimates, seconds):
+        self.task = task
+        self.records = records
+        self.estimates = estimates
+        self.seconds = seconds
+
+
+def rate_limited_seconds(requests, budget):
+    """
+    Minimum time needed to make a number of requests within a rate budget.  The budget allows a burst of its number
+    of requests, the rest are spread over the period.
+    :param int requests: number of requests
+    :param tuple budget: requests allowed in each period of seconds, None if there is no limit
+    :return: float
+    """
+    if budget is None:
+        return 0.0
+
+    allowed, period = budget
+    return max(requests - allowed, 0) * float(period) / allowed
+
+
+def pages(records, page_size):
+    """Number of pages of a query that returns a number of records, a query that has no results still takes a page."""
+    return max(int(-(-records // page_size)), 1)
+
+
+def plan(task_configurations, records_per_day=None, latency=DEFAULT_LATENCY):
+    """
+    Estimate the requests and time needed for each task of a script.
+    :param list task_configurations: tasks section of the process script
+    :param float records_per_day: records of each day assumed for data that has never been copied
+    :param float latency: seconds assumed for each request
+    :return: list of TaskPlan in the order of the script
+    """
+    store = state.get_state_store()
+
+    if records_per_day is None:
+        records_per_day = DEFAULT_RECORDS_PER_DAY
+
+    task_plans = []
+    for task in engine.build_graph(task_configurations, TASK_TYPES):
+        configuration = task.configuration
+        start_date, end_date = date_range(configuration)
+        days = (end_date.date() - start_date.date()).days + 1
+
+        if task.type == 'copy':
+            source = configuration['from']
+            records = round(_records_per_day(store, source, records_per_day) * days)
+            read_action, write_action = _copy_actions(configuration)
+
+            if configuration.get('incremental', False):
+                records = _changed_records(store, configuration, records, days)
+
+            estimates = [_estimate(source, read_action, start_date, end_date, records),
+                         _estimate(configuration['to'], write_action, start_date, end_date, records)]
+
+            # Reads and writes of different services overlap.
+            if estimates[0].backend == estimates[1].backend:
+                seconds = sum(estimate.seconds(latency) for estimate in estimates)
+            else:
+                seconds = max(estimate.seconds(latency) for estimate in estimates)
+
+        else:
+            if plugins.find_plugin('timesheet_range_delete', configuration['from']['id']) is None:
+                plugins.load_plugin('timesheet_delete', configuration['from']['id'])
+
+            records = round(_records_per_day(store, configuration['from'], records_per_day) * days)
+            estimates = [_estimate(configuration['from'], 'delete', start_date, end_date, records)]
+            seconds = estimates[0].seconds(latency)
+
+        task_plans.append(TaskPlan(task, records, estimates, seconds))
+
+    return task_plans
+
+
+def wall_time(task_plans, latency=DEFAULT_LATENCY):
+    """
+    Estimate the time needed to run all of the tasks.  Tasks wait for the tasks they depend on, and all of the tasks
+    share the rate budget of each service.
+    :param list task_plans: plans of the tasks of a script
+    :param float latency: seconds assumed for each request
+    :return: seconds
+    """
+    finished = {}
+    for task_plan in task_plans:
+        started = max((finished[dependency.index] for dependency in task_plan.task.dependencies), default=0.0)
+        finished[task_plan.task.index] = started + task_plan.seconds
+
+    budgets = {}
+    requests = {}
+    for task_plan in task_plans:
+        for estimate in task_plan.estimates:
+            budgets[estimate.backend] = estimate.budget
+            requests[estimate.backend] = requests.get(estimate.backend, 0) + estimate.requests
+
+    rate_limited = [rate_limited_seconds(count, budgets[backend]) for backend, count in requests.items()]
+
+    return max([0.0] + list(finished.values()) + rate_limited)
+
+
+def print_plan(task_plans, latency=DEFAULT_LATENCY):
+    """Print the estimates of each task, the totals of each service and the estimated wall time."""
+    import tabulate
+
+    rows = []
+    totals = {}
+    for task_plan in task_plans:
+        task = task_plan.task
+        for estimate in task_plan.estimates:
+            rows.append((str(task), f'{task.start} -> {task.end}', task_plan.records, estimate.backend, estimate.reads,
+                         estimate.writes, estimate.deletes, _duration(estimate.seconds(latency))))
+
+            total = totals.setdefault(estimate.backend, [0, estimate.budget])
+            total[0] += estimate.requests
+
+        rows.append((str(task), '', '', 'total', '', '', '', _duration(task_plan.seconds)))
+
+    print(tabulate.tabulate(rows, ['Task', 'Dates', 'Records', 'Service', 'Pages', 'Writes', 'Deletes', 'Time'],
+                            tablefmt='simple'))
+    print()
+
+    backend_rows = [(backend, requests, f'{budget[0]} / {budget[1]}s' if budget else 'none',
+                     _duration(rate_limited_seconds(requests, budget)))
+                    for backend, (requests, budget) in sorted(totals.items())]
+    print(tabulate.tabulate(backend_rows, ['Service', 'Requests', 'Rate Budget', 'Rate Limited Time'],
+                            tablefmt='simple'))
+    print()
+
+    print(f'Estimated wall time: {_duration(wall_time(task_plans, latency))}')
+
+
+def record_counts(configuration, records, days):
+    """
+    Store the number of records copied by a copy task for the reader and the writer, which is used to estimate the
+    records of the next plans of the same data.
+    :param dict configuration: copy task configuration
+    :param int records: number of records copied
+    :param int days: number of days read
+    """
+    if not days:
+        return
+
+    store = state.get_state_store()
+    for resource_configuration in (configuration['from'], configuration['to']):
+        store.set_record_count(_resource_key(resource_configuration), records, days)
+
+
+def _copy_actions(configuration):
+    """Load the plugins of a copy task, and return the actions of its reader and writer."""
+    source, destination = configuration['from']['id'], configuration['to']['id']
+
+    if configuration.get('incremental', False):
+        if (plugins.find_plugin('timesheet_changes_reader', source) is None or
+                plugins.find_plugin('timesheet_sync_writer', destination) is None):
+            raise RuntimeError(f'Incremental copy is not supported from {source} to {destination}')
+        return 'changes', 'sync'
+
+    if plugins.find_plugin('timesheet_range_reader', source) is None:
+        plugins.load_plugin('timesheet_reader', source)
+
+    if configuration.get('reconcile', False):
+        if plugins.find_plugin('timesheet_reconcile_writer', destination) is None:
+            raise RuntimeError(f'Reconcile is not supported when writing to {destination}')
+        return 'read', 'reconcile'
+
+    plugins.load_plugin('timesheet_writer', destination)
+    return 'read', 'write'
+
+
+def _estimate(configuration, action, start_date, end_date, records):
+    """Retrieve the estimate of the service of a reader/writer/deleter configuration."""
+    estimator = plugins.find_plugin('timesheet_estimate', configuration['id'])
+
+    if estimator is None:
+        LOGGER.warning('No estimates available for %s, its requests are not included', configuration['id'])
+        return Estimate(configuration['id'])
+
+    return estimator(action, configuration, start_date, end_date, records)
+
+
+def _records_per_day(store, configuration, default):
+    records_per_day = store.get_records_per_day(_resource_key(configuration))
+    return default if records_per_day is None else records_per_day
+
+
+def _changed_records(store, configuration, records, days):
+    """Records of an incremental copy, only the days since the last copy are expected to have changed."""
+    from timesync.subcommands import process
+
+    synced_at = store.get_watermark(process.incremental_task_key(configuration))
+    if synced_at is None:
+        return records
+
+    changed_days = (datetime.datetime.now(datetime.timezone.utc) - synced_at).days + 1
+    return round(records * min(changed_days, days) / days)
+
+
+def _resource_key(configuration):
+    return json.dumps(engine.resource(configuration), default=str)
+
+
+def _duration(seconds):
+    return str(datetime.timedelta(seconds=round(seconds)))
@@ -1,4 +1,13 @@
-import pkg_resources
+"""
+Registry of the plugins defined by the package entry points.  The entry points are discovered once, and a plugin is
+only imported the first time it is used.
+"""
+import functools
+
+try:
+    from importlib import metadata
+except ImportError:  # Python < 3.8
+    import importlib_metadata as metadata
 
 
 def load_plugin(group, name):
@@ -8,14 +17,56 @@ def load_plugin(group, name):
     :param name: name of the plugin
     :return: method that is defined.
     """
-    plugin = None
-    for entry_point in pkg_resources.iter_entry_points(group, name):
-        plugin = entry_point.load()
-
-        if plugin is not None:
-            break
+    plugin = find_plugin(group, name)
 
     if plugin is None:
         raise RuntimeError(f'Could not find plugin {name} in {group}')
 
     return plugin
+
+
+@functools.lru_cache(maxsize=None)
+def find_plugin(group, name):
+    """
+    Load the plugin from setuptools entry points if it has been registered.  Used for optional capabilities of a
+    service that the caller can work without.
+    :param group: entrypoint group name
+    :param name: name of the plugin
+    :return: method that is defined, or None
+    """
+    entry_point = _registry().get(group, {}).get(name)
+
+    if entry_point is None:
+        return None
+
+    return entry_point.load()
+
+
+def iter_plugins(group):
+    """
+    Load all of the plugins registered in a group.
+    :param group: entrypoint group name
+    :return: generator of (name, method) of the plugins
+    """
+    for name in sorted(_registry().get(group, {})):
+        yield name, find_plugin(group, name)
+
+
+@functools.lru_cache(maxsize=1)
+def _registry():
+    """Discover all of the entry points once, returns a dict of group name to a dict of plugin name to entry point."""
+    entry_points = metadata.entry_points()
+
+    # Older versions only return a dict of group name to entry points.
+    if hasattr(entry_points, 'select'):
+        groups = ((group, entry_points.select(group=group)) for group in entry_points.groups)
+    else:
+        groups = entry_points.items()
+
+    registry = {}
+    for group, values in groups:
+        for entry_point in values:
+            # The first entry point of a name is used, as it was with pkg_resources.
+            registry.setdefault(group, {}).setdefault(entry_point.name, entry_point)
+
+    return registry
@@ -0,0 +1,170 @@
+"""
+Proactive rate limiting for the API connections.  Each service account has a sliding window of its recent requests that
+is shared by all of the threads making requests, so that requests are spread out to stay within the budget of the
+service instead of waiting for the service to reject them.
+"""
+import collections
+import email.utils
+import logging
+import threading
+import time
+
+from timesync.utils import configuration as config
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait after a rate limit response that does not define how long to wait.
+DEFAULT_RETRY_AFTER = 15
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class SlidingWindow:
+    """
+    Thread safe rate limiter that allows at most ``requests`` requests in any ``period`` seconds.  A request takes its
+    place in the window when it is acquired, and is counted from the time its response was received once it is
+    released, which is never before the service received it, so the service never sees more requests in a period
+    than the budget.
+    """
+
+    def __init__(self, requests, period):
+        if requests <= 0 or period <= 0:
+            raise RuntimeError('Rate limit requests and period must be positive numbers')
+
+        self.requests = int(requests)
+        self.period = float(period)
+        self._times = collections.deque()
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request can be made, release must be called once the response of the request is received.
+        :return: number of seconds spent waiting
+        """
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                elif len(self._times) + self._in_flight < self.requests:
+                    self._in_flight += 1
+                    return waited
+                elif self._times:
+                    delay = self._times[0] + self.period - now
+                else:
+                    # All of the requests of the window are still waiting for their responses.
+                    delay = min(self.period, 0.05)
+
+            time.sleep(delay)
+            waited += delay
+
+    def release(self):
+        """Count a request that was acquired from the time its response was received."""
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            self._times.append(time.monotonic())
+
+    def block(self, seconds):
+        """Stop all requests for the number of seconds provided, used when the service rejects a request."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def update(self, headers):
+        """
+        Reduce the requests available in the window to the remaining requests reported by the service, if it reports
+        them.
+        :param headers: response headers
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+
+        try:
+            remaining = int(float(remaining))
+        except ValueError:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+
+            missing = self.requests - max(remaining, 0) - len(self._times) - self._in_flight
+            self._times.extend([now] * max(missing, 0))
+
+    def _expire(self, now):
+        while self._times and now - self._times[0] >= self.period:
+            self._times.popleft()
+
+
+def get_bucket(connection_name, account, default_requests, default_period, service=None):
+    """
+    Retrieve the rate limiter for an account of a service.  The budget is read from the ``rate_limit`` section of the
+    connection configuration, and falls back to the defaults of the service.  The bucket of an account is kept for the
+    life of the process, it is only replaced when the budget of the configuration changes.
+    :param str connection_name: key of the connection in the connections section of the configuration.
+    :param str account: identifier of the account that the budget applies to
+    :param int default_requests: number of requests allowed by the service in each period
+    :param float default_period: length of the period in seconds
+    :param str service: name of the service, connections to the same account of a service share their bucket.  The
+    connection name is used by default.
+    :return: SlidingWindow
+    """
+    key = (service or connection_name, account)
+    requests, period = get_budget(connection_name, default_requests, default_period)
+
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+
+        if bucket is None or (bucket.requests, bucket.period) != (int(requests), float(period)):
+            bucket = SlidingWindow(requests, period)
+            _buckets[key] = bucket
+
+    return bucket
+
+
+def get_budget(connection_name, default_requests, default_period):
+    """
+    Retrieve the rate budget of a service from the ``rate_limit`` section of the connection configuration.
+    :param str connection_name: key of the connection in the connections section of the configuration.
+    :param int default_requests: number of requests allowed by the service in each period
+    :param float default_period: length of the period in seconds
+    :return: tuple of the number of requests allowed and the length of the period in seconds
+    """
+    connection = config.get_configuration().get('connections', {}).get(connection_name) or {}
+    settings = connection.get('rate_limit') or {}
+
+    return settings.get('requests', default_requests), settings.get('period', default_period)
+
+
+def retry_after(headers, default=DEFAULT_RETRY_AFTER):
+    """
+    Number of seconds to wait before retrying a request that was rejected by the rate limit of the service.
+    :param headers: response headers
+    :param float default: value used when the response does not contain a valid Retry-After header
+    :return: float
+    """
+    value = headers.get('Retry-After')
+    if value is None:
+        return default
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        retry_time = None
+
+    if retry_time is None:
+        return default
+
+    return max(retry_time.timestamp() - time.time(), 0.0)
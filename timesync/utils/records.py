@@ -0,0 +1,161 @@
+"""
+Time entry records that are passed from the readers to the writers.  Large ranges of dates produce a lot of records,
+so the records only store their fields, and they are checked when they are created so that malformed records are
+reported by the reader instead of failing part way through a writer.
+"""
+import collections.abc
+import datetime
+
+FIELDS = ('id', 'start', 'end', 'duration', 'date', 'notes')
+
+
+class TimeEntry:
+    """
+    A single time entry.  The fields can be read as attributes or with the keys of the dict records that were used
+    before, so ``entry.start`` and ``entry['start']`` are the same value.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, id, start, end, duration=None, date=None, notes=None):
+        """
+        :param id: identifier of the entry in the service it was read from
+        :param datetime.datetime start: start of the entry
+        :param datetime.datetime end: end of the entry, must not be before the start
+        :param int duration: seconds between the start and the end, calculated when not provided
+        :param datetime.date date: date the entry belongs to, the date of the start when not provided
+        :param str notes: notes of the entry
+        """
+        if not isinstance(start, datetime.datetime) or not isinstance(end, datetime.datetime):
+            raise RuntimeError(f'Time entry {id} must have a start and end time, found: {start!r} -> {end!r}')
+
+        try:
+            if end < start:
+                raise RuntimeError(f'Time entry {id} ends before it starts: {start} -> {end}')
+        except TypeError:
+            raise RuntimeError(f'Time entry {id} must have start and end times that are both in a timezone or both '
+                               f'without one: {start} -> {end}')
+
+        if duration is None:
+            duration = int((end - start).total_seconds())
+
+        if date is None:
+            date = start.date()
+        elif isinstance(date, datetime.datetime):
+            date = date.date()
+        elif not isinstance(date, datetime.date):
+            raise RuntimeError(f'Time entry {id} has a date that is not a date: {date!r}')
+
+        self.id = id
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.date = date
+        self.notes = notes
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Create a time entry from a dict record, e.g. a record loaded from a file.
+        :param values: mapping containing a start and end time, and optionally the other fields
+        :return: TimeEntry
+        """
+        try:
+            return cls(values.get('id'), values['start'], values['end'], values.get('duration'), values.get('date'),
+                       values.get('notes'))
+        except KeyError as key_error:
+            raise RuntimeError(f'Time entry {values.get("id")} is missing {key_error}')
+
+    def to_dict(self):
+        """Convert the time entry into a dict record, used when writing to the disk formats."""
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def keys(self):
+        return FIELDS
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in FIELDS else default
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, TimeEntry):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in FIELDS)
+
+    def __repr__(self):
+        return f'TimeEntry({", ".join(f"{field}={getattr(self, field)!r}" for field in FIELDS)})'
+
+
+class TimeEntryBatch(collections.abc.Sequence):
+    """
+    Ordered collection of time entries.  dict records that are added are converted into time entries, so the readers
+    of plugins that still create dicts are checked as well.
+    """
+
+    __slots__ = ('_entries',)
+
+    def __init__(self, entries=()):
+        self._entries = []
+        self.extend(entries)
+
+    def append(self, entry):
+        self._entries.append(as_time_entry(entry))
+
+    def extend(self, entries):
+        self._entries.extend(as_time_entry(entry) for entry in entries)
+
+    def by_date(self):
+        """
+        Group the time entries by their date.
+        :return: dict of datetime.date to the TimeEntryBatch of that date
+        """
+        grouped = {}
+        for entry in self._entries:
+            grouped.setdefault(entry.date, TimeEntryBatch())._entries.append(entry)
+        return grouped
+
+    def to_dicts(self):
+        """Convert the time entries into dict records."""
+        return [entry.to_dict() for entry in self._entries]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            batch = TimeEntryBatch()
+            batch._entries = self._entries[index]
+            return batch
+        return self._entries[index]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __eq__(self, other):
+        if isinstance(other, TimeEntryBatch):
+            return self._entries == other._entries
+        if isinstance(other, list):
+            return self._entries == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f'TimeEntryBatch({self._entries!r})'
+
+
+def as_time_entry(record):
+    """
+    Convert a record into a time entry, time entries are returned unchanged.
+    :param record: TimeEntry or dict record
+    :return: TimeEntry
+    """
+    if isinstance(record, TimeEntry):
+        return record
+
+    if not isinstance(record, collections.abc.Mapping):
+        raise RuntimeError(f'Time entry must be a mapping, found: {record!r}')
+
+    return TimeEntry.from_dict(record)
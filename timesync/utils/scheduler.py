@@ -0,0 +1,193 @@
+"""
+Scheduler that runs jobs at fixed intervals within a single long running process.  The start of each run is delayed by
+a random jitter so that runs of many installations do not hit the APIs at the same moment, a job is never started
+while its previous run is still running, and runs that were missed while a job was running are skipped rather than
+run back to back.
+"""
+import concurrent.futures
+import logging
+import random
+import re
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 1
+
+# Seconds between the checks for the jobs that are due.
+DEFAULT_POLL_INTERVAL = 5
+
+_INTERVAL_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$')
+_INTERVAL_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+class Job:
+    """Method that is run every interval of seconds."""
+
+    def __init__(self, name, method, interval, jitter=0.0):
+        """
+        :param str name: name of the job used in the log messages
+        :param method: method called without any arguments for each run
+        :param float interval: seconds between the starts of the runs
+        :param float jitter: maximum number of seconds that the start of each run is randomly delayed by
+        """
+        if interval <= 0:
+            raise RuntimeError(f'The interval of {name} must be a positive number of seconds')
+        if jitter < 0:
+            raise RuntimeError(f'The jitter of {name} cannot be negative')
+
+        self.name = name
+        self.method = method
+        self.interval = float(interval)
+        self.jitter = float(jitter)
+
+        self.next_run = None
+        self.future = None
+        self._slot = None
+
+    def is_running(self):
+        """Check to see if a run of the job has been started or is waiting for a worker."""
+        return self.future is not None and not self.future.done()
+
+    def schedule(self, now):
+        """
+        Define the time of the next run, an interval after the scheduled start of the previous run and delayed by the
+        jitter.  The first run is scheduled right away, runs that were missed are skipped.
+        :param float now: current monotonic time
+        """
+        if self._slot is None:
+            self._slot = now
+        else:
+            self._slot += self.interval
+
+            if self._slot < now:
+                missed = int((now - self._slot) // self.interval) + 1
+                LOGGER.warning('Skipping %s missed runs of %s', missed, self.name)
+                self._slot += missed * self.interval
+
+        self.next_run = self._slot + random.uniform(0, self.jitter)
+
+    def take_over(self, job):
+        """Continue the schedule and the running run of a job that this job replaces."""
+        self.next_run, self.future, self._slot = job.next_run, job.future, job._slot
+
+
+class Scheduler:
+    """Runs the jobs that are due in a pool of worker threads until it is stopped."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        :param int concurrency: maximum number of jobs running at the same time
+        :param float poll_interval: seconds between the checks for the jobs that are due
+        """
+        self.concurrency = max(int(concurrency), 1)
+        self.poll_interval = float(poll_interval)
+        self.jobs = []
+
+        self._stopped = threading.Event()
+        self._paused = False
+
+    def set_jobs(self, jobs):
+        """
+        Replace the jobs of the scheduler.  Jobs that have the same name as a job already scheduled keep its next run,
+        and are not started again while its run is still running.
+        :param list jobs: list of Job
+        """
+        now = time.monotonic()
+        previous_jobs = {job.name: job for job in self.jobs}
+
+        for job in jobs:
+            previous_job = previous_jobs.get(job.name)
+
+            if previous_job is None:
+                job.schedule(now)
+            else:
+                job.take_over(previous_job)
+
+        self.jobs = list(jobs)
+
+    def pause(self):
+        """Do not start any new runs until resume is called, the runs already started are left to finish."""
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    def is_idle(self):
+        """Check to see if none of the jobs are running."""
+        return not any(job.is_running() for job in self.jobs)
+
+    def stop(self):
+        """Stop starting new runs, the scheduler returns once the running jobs have finished."""
+        self._stopped.set()
+
+    def run(self, on_poll=None):
+        """
+        Run the jobs as they are due until stop is called.
+        :param on_poll: method called without any arguments before each check for the jobs that are due
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while not self._stopped.is_set():
+                if on_poll is not None:
+                    on_poll()
+
+                if not self._paused:
+                    self._start_due_jobs(executor)
+
+                self._stopped.wait(self._wait_time())
+
+            LOGGER.info('Waiting for the running jobs to finish')
+
+    def _start_due_jobs(self, executor):
+        now = time.monotonic()
+
+        for job in self.jobs:
+            if job.next_run > now:
+                continue
+
+            if job.is_running():
+                LOGGER.warning('Skipping run of %s, the previous run is still running', job.name)
+                job.schedule(now)
+                continue
+
+            LOGGER.info('Starting %s', job.name)
+            job.future = executor.submit(_run_job, job)
+            job.schedule(now)
+
+    def _wait_time(self):
+        """Seconds until the next job is due, at most the poll interval."""
+        next_runs = [job.next_run for job in self.jobs]
+        if not next_runs or self._paused:
+            return self.poll_interval
+
+        return min(max(min(next_runs) - time.monotonic(), 0), self.poll_interval)
+
+
+def parse_interval(value):
+    """
+    Parse an interval that is either a number of seconds, or a number followed by s, m, h or d.
+    :param value: interval value of the configuration
+    :return: seconds
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    match = _INTERVAL_PATTERN.match(str(value))
+    if match is None:
+        raise RuntimeError(f'Cannot parse interval {value}, use a number of seconds or a number followed by s/m/h/d')
+
+    return float(match.group(1)) * _INTERVAL_UNITS[match.group(2)]
+
+
+def _run_job(job):
+    started = time.monotonic()
+
+    try:
+        job.method()
+    except Exception as exc:  # A failed run is reported, the job runs again at its next scheduled time.
+        LOGGER.error('%s failed: %s', job.name, exc)
+        return False
+
+    LOGGER.info('Finished %s in %.1f seconds', job.name, time.monotonic() - started)
+    return True
@@ -0,0 +1,261 @@
+"""
+Persistent state of the synchronization tasks, stored in a SQLite database.  Keeps track of the last time each task was
+synchronized, of the destination entries that were created from each source entry, and of the progress of the process
+runs so that a run that did not finish can be resumed.
+"""
+import datetime
+import functools
+import logging
+import os
+import sqlite3
+import threading
+
+from timesync.utils import configuration as config
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FILENAME = os.path.join('~', '.local', 'share', 'timesync', 'state.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    task_key TEXT PRIMARY KEY,
+    synced_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS copied_entries (
+    task_key TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    destination_id TEXT NOT NULL,
+    PRIMARY KEY (task_key, source_id)
+);
+
+CREATE TABLE IF NOT EXISTS record_counts (
+    resource_key TEXT PRIMARY KEY,
+    records INTEGER NOT NULL,
+    days INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS journal_tasks (
+    run_key TEXT NOT NULL,
+    task_key TEXT NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (run_key, task_key)
+);
+
+CREATE TABLE IF NOT EXISTS journal_dates (
+    run_key TEXT NOT NULL,
+    task_key TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (run_key, task_key, date)
+);
+
+CREATE TABLE IF NOT EXISTS journal_records (
+    run_key TEXT NOT NULL,
+    task_key TEXT NOT NULL,
+    record_key TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (run_key, task_key, record_key)
+);
+"""
+
+
+class StateStore:
+    """Thread safe access to the state database."""
+
+    def __init__(self, filename):
+        filename = os.path.expanduser(filename)
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close the connection to the database, the store cannot be used afterwards."""
+        with self._lock:
+            self._connection.close()
+
+    def get_watermark(self, task_key):
+        """
+        Retrieve the time that the task was last synchronized.
+        :param str task_key: key of the task
+        :return: timezone aware datetime.datetime or None if the task was never synchronized
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT synced_at FROM watermarks WHERE task_key = ?',
+                                           (task_key,)).fetchone()
+
+        if row is None:
+            return None
+
+        return datetime.datetime.strptime(row[0], '%Y-%m-%dT%H:%M:%S%z')
+
+    def set_watermark(self, task_key, synced_at):
+        """
+        Store the time that the task was synchronized.
+        :param str task_key: key of the task
+        :param datetime.datetime synced_at: timezone aware time that the synchronization started at
+        """
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO watermarks (task_key, synced_at) VALUES (?, ?)',
+                                     (task_key, synced_at.strftime('%Y-%m-%dT%H:%M:%S%z')))
+
+    def copied_entries(self, task_key):
+        """
+        Retrieve the entries that have been copied by the task.
+        :param str task_key: key of the task
+        :return: CopiedEntries
+        """
+        return CopiedEntries(self, task_key)
+
+    def get_records_per_day(self, resource_key):
+        """
+        Retrieve the average number of records of each day that were copied from or to a resource.
+        :param str resource_key: key of the resource
+        :return: float or None if nothing has been copied
+        """
+        rows = self._execute('SELECT records, days FROM record_counts WHERE resource_key = ?', (resource_key,))
+
+        if not rows or not rows[0][1]:
+            return None
+
+        return rows[0][0] / rows[0][1]
+
+    def set_record_count(self, resource_key, records, days):
+        """
+        Store the number of records of a range of days that were copied from or to a resource.
+        :param str resource_key: key of the resource
+        :param int records: number of records copied
+        :param int days: number of days in the range
+        """
+        self._execute('INSERT OR REPLACE INTO record_counts (resource_key, records, days) VALUES (?, ?, ?)',
+                      (resource_key, records, days))
+
+    def journal(self, run_key):
+        """
+        Retrieve the journal of the progress of a process run.
+        :param str run_key: key of the process script
+        :return: Journal
+        """
+        return Journal(self, run_key)
+
+    def _execute(self, statement, parameters):
+        with self._lock, self._connection:
+            return self._connection.execute(statement, parameters).fetchall()
+
+
+class CopiedEntries:
+    """Mapping of the source entry ids of a task to the ids of the destination entries created from them."""
+
+    def __init__(self, store, task_key):
+        self._store = store
+        self._task_key = task_key
+
+    def get(self, source_id):
+        """Retrieve the destination id of a source entry, or None if the entry was not copied."""
+        rows = self._store._execute('SELECT destination_id FROM copied_entries WHERE task_key = ? AND source_id = ?',
+                                    (self._task_key, str(source_id)))
+        return rows[0][0] if rows else None
+
+    def record(self, source_id, destination_id):
+        """Store the destination id that a source entry has been copied to."""
+        self._store._execute('INSERT OR REPLACE INTO copied_entries (task_key, source_id, destination_id) '
+                             'VALUES (?, ?, ?)', (self._task_key, str(source_id), str(destination_id)))
+
+    def forget(self, source_id):
+        """Remove a source entry whose destination entry has been deleted."""
+        self._store._execute('DELETE FROM copied_entries WHERE task_key = ? AND source_id = ?',
+                             (self._task_key, str(source_id)))
+
+
+class Journal:
+    """Progress of the tasks of a process run, kept until the run has finished without any failures."""
+
+    def __init__(self, store, run_key):
+        self._store = store
+        self._run_key = run_key
+
+    def exists(self):
+        """Check to see if any progress has been recorded for the run."""
+        return any(self._store._execute(f'SELECT 1 FROM {table} WHERE run_key = ? LIMIT 1', (self._run_key,))
+                   for table in ('journal_tasks', 'journal_dates', 'journal_records'))
+
+    def task(self, task_key):
+        """
+        Retrieve the progress of a task of the run.
+        :param str task_key: key of the task
+        :return: TaskJournal
+        """
+        return TaskJournal(self._store, self._run_key, task_key)
+
+    def clear(self):
+        """Remove all of the progress of the run."""
+        for table in ('journal_tasks', 'journal_dates', 'journal_records'):
+            self._store._execute(f'DELETE FROM {table} WHERE run_key = ?', (self._run_key,))
+
+
+class TaskJournal:
+    """
+    Progress of a task of a process run: if the task has completed, the dates that have been completely written and the
+    records written for the other dates.
+    """
+
+    def __init__(self, store, run_key, task_key):
+        self._store = store
+        self._keys = (run_key, task_key)
+
+    def is_complete(self):
+        return bool(self._store._execute('SELECT 1 FROM journal_tasks WHERE run_key = ? AND task_key = ?', self._keys))
+
+    def complete(self):
+        """Mark the task as completed, the progress of its dates and records is no longer needed."""
+        completed_at = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S%z')
+        self._store._execute('INSERT OR REPLACE INTO journal_tasks (run_key, task_key, completed_at) VALUES (?, ?, ?)',
+                             self._keys + (completed_at,))
+        self._store._execute('DELETE FROM journal_dates WHERE run_key = ? AND task_key = ?', self._keys)
+        self._store._execute('DELETE FROM journal_records WHERE run_key = ? AND task_key = ?', self._keys)
+
+    def completed_dates(self):
+        """
+        Retrieve the dates whose records have all been written.
+        :return: set of datetime.date
+        """
+        rows = self._store._execute('SELECT date FROM journal_dates WHERE run_key = ? AND task_key = ?', self._keys)
+        return {datetime.datetime.strptime(row[0], '%Y-%m-%d').date() for row in rows}
+
+    def complete_date(self, date):
+        """Mark all of the records of a date as written."""
+        self._store._execute('INSERT OR REPLACE INTO journal_dates (run_key, task_key, date) VALUES (?, ?, ?)',
+                             self._keys + (date.isoformat(),))
+        self._store._execute('DELETE FROM journal_records WHERE run_key = ? AND task_key = ? AND date = ?',
+                             self._keys + (date.isoformat(),))
+
+    def written_records(self):
+        """
+        Retrieve the records of the dates that are not completed that have been written.
+        :return: set of record keys
+        """
+        rows = self._store._execute('SELECT record_key FROM journal_records WHERE run_key = ? AND task_key = ?',
+                                    self._keys)
+        return {row[0] for row in rows}
+
+    def record_written(self, date, record_key):
+        """Mark a record of a date as written."""
+        self._store._execute('INSERT OR REPLACE INTO journal_records (run_key, task_key, record_key, date) '
+                             'VALUES (?, ?, ?, ?)', self._keys + (record_key, date.isoformat()))
+
+
+@functools.lru_cache(maxsize=1)
+def get_state_store():
+    """
+    Retrieve the state store defined by the ``state`` section of the configuration.
+    :return: StateStore
+    """
+    filename = (config.get_configuration().get('state') or {}).get('filename', DEFAULT_FILENAME)
+
+    try:
+        return StateStore(filename)
+    except (OSError, sqlite3.Error) as error:
+        raise RuntimeError(f'Cannot open state file {filename}: {error}')
@@ -0,0 +1,145 @@
+"""
+Execution engine for the tasks of a process script.  A dependency graph is built from the script so that tasks which
+touch the same destination over overlapping dates run in the order they are defined, while all of the other tasks run
+concurrently.
+"""
+import asyncio
+import concurrent.futures
+import logging
+
+from timesync.utils import plugins
+from timesync.utils.configuration import date_range
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+
+# Keys of a reader/writer/deleter configuration that identify the data that it touches.
+RESOURCE_KEYS = ('project', 'task', 'jobcode', 'filename')
+
+
+class Task:
+    """Task of a process script along with the data that it reads and writes."""
+
+    def __init__(self, index, configuration):
+        self.index = index
+        self.configuration = configuration
+        self.type = configuration['type']
+
+        start_date, end_date = date_range(configuration)
+        self.start = start_date.date()
+        self.end = end_date.date()
+
+        if self.type == 'copy':
+            self.reads = resource(configuration['from'])
+            self.writes = resource(configuration['to'])
+        else:
+            self.reads = None
+            self.writes = resource(configuration['from'])
+
+        self.dependencies = []
+
+    def __str__(self):
+        return f'task {self.index + 1} ({self.type})'
+
+    def conflicts(self, other):
+        """Check to see if the tasks touch the same data over overlapping dates, so they must not run concurrently."""
+        if self.start > other.end or other.start > self.end:
+            return False
+
+        return (self.writes == other.writes or
+                self.writes == other.reads or
+                self.reads is not None and self.reads == other.writes)
+
+
+def build_graph(task_configurations, task_types=None):
+    """
+    Build the tasks of a script and define the tasks each one has to wait for.  A task depends on every task defined
+    before it in the script that it conflicts with.
+    :param list task_configurations: tasks section of the process script
+    :param task_types: types of the tasks that can be run, tasks of the other types are skipped with a warning.  None
+    to build all of the tasks.
+    :return: list of Task
+    """
+    tasks = []
+
+    for index, configuration in enumerate(task_configurations):
+        if task_types is not None and configuration['type'] not in task_types:
+            LOGGER.warning('Skipping task %s, unknown task type: %s', index + 1, configuration['type'])
+            continue
+
+        task = Task(index, configuration)
+        task.dependencies = [previous for previous in tasks if task.conflicts(previous)]
+
+        LOGGER.debug('%s depends on: %s', task, ', '.join(str(dependency) for dependency in task.dependencies))
+        tasks.append(task)
+
+    return tasks
+
+
+def run(task_configurations, handlers, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Run all of the tasks of a script.  Tasks run as soon as the tasks that they depend on are finished, with at most
+    concurrency tasks running at the same time.  Tasks that depend on a task that failed are skipped, as are tasks of
+    a type that has no handler.
+    :param list task_configurations: tasks section of the process script
+    :param dict handlers: task type to the method that processes the task configuration
+    :param int concurrency: maximum number of tasks running at the same time
+    :raises RuntimeError: once all of the tasks are finished if any of the tasks failed
+    """
+    tasks = build_graph(task_configurations, handlers)
+    concurrency = max(int(concurrency), 1)
+
+    loop = asyncio.new_event_loop()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            failures = loop.run_until_complete(_run_tasks(loop, executor, tasks, handlers))
+    finally:
+        loop.close()
+
+    if failures:
+        raise RuntimeError(f'{len(failures)} of {len(tasks)} tasks failed: ' +
+                           ', '.join(f'{task}: {reason}' for task, reason in failures))
+
+
+async def _run_tasks(loop, executor, tasks, handlers):
+    failures = []
+    futures = {}
+
+    async def run_task(task):
+        for dependency in task.dependencies:
+            if not await futures[dependency.index]:
+                failures.append((task, f'skipped because {dependency} did not complete'))
+                return False
+
+        LOGGER.info('Starting %s', task)
+        try:
+            await loop.run_in_executor(executor, handlers[task.type], task.configuration)
+        except Exception as exc:  # Report the failure and keep running the tasks that do not depend on it.
+            LOGGER.error('%s failed: %s', task, exc)
+            failures.append((task, exc))
+            return False
+
+        LOGGER.info('Finished %s', task)
+        return True
+
+    for task in tasks:
+        futures[task.index] = asyncio.ensure_future(run_task(task), loop=loop)
+
+    await asyncio.gather(*futures.values())
+
+    return sorted(failures, key=lambda failure: failure[0].index)
+
+
+def resource(configuration):
+    """
+    Build a key identifying the data touched by a reader/writer/deleter configuration.  The services that have many
+    connections identify the account of the connection, so connections that use the same account touch the same data.
+    """
+    key = tuple((name, configuration[name]) for name in RESOURCE_KEYS if name in configuration)
+
+    account_key = plugins.find_plugin('timesheet_account', configuration['id'])
+    if account_key is not None:
+        key = (('account', account_key(configuration)),) + key
+
+    return (configuration['id'],) + key
@@ -0,0 +1,67 @@
+"""
+Fast parsing of the fixed timestamp formats returned by the APIs and written to the disk formats.  Converting large
+ranges of time entries parses several timestamps for every record, so the common formats are parsed with slicing and
+anything else falls back to dateutil.
+"""
+import datetime
+import functools
+
+import dateutil.parser
+import pytz
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO-8601 timestamp with a UTC offset, e.g. ``2019-12-31T08:00:00-07:00`` or ``2019-12-31T15:00:00Z``.
+    :param str value: timestamp to parse
+    :return: timezone aware datetime.datetime
+    """
+    length = len(value)
+
+    if (length == 25 and value[22] == ':' and value[19] in '+-') or (length == 20 and value[19] == 'Z'):
+        if value[4] == '-' and value[7] == '-' and value[10] == 'T' and value[13] == ':' and value[16] == ':':
+            try:
+                return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]), int(value[11:13]),
+                                         int(value[14:16]), int(value[17:19]), tzinfo=_utc_offset(value[19:]))
+            except ValueError:
+                pass
+
+    return dateutil.parser.isoparse(value)
+
+
+def parse_date(value):
+    """
+    Parse an ISO-8601 date, e.g. ``2019-12-31``.
+    :param str value: date to parse
+    :return: datetime.date
+    """
+    if len(value) == 10 and value[4] == '-' and value[7] == '-':
+        try:
+            return datetime.date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+        except ValueError:
+            pass
+
+    return dateutil.parser.isoparse(value).date()
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name):
+    """
+    Retrieve the pytz timezone of the name provided, the timezones are shared by all of the records.
+    :param str name: name of the timezone, e.g. America/Denver
+    :return: pytz timezone
+    """
+    return pytz.timezone(name)
+
+
+@functools.lru_cache(maxsize=None)
+def _utc_offset(value):
+    """Create the fixed offset timezone of an offset string, e.g. -07:00 or Z."""
+    if value == 'Z':
+        return datetime.timezone.utc
+
+    minutes = int(value[1:3]) * 60 + int(value[4:6])
+    if value[0] == '-':
+        minutes = -minutes
+
+    return datetime.timezone(datetime.timedelta(minutes=minutes))